@@ -47,6 +47,9 @@ app_include_js = "/assets/langflow_integration/js/langflow_global.js"
 doctype_js = {
     "Job Applicant": "public/js/job_applicant.js"
 }
+doctype_list_js = {
+    "Job Applicant": "public/js/job_applicant_list.js"
+}
 
 # include js in doctype views
 # doctype_js = {"doctype" : "public/js/doctype.js"}
@@ -151,6 +154,46 @@ doctype_js = {
 # 	}
 # }
 
+doc_events = {
+	"*": {
+		"on_update": [
+			"langflow_integration.langflow_integration.api.response_cache.invalidate_document_responses",
+			"langflow_integration.langflow_integration.api.retrieval.record_document_change",
+			"langflow_integration.langflow_integration.api.agent_query.invalidate_agent_queries"
+		],
+		"on_cancel": [
+			"langflow_integration.langflow_integration.api.response_cache.invalidate_document_responses",
+			"langflow_integration.langflow_integration.api.retrieval.record_document_change",
+			"langflow_integration.langflow_integration.api.agent_query.invalidate_agent_queries"
+		],
+		"on_update_after_submit": [
+			"langflow_integration.langflow_integration.api.response_cache.invalidate_document_responses",
+			"langflow_integration.langflow_integration.api.retrieval.record_document_change",
+			"langflow_integration.langflow_integration.api.agent_query.invalidate_agent_queries"
+		],
+		"on_trash": [
+			"langflow_integration.langflow_integration.api.response_cache.invalidate_document_responses",
+			"langflow_integration.langflow_integration.api.retrieval.record_document_change",
+			"langflow_integration.langflow_integration.api.agent_query.invalidate_agent_queries"
+		]
+	},
+	"Job Applicant": {
+		"on_update": "langflow_integration.langflow_integration.api.cv_events.enqueue_cv_extraction"
+	},
+	"DocType": {
+		"on_update": "langflow_integration.langflow_integration.api.schema.clear_schema_cache",
+		"on_trash": "langflow_integration.langflow_integration.api.schema.clear_schema_cache"
+	},
+	"Custom Field": {
+		"on_update": "langflow_integration.langflow_integration.api.schema.clear_schema_cache",
+		"on_trash": "langflow_integration.langflow_integration.api.schema.clear_schema_cache"
+	},
+	"Property Setter": {
+		"on_update": "langflow_integration.langflow_integration.api.schema.clear_schema_cache",
+		"on_trash": "langflow_integration.langflow_integration.api.schema.clear_schema_cache"
+	}
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -172,11 +215,31 @@ doctype_js = {
 # 	],
 # }
 
+scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"langflow_integration.langflow_integration.api.request_log.flush_request_logs"
+		]
+	},
+	"hourly": [
+		"langflow_integration.langflow_integration.api.result_cache.flush_result_cache_access"
+	],
+	"daily": [
+		"langflow_integration.langflow_integration.api.result_cache.prune_result_cache",
+		"langflow_integration.langflow_integration.api.request_log.prune_request_logs"
+	],
+}
+
 # Testing
 # -------
 
 # before_tests = "langflow_integration.install.before_tests"
 
+# Cache
+# -----
+
+clear_cache = "langflow_integration.langflow_integration.api.schema.clear_schema_cache"
+
 # Overriding Methods
 # ------------------------------
 #
@@ -0,0 +1,258 @@
+"""
+Agent Query
+Read-only, paginated data endpoint for Langflow agent tool calls: allow-listed DocTypes and fields,
+index-only filters, keyset pagination, compact columnar JSON and a short-lived cache
+"""
+
+import base64
+import hashlib
+import json
+
+import frappe
+from frappe import _
+from frappe.model import default_fields, no_value_fields
+from frappe.utils import cint
+
+DEFAULT_LIMIT = 50
+DEFAULT_MAX_ROWS = 500
+DEFAULT_TTL = 30
+
+# أعمدة مفهرسة في كل جداول Frappe
+INDEXED_STANDARD_FIELDS = ("name", "modified")
+
+ALLOWED_OPERATORS = {"=", "!=", ">", ">=", "<", "<=", "in", "not in", "between", "like", "is"}
+
+
+class AgentQueryError(Exception):
+    """
+    طلب غير مسموح (DocType أو حقل أو فلتر خارج الإعدادات)
+    """
+
+
+@frappe.whitelist(methods=["GET", "POST"])
+def query_records(doctype, fields=None, filters=None, cursor=None, limit=None):
+    """
+    قراءة سجلات لـ Langflow (أداة في الـ Agent) بمصادقة API key الخاصة بـ Frappe
+    (Authorization: token api_key:api_secret) وصلاحيات ذلك المستخدم
+
+    Args:
+        doctype: نوع المستند (من langflow_agent_doctypes فقط)
+        fields: الحقول المطلوبة (اختياري، الافتراضي كل الحقول المسموحة التي يقرأها المستخدم)
+        filters: {الحقل: القيمة} أو {الحقل: [المعامل، القيمة]} أو [[الحقل، المعامل، القيمة]] على حقول مفهرسة فقط
+        cursor: next_cursor من الصفحة السابقة (اختياري)
+        limit: عدد السجلات (الافتراضي 50، الحد الأقصى langflow_agent_max_rows)
+
+    Returns:
+        dict: {columns: {الحقل: [القيم]}, count, next_cursor}
+    """
+    try:
+        query = _build_query(doctype, fields, filters, cursor, limit)
+
+        cache = frappe.cache()
+        cache_key = _query_cache_key(query)
+        result = cache.get_value(cache_key)
+
+        if result is None:
+            result = _run_query(query)
+            cache.set_value(cache_key, result, expires_in_sec=get_query_ttl())
+        else:
+            result = {**result, "cached": True}
+
+        return result
+
+    except (AgentQueryError, frappe.PermissionError) as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+    except Exception as e:
+        frappe.log_error(f"Agent Query Error: {str(e)}\n{frappe.get_traceback()}", "Langflow Integration")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def invalidate_agent_queries(doc, method=None):
+    """
+    أي تعديل على مستند يُبطل كل نتائج الـ DocType المحفوظة (doc_events)
+
+    المفتاح يتضمن رقم جيل لكل DocType، فزيادته تكفي بدون البحث عن المفاتيح وحذفها.
+    """
+    config = frappe.conf.get("langflow_agent_doctypes")
+    if not config or doc.doctype not in config:
+        return
+
+    cache = frappe.cache()
+    cache.incr(cache.make_key(_generation_key(doc.doctype)))
+
+
+def get_query_ttl():
+    return cint(frappe.conf.get("langflow_agent_query_ttl")) or DEFAULT_TTL
+
+
+def get_max_rows():
+    return cint(frappe.conf.get("langflow_agent_max_rows")) or DEFAULT_MAX_ROWS
+
+
+def get_agent_config(doctype):
+    """
+    إعدادات الـ DocType من langflow_agent_doctypes
+
+    Returns:
+        dict: {fields: الحقول المسموحة، filters: الحقول المسموح الفلترة عليها}
+    """
+    config = (frappe.conf.get("langflow_agent_doctypes") or {})
+    if doctype not in config:
+        raise AgentQueryError(_("DocType {0} is not available to Langflow agents").format(doctype))
+
+    entry = config.get(doctype) if isinstance(config, dict) else None
+    if isinstance(entry, list):
+        entry = {"fields": entry}
+    entry = entry or {}
+
+    meta = frappe.get_meta(doctype)
+    fields = entry.get("fields") or [df.fieldname for df in meta.fields if df.fieldtype not in no_value_fields]
+
+    indexed = [df.fieldname for df in meta.fields if df.search_index or df.unique]
+    filter_fields = {*INDEXED_STANDARD_FIELDS, *indexed, *(entry.get("filters") or [])}
+
+    return {
+        "fields": ["name", *[f for f in fields if f != "name"]],
+        "filters": filter_fields,
+    }
+
+
+def get_readable_fields(doctype):
+    """
+    الحقول التي يقرأها المستخدم الحالي: حقول النظام وحقول مستويات الصلاحية (permlevel) المتاحة له
+    """
+    return {*default_fields, *frappe.get_meta(doctype).get_permitted_fieldnames(permission_type="read")}
+
+
+def _build_query(doctype, fields, filters, cursor, limit):
+    if not frappe.has_permission(doctype, "read"):
+        raise frappe.PermissionError(_("Not permitted to read {0}").format(doctype))
+
+    config = get_agent_config(doctype)
+    readable = get_readable_fields(doctype)
+
+    # بدون fields: كل الحقول المسموحة التي يقرأها المستخدم
+    fields = _parse_json(fields) or [f for f in config["fields"] if f in readable]
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    fields = ["name", *[f.strip() for f in fields if f and f.strip() and f.strip() != "name"]]
+
+    not_allowed = [f for f in fields if f not in config["fields"]]
+    if not_allowed:
+        raise AgentQueryError(_("Fields not available to Langflow agents: {0}").format(", ".join(not_allowed)))
+
+    # get_list يحذف هذه الحقول بصمت، فتختلط الأعمدة في as_list
+    not_permitted = [f for f in fields if f not in readable]
+    if not_permitted:
+        raise frappe.PermissionError(_("Not permitted to read fields: {0}").format(", ".join(not_permitted)))
+
+    conditions = _normalize_filters(_parse_json(filters), config["filters"], readable)
+
+    # keyset pagination على المفتاح الأساسي بدلاً من OFFSET
+    after = _decode_cursor(cursor)
+    if after is not None:
+        conditions.append(["name", ">", after])
+
+    limit = min(cint(limit) or DEFAULT_LIMIT, get_max_rows())
+
+    return {
+        "doctype": doctype,
+        "fields": list(dict.fromkeys(fields)),
+        "filters": conditions,
+        "limit": limit,
+    }
+
+
+def _run_query(query):
+    rows = frappe.get_list(
+        query["doctype"],
+        fields=query["fields"],
+        filters=query["filters"],
+        order_by="name asc",
+        limit_page_length=query["limit"] + 1,
+        as_list=True
+    )
+
+    has_more = len(rows) > query["limit"]
+    rows = rows[:query["limit"]]
+    values = list(zip(*rows)) if rows else [()] * len(query["fields"])
+
+    return {
+        "success": True,
+        "doctype": query["doctype"],
+        "count": len(rows),
+        # عمودي: قائمة قيم لكل حقل بدلاً من تكرار أسماء الحقول في كل صف
+        "columns": {field: list(column) for field, column in zip(query["fields"], values)},
+        "next_cursor": _encode_cursor(rows[-1][0]) if has_more else None,
+    }
+
+
+def _normalize_filters(filters, allowed_fields, readable_fields):
+    if not filters:
+        return []
+
+    if isinstance(filters, dict):
+        filters = [
+            [field, *(value if isinstance(value, (list, tuple)) and len(value) == 2 else ["=", value])]
+            for field, value in filters.items()
+        ]
+
+    conditions = []
+    for condition in filters:
+        if not isinstance(condition, (list, tuple)) or len(condition) != 3:
+            raise AgentQueryError(_("Filters must be [field, operator, value]"))
+
+        field, operator, value = condition
+        operator = str(operator).lower()
+
+        # الفلترة على حقل لا يقرأه المستخدم تكشف قيمته
+        if field not in readable_fields:
+            raise frappe.PermissionError(_("Not permitted to filter on {0}").format(field))
+        if field not in allowed_fields:
+            raise AgentQueryError(_("Filtering on {0} is not allowed (not indexed)").format(field))
+        if operator not in ALLOWED_OPERATORS:
+            raise AgentQueryError(_("Operator {0} is not allowed").format(operator))
+        # like مع % في البداية لا يستخدم الفهرس
+        if operator == "like" and str(value).startswith("%"):
+            raise AgentQueryError(_("Only prefix matches (value%) are allowed with like"))
+
+        conditions.append([field, operator, value])
+
+    return conditions
+
+
+def _query_cache_key(query):
+    cache = frappe.cache()
+    generation = cint(frappe.safe_decode(cache.get(cache.make_key(_generation_key(query["doctype"]))) or 0))
+    raw = json.dumps([frappe.session.user, generation, query], sort_keys=True, default=str)
+    return f"langflow_agent_query::{hashlib.sha256(raw.encode()).hexdigest()}"
+
+
+def _parse_json(value):
+    if isinstance(value, str) and value.strip()[:1] in ("[", "{"):
+        return json.loads(value)
+    return value
+
+
+def _encode_cursor(name):
+    return base64.urlsafe_b64encode(str(name).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        return base64.urlsafe_b64decode(str(cursor).encode()).decode()
+    except ValueError:
+        raise AgentQueryError(_("Invalid cursor"))
+
+
+def _generation_key(doctype):
+    return f"langflow_agent_query_generation::{doctype}"
@@ -0,0 +1,156 @@
+"""
+Langflow Async Client
+httpx-based client for fanning many Langflow calls out from a single worker without a thread per request
+"""
+
+import asyncio
+import time
+
+import frappe
+import httpx
+from frappe import _
+from frappe.utils import cint
+
+from langflow_integration.langflow_integration.api.client_core import (
+    build_run_request,
+    langflow_error_response,
+    start_request_log,
+    success_response,
+)
+from langflow_integration.langflow_integration.api.guard import alangflow_guard
+from langflow_integration.langflow_integration.api.metrics import record_request
+from langflow_integration.langflow_integration.api.request_log import log_langflow_request
+from langflow_integration.langflow_integration.api.retry import async_call_with_retry
+from langflow_integration.langflow_integration.api.transport import get_pool_settings, get_timeout
+
+DEFAULT_ASYNC_CONCURRENCY = 8
+
+
+def build_async_client():
+    """
+    عميل httpx بنفس حدود تجمع الاتصالات والمهلات المستخدمة في الجلسة المتزامنة
+    """
+    pool = get_pool_settings()
+    connect_timeout, read_timeout = get_timeout()
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=pool["pool_maxsize"],
+            max_keepalive_connections=pool["pool_connections"],
+        ),
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+    )
+
+
+async def acall_langflow(flow_id, input_data, session_id=None, tweaks=None, timeout=None, client=None):
+    """
+    نسخة غير متزامنة من call_langflow (نفس شكل النتيجة، نفس الحماية وإعادة المحاولة والتسجيل)
+
+    Args:
+        flow_id: معرف الـ Flow في Langflow
+        input_data: البيانات المدخلة (نص أو JSON)
+        session_id: معرف الجلسة (اختياري)
+        tweaks: تعديلات على معاملات الـ Flow (اختياري)
+        timeout: وقت انتظار القراءة الأقصى بالثواني (اختياري)
+        client: httpx.AsyncClient مشترك (اختياري، يُنشأ عميل مؤقت إذا لم يُمرر)
+
+    Returns:
+        dict: النتيجة مع حالة النجاح والبيانات وعدد المحاولات
+    """
+    if client is None:
+        async with build_async_client() as own_client:
+            return await acall_langflow(flow_id, input_data, session_id, tweaks, timeout, own_client)
+
+    started = time.monotonic()
+    langflow_url = None
+    request_log = None
+    result = None
+    try:
+        if frappe.session.user == 'Guest':
+            frappe.throw(_("Please login to use this feature"))
+
+        if not flow_id:
+            result = {
+                "success": False,
+                "error": _("Flow ID is required")
+            }
+            return result
+
+        request_log = start_request_log(flow_id, session_id)
+        run_request = build_run_request(flow_id, input_data, session_id, tweaks)
+        langflow_url = run_request["langflow_url"]
+
+        async def send(attempt_timeout):
+            connect_timeout, read_timeout = attempt_timeout
+            async with alangflow_guard(flow_id):
+                response = await client.post(
+                    run_request["url"],
+                    content=run_request["body"],
+                    headers=run_request["headers"],
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                )
+                response.raise_for_status()
+                return response
+
+        response, attempts = await async_call_with_retry(send, flow_id, timeout, idempotent=not session_id)
+        data = response.json()
+
+        request_log.update({
+            "attempts": attempts,
+            "request_size": len(run_request["body"]),
+            "response_size": len(response.content),
+        })
+        log_langflow_request(
+            flow_id=flow_id,
+            status="Success",
+            request_data=request_log,
+            response_data=data
+        )
+
+        result = success_response(data, attempts)
+        return result
+
+    except Exception as e:
+        result = langflow_error_response(e, flow_id, langflow_url, request_log)
+        return result
+
+    finally:
+        record_request(
+            "call_langflow_async",
+            flow_id,
+            (time.monotonic() - started) * 1000,
+            bool(result and result.get("success")),
+        )
+
+
+async def arun_many(calls, concurrency=None, on_result=None):
+    """
+    تنفيذ عدة استدعاءات acall_langflow بعميل واحد وحد أقصى للتزامن
+
+    Args:
+        calls: قائمة قواميس بمعاملات acall_langflow (flow_id, input_data, session_id, tweaks, timeout)
+        concurrency: عدد الطلبات المتزامنة (اختياري، الافتراضي langflow_async_concurrency أو 8)
+        on_result: دالة تُستدعى مع (index, result) فور اكتمال كل استدعاء (اختياري، مثلاً لإرسال التقدم)
+
+    Returns:
+        list: النتائج بنفس ترتيب calls
+    """
+    concurrency = max(cint(concurrency) or cint(frappe.conf.get("langflow_async_concurrency")) or DEFAULT_ASYNC_CONCURRENCY, 1)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with build_async_client() as client:
+        async def run_one(index, call):
+            async with semaphore:
+                result = await acall_langflow(client=client, **call)
+            if on_result:
+                on_result(index, result)
+            return result
+
+        return await asyncio.gather(*(run_one(index, call) for index, call in enumerate(calls)))
+
+
+def run_many(calls, concurrency=None, on_result=None):
+    """
+    واجهة متزامنة لـ arun_many (للاستخدام داخل المهام الخلفية)
+    """
+    return asyncio.run(arun_many(calls, concurrency, on_result))
@@ -0,0 +1,543 @@
+"""
+Langflow Bulk Operations
+Fans many Langflow calls out over a bounded worker pool inside a background job
+"""
+
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+from langflow_integration.langflow_integration.api.client_core import extract_output_json
+from langflow_integration.langflow_integration.api.documents import (
+    FETCH_CHUNK_SIZE,
+    fetch_documents,
+    parse_include_fields,
+    serialize_document,
+)
+from langflow_integration.langflow_integration.api.jobs import (
+    DEFAULT_JOB_TIMEOUT,
+    enqueue_langflow_job,
+    publish_job_progress,
+)
+from langflow_integration.langflow_integration.api.prompt_budget import (
+    LangflowBudgetError,
+    budget_document,
+    estimate_tokens,
+    get_token_limit,
+)
+from langflow_integration.langflow_integration.api.transport import get_timeout
+
+DEFAULT_BULK_CONCURRENCY = 4
+MAX_BULK_CONCURRENCY = 16
+MAX_BULK_ITEMS = 1000
+
+# أنواع الحقول التي يمكن كتابة رد الـ AI فيها
+WRITABLE_FIELDTYPES = ("Small Text", "Text", "Long Text", "Text Editor", "Markdown Editor", "Code")
+
+
+@frappe.whitelist()
+def bulk_extract_cv_data(applicant_names=None, filters=None, flow_id=None, concurrency=None):
+    """
+    استخراج بيانات السير الذاتية لعدة متقدمين دفعة واحدة في الخلفية
+
+    Args:
+        applicant_names: قائمة أسماء المتقدمين (اختياري)
+        filters: فلاتر لاختيار المتقدمين بدلاً من القائمة (اختياري)
+        flow_id: معرف الـ Flow الخاص باستخراج البيانات (اختياري)
+        concurrency: عدد الطلبات المتزامنة إلى Langflow (اختياري)
+
+    Returns:
+        dict: job_id لمتابعة التقدم والتقرير النهائي
+    """
+    try:
+        if isinstance(applicant_names, str):
+            applicant_names = json.loads(applicant_names)
+        if isinstance(filters, str):
+            filters = json.loads(filters)
+
+        max_items = cint(frappe.conf.get("langflow_bulk_max_items")) or MAX_BULK_ITEMS
+
+        if applicant_names:
+            names = list(dict.fromkeys(applicant_names))
+        elif filters:
+            # max_items + 1 يكفي لمعرفة تجاوز الحد بدون تحميل كل الأسماء
+            names = frappe.get_list("Job Applicant", filters=filters, pluck="name", limit_page_length=max_items + 1)
+        else:
+            return {
+                "success": False,
+                "error": _("Please select applicants or provide filters")
+            }
+
+        if not names:
+            return {
+                "success": False,
+                "error": _("No applicants matched the selection")
+            }
+
+        if len(names) > max_items:
+            return {
+                "success": False,
+                "error": _("Too many applicants selected. The maximum is {0}").format(max_items)
+            }
+
+        concurrency = get_bulk_concurrency(concurrency)
+
+        # مهلة المهمة تكفي لأسوأ حالة: كل دفعة متزامنة تستهلك مهلة القراءة كاملة
+        _connect_timeout, read_timeout = get_timeout()
+        job_timeout = DEFAULT_JOB_TIMEOUT + int(read_timeout * len(names) / concurrency)
+
+        return enqueue_langflow_job(
+            "langflow_integration.langflow_integration.api.bulk.run_bulk_cv_extraction",
+            queue="long",
+            timeout=job_timeout,
+            applicant_names=names,
+            flow_id=flow_id,
+            concurrency=concurrency
+        )
+
+    except Exception as e:
+        frappe.log_error(f"Bulk CV Extraction Error: {str(e)}\n{frappe.get_traceback()}", "CV Extraction")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def run_bulk_cv_extraction(applicant_names, flow_id=None, concurrency=None):
+    """
+    تنفيذ الاستخراج الجماعي داخل المهمة الخلفية وإرجاع تقرير النجاح والفشل
+    """
+    from langflow_integration.langflow_integration.api.langflow_client import extract_cv_data
+
+    started = time.monotonic()
+    concurrency = get_bulk_concurrency(concurrency)
+
+    attachments = dict(frappe.get_all(
+        "Job Applicant",
+        filters={"name": ["in", applicant_names]},
+        fields=["name", "resume_attachment"],
+        as_list=True
+    ))
+
+    report = {
+        "total": len(applicant_names),
+        "succeeded": 0,
+        "failed": 0,
+        "concurrency": concurrency,
+        "results": [],
+    }
+
+    def record(applicant_name, result):
+        result = result or {}
+        entry = {"applicant": applicant_name, "success": bool(result.get("success"))}
+        if entry["success"]:
+            report["succeeded"] += 1
+            entry["output"] = result.get("output")
+        else:
+            report["failed"] += 1
+            entry["error"] = result.get("error")
+        report["results"].append(entry)
+
+        publish_job_progress({
+            "done": report["succeeded"] + report["failed"],
+            "total": report["total"],
+            "succeeded": report["succeeded"],
+            "failed": report["failed"],
+            "applicant": applicant_name,
+            "success": entry["success"],
+        })
+
+    pending = []
+    for applicant_name in applicant_names:
+        if applicant_name not in attachments:
+            record(applicant_name, {"error": _("Job Applicant not found")})
+        elif not attachments[applicant_name]:
+            record(applicant_name, {"error": _("No CV file attached")})
+        else:
+            pending.append(applicant_name)
+
+    # كل خيط يفتح سياق Frappe خاص به، فلا يوقف ملف بطيء بقية الدفعة
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="langflow-bulk") as executor:
+        futures = {
+            executor.submit(
+                run_in_site_context,
+                frappe.local.site,
+                frappe.local.sites_path,
+                frappe.session.user,
+                extract_cv_data,
+                applicant_name,
+                attachments[applicant_name],
+                flow_id=flow_id
+            ): applicant_name
+            for applicant_name in pending
+        }
+
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"error": str(e)}
+            record(futures[future], result)
+
+    report["duration"] = round(time.monotonic() - started, 3)
+
+    return {
+        "success": True,
+        "report": report,
+        "message": _("{0} of {1} CVs extracted successfully").format(report["succeeded"], report["total"])
+    }
+
+
+@frappe.whitelist()
+def bulk_process_documents(doctype, prompt, names=None, filters=None, flow_id=None, include_fields=None,
+                           target_field=None, docs_per_request=None, concurrency=None):
+    """
+    تطبيق نفس الطلب على عدة مستندات (تحديد من القائمة أو فلاتر) في الخلفية
+
+    Args:
+        doctype: نوع المستند
+        prompt: الطلب أو السؤال
+        names: قائمة أسماء المستندات (اختياري)
+        filters: فلاتر لاختيار المستندات بدلاً من القائمة (اختياري)
+        flow_id: معرف الـ Flow (اختياري، الافتراضي langflow_document_processor_id)
+        include_fields: الحقول المرسلة لكل مستند (اختياري، انظر documents.get_projection)
+        target_field: حقل نصي تُكتب فيه النتيجة لكل مستند (اختياري، وإلا تُرجع في التقرير)
+        docs_per_request: عدد المستندات في كل طلب إلى Langflow (اختياري، ضمن langflow_flow_batch_size)
+        concurrency: عدد الطلبات المتزامنة إلى Langflow (اختياري)
+
+    Returns:
+        dict: job_id لمتابعة التقدم والتقرير النهائي
+    """
+    try:
+        if not frappe.has_permission(doctype, "read"):
+            return {
+                "success": False,
+                "error": _("You don't have permission to access {0}").format(_(doctype))
+            }
+
+        if not prompt:
+            return {
+                "success": False,
+                "error": _("Prompt is required")
+            }
+
+        flow_id = flow_id or frappe.conf.get("langflow_document_processor_id")
+        if not flow_id:
+            return {
+                "success": False,
+                "error": _("Flow ID not configured. Please set 'langflow_document_processor_id' in site_config.json")
+            }
+
+        if target_field:
+            df = frappe.get_meta(doctype).get_field(target_field)
+            if not df or df.fieldtype not in WRITABLE_FIELDTYPES:
+                return {
+                    "success": False,
+                    "error": _("{0} is not a text field of {1}").format(target_field, _(doctype))
+                }
+            if not frappe.has_permission(doctype, "write"):
+                return {
+                    "success": False,
+                    "error": _("You don't have permission to update {0}").format(_(doctype))
+                }
+
+        if isinstance(names, str):
+            names = json.loads(names)
+        if isinstance(filters, str):
+            filters = json.loads(filters)
+
+        max_items = cint(frappe.conf.get("langflow_bulk_max_items")) or MAX_BULK_ITEMS
+
+        if names:
+            names = list(dict.fromkeys(names))
+        elif filters is not None:
+            names = frappe.get_list(doctype, filters=filters, pluck="name", limit_page_length=max_items + 1)
+        else:
+            return {
+                "success": False,
+                "error": _("Please select documents or provide filters")
+            }
+
+        if not names:
+            return {
+                "success": False,
+                "error": _("No documents matched the selection")
+            }
+
+        if len(names) > max_items:
+            return {
+                "success": False,
+                "error": _("Too many documents selected. The maximum is {0}").format(max_items)
+            }
+
+        concurrency = get_bulk_concurrency(concurrency)
+        docs_per_request = get_docs_per_request(flow_id, docs_per_request)
+
+        _connect_timeout, read_timeout = get_timeout()
+        requests_count = math.ceil(len(names) / docs_per_request)
+        job_timeout = DEFAULT_JOB_TIMEOUT + int(read_timeout * requests_count / concurrency)
+
+        return enqueue_langflow_job(
+            "langflow_integration.langflow_integration.api.bulk.run_bulk_document_processing",
+            queue="long",
+            timeout=job_timeout,
+            doctype=doctype,
+            names=names,
+            prompt=prompt,
+            flow_id=flow_id,
+            include_fields=parse_include_fields(include_fields),
+            target_field=target_field,
+            docs_per_request=docs_per_request,
+            concurrency=concurrency
+        )
+
+    except Exception as e:
+        frappe.log_error(f"Bulk AI Processing Error: {str(e)}\n{frappe.get_traceback()}", "Langflow Integration")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def run_bulk_document_processing(doctype, names, prompt, flow_id, include_fields=None, target_field=None,
+                                 docs_per_request=1, concurrency=None):
+    """
+    تنفيذ المعالجة الجماعية داخل المهمة الخلفية
+
+    المستندات تُجلب على دفعات بالحقول المطلوبة فقط، وتُرسل عبر العميل غير المتزامن
+    مع عدة مستندات في الطلب الواحد إذا كان الـ Flow يدعم ذلك.
+    """
+    from langflow_integration.langflow_integration.api.async_client import run_many
+
+    started = time.monotonic()
+    concurrency = get_bulk_concurrency(concurrency)
+    docs_per_request = max(cint(docs_per_request), 1)
+
+    report = {
+        "doctype": doctype,
+        "total": len(names),
+        "succeeded": 0,
+        "failed": 0,
+        "concurrency": concurrency,
+        "docs_per_request": docs_per_request,
+        "requests": 0,
+        "target_field": target_field,
+        "results": [],
+    }
+
+    def record(docname, answer=None, error=None):
+        entry = {"name": docname, "success": error is None}
+
+        if error is None and target_field:
+            error = _write_answer(doctype, docname, target_field, answer)
+            entry["success"] = error is None
+
+        if entry["success"]:
+            report["succeeded"] += 1
+            if not target_field:
+                entry["answer"] = answer
+        else:
+            report["failed"] += 1
+            entry["error"] = error
+        report["results"].append(entry)
+
+        publish_job_progress({
+            "done": report["succeeded"] + report["failed"],
+            "total": report["total"],
+            "succeeded": report["succeeded"],
+            "failed": report["failed"],
+            "name": docname,
+            "success": entry["success"],
+        })
+
+    token_limit = get_token_limit(flow_id)
+
+    def build_calls(groups, documents, unanswered):
+        """
+        مدخلات كل طلب: الطلب المجمع الأكبر من الحد يُفك إلى طلبات منفردة،
+        والمستند المنفرد يُقص ضمن الحد أو يُرفض قبل الإرسال
+        """
+        sendable, calls = [], []
+
+        for group in groups:
+            if len(group) > 1:
+                input_data = _build_documents_input(prompt, doctype, {n: documents[n] for n in group})
+                if token_limit and estimate_tokens(input_data) > token_limit:
+                    unanswered.extend(group)
+                    continue
+            else:
+                try:
+                    input_data, _budget = budget_document(
+                        flow_id,
+                        documents[group[0]],
+                        lambda data: _build_documents_input(prompt, doctype, {group[0]: data})
+                    )
+                except LangflowBudgetError as e:
+                    record(group[0], error=str(e))
+                    continue
+
+            sendable.append(group)
+            calls.append({"flow_id": flow_id, "input_data": input_data})
+
+        return sendable, calls
+
+    def run_groups(groups, documents):
+        unanswered = []
+        groups, calls = build_calls(groups, documents, unanswered)
+
+        def on_result(index, result):
+            group = groups[index]
+            if not result.get("success"):
+                for docname in group:
+                    record(docname, error=result.get("error") or _("Unknown error"))
+                return
+
+            answers = _split_answers(result["output"]["text"], group)
+            for docname in group:
+                if answers.get(docname) is not None:
+                    record(docname, answer=answers[docname])
+                elif len(group) > 1:
+                    unanswered.append(docname)
+                else:
+                    record(docname, error=_("Langflow returned an empty response"))
+
+        report["requests"] += len(calls)
+        if calls:
+            run_many(calls, concurrency, on_result)
+        return unanswered
+
+    for start in range(0, len(names), FETCH_CHUNK_SIZE):
+        chunk = names[start:start + FETCH_CHUNK_SIZE]
+        documents = fetch_documents(doctype, chunk, include_fields)
+
+        for docname in chunk:
+            if docname not in documents:
+                record(docname, error=_("Document not found or not permitted"))
+
+        available = list(documents)
+        groups = [available[i:i + docs_per_request] for i in range(0, len(available), docs_per_request)]
+
+        # المستندات التي لم يرجع لها الرد المجمع جواباً (أو تجاوز طلبها المجمع الحد) تُعاد منفردة
+        unanswered = run_groups(groups, documents)
+        if unanswered:
+            run_groups([[docname] for docname in unanswered], documents)
+
+        if target_field:
+            frappe.db.commit()
+
+    report["duration"] = round(time.monotonic() - started, 3)
+
+    return {
+        "success": True,
+        "report": report,
+        "message": _("{0} of {1} documents processed successfully").format(report["succeeded"], report["total"])
+    }
+
+
+def get_docs_per_request(flow_id, docs_per_request=None):
+    """
+    عدد المستندات في الطلب الواحد: 1 إلا إذا صرح الـ Flow بدعم الدفعات في langflow_flow_batch_size
+    """
+    max_batch = cint((frappe.conf.get("langflow_flow_batch_size") or {}).get(flow_id)) or 1
+    return max(1, min(cint(docs_per_request) or max_batch, max_batch))
+
+
+def _build_documents_input(prompt, doctype, documents):
+    if len(documents) == 1:
+        docname, doc_data = next(iter(documents.items()))
+        return f"""
+Prompt: {prompt}
+
+Document Type: {doctype}
+Document Name: {docname}
+
+Document Data:
+{serialize_document(doc_data)}
+"""
+
+    return f"""
+Prompt: {prompt}
+
+Document Type: {doctype}
+Documents: {len(documents)}
+
+Apply the prompt to each document separately. Reply with one JSON object that maps each document name to its answer, for example {{"<document name>": "<answer>"}}.
+
+Documents Data (keyed by document name):
+{serialize_document(documents)}
+"""
+
+
+def _split_answers(text, group):
+    """
+    توزيع رد Langflow على مستندات الطلب
+
+    Returns:
+        dict: اسم المستند ← الجواب (المستندات بدون جواب لا تظهر)
+    """
+    if not text:
+        return {}
+
+    if len(group) == 1:
+        return {group[0]: text}
+
+    answers = extract_output_json(text)
+    if not isinstance(answers, dict):
+        return {}
+
+    return {
+        docname: answer if isinstance(answer, str) else json.dumps(answer, ensure_ascii=False)
+        for docname, answer in ((docname, answers.get(docname)) for docname in group)
+        if answer not in (None, "")
+    }
+
+
+def _write_answer(doctype, docname, target_field, answer):
+    """
+    كتابة الجواب في المستند، وإرجاع رسالة الخطأ إن فشلت
+
+    عبر doc.save() وليس db.set_value: التحقق، doc_events (إبطال الكاش والفهرس) وسجل التعديلات.
+    """
+    if not frappe.has_permission(doctype, "write", docname):
+        return _("You don't have permission to update this document")
+
+    savepoint = "langflow_bulk_write"
+    frappe.db.savepoint(savepoint)
+    try:
+        doc = frappe.get_doc(doctype, docname)
+        doc.set(target_field, answer)
+        doc.save()
+    except Exception as e:
+        frappe.db.rollback(save_point=savepoint)
+        return str(e)
+
+    return None
+
+
+def run_in_site_context(site, sites_path, user, fn, *args, **kwargs):
+    """
+    تشغيل دالة داخل خيط منفصل مع سياق Frappe كامل (اتصال قاعدة بيانات ومستخدم)
+    """
+    frappe.init(site=site, sites_path=sites_path)
+    try:
+        frappe.connect()
+        frappe.set_user(user)
+        result = fn(*args, **kwargs)
+        frappe.db.commit()
+        return result
+    finally:
+        frappe.destroy()
+
+
+def get_bulk_concurrency(concurrency=None):
+    """
+    عدد الطلبات المتزامنة ضمن الحدود المسموحة في site_config.json
+    """
+    max_concurrency = cint(frappe.conf.get("langflow_bulk_max_concurrency")) or MAX_BULK_CONCURRENCY
+    concurrency = cint(concurrency) or cint(frappe.conf.get("langflow_bulk_concurrency")) or DEFAULT_BULK_CONCURRENCY
+    return max(1, min(concurrency, max_concurrency))
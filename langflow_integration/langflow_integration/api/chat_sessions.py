@@ -0,0 +1,287 @@
+"""
+Langflow Chat Sessions
+Server-side chat sessions per user: history, injected context, idle expiry and incremental compaction
+"""
+
+import hashlib
+from contextlib import contextmanager
+
+import frappe
+from frappe import _
+from frappe.utils import cint, now_datetime
+
+from langflow_integration.langflow_integration.api.prompt_budget import estimate_tokens
+
+DEFAULT_IDLE_TTL = 24 * 60 * 60
+DEFAULT_MAX_TURNS = 12
+DEFAULT_KEEP_TURNS = 3
+DEFAULT_SUMMARY_TOKENS = 600
+DEFAULT_HISTORY_LIMIT = 100
+
+# طول كل رسالة داخل ملخص المحادثة
+SUMMARY_LINE_CHARS = 300
+
+# قفل تحديث الجلسة (القراءة والتعديل والحفظ تستغرق أجزاء من الثانية)
+SESSION_LOCK_TIMEOUT = 10
+SESSION_LOCK_WAIT = 5
+
+
+def get_chat_session(session_id=None, doctype=None):
+    """
+    استئناف جلسة المستخدم أو إنشاء جلسة جديدة
+
+    بدون session_id تُستأنف آخر جلسة نشطة للمستخدم على نفس الـ DocType.
+    جلسة مستخدم آخر ترفع PermissionError.
+    الجلسة الجديدة تأخذ معرفاً يولده الخادم دائماً (وليس session_id القادم من المتصفح)،
+    ويصل إلى المتصفح في session_id من الرد.
+
+    Returns:
+        dict: الجلسة
+    """
+    if not session_id:
+        session_id = frappe.cache().get_value(_active_key(frappe.session.user, doctype), expires=True)
+
+    session = load_chat_session(session_id) if session_id else None
+
+    if session and session["user"] != frappe.session.user:
+        raise frappe.PermissionError(_("Chat session belongs to another user"))
+
+    if not session:
+        session = _new_session(frappe.generate_hash(length=32), doctype)
+
+    return session
+
+
+def load_chat_session(session_id):
+    # expires=True: بدون نسخة frappe.local.cache، فالقراءة الثانية في نفس الطلب ترى آخر حفظ
+    return frappe.cache().get_value(_session_key(session_id), expires=True)
+
+
+def save_chat_session(session):
+    """
+    حفظ الجلسة وتجديد مدة الخمول (تنتهي الجلسة بعد langflow_chat_session_idle_ttl ثانية بلا نشاط)
+    """
+    ttl = get_idle_ttl()
+    session["last_activity"] = str(now_datetime())
+
+    cache = frappe.cache()
+    cache.set_value(_session_key(session["session_id"]), session, expires_in_sec=ttl)
+    cache.set_value(_active_key(session["user"], session["doctype"]), session["session_id"], expires_in_sec=ttl)
+
+
+def needs_context(session, doctype, schema):
+    """
+    هل يجب حقن الـ Schema؟ (لم يُحقن في ذاكرة Langflow الحالية، أو تغير منذ حقنه)
+    """
+    return bool(doctype) and session["context"].get(doctype) != _schema_hash(schema)
+
+
+def get_session_recap(session):
+    """
+    ملخص المحادثة وآخر الرسائل، يُرسل مرة واحدة بعد الضغط لأن ذاكرة Langflow بدأت من جديد
+    """
+    if not session.get("recap_pending"):
+        return ""
+
+    recent = "\n".join(_summary_line(m) for m in session["window"])
+    return f"ملخص المحادثة السابقة:\n{session['summary']}\n\nآخر الرسائل:\n{recent}"
+
+
+def record_chat_turn(session, message, answer, doctype=None, schema=None, sent=True):
+    """
+    حفظ السؤال والرد، وتسجيل الـ Schema المحقون، وضغط المحادثة عند تجاوز langflow_chat_max_turns
+
+    Args:
+        sent: False للردود القادمة من الكاش (تُعرض في السجل فقط، ذاكرة Langflow لم تتغير)
+
+    التعديل يتم على آخر نسخة محفوظة تحت قفل الجلسة، فرسالتان متزامنتان في نفس الجلسة
+    لا تكتب إحداهما فوق الأخرى.
+    """
+    with _session_lock(session["session_id"]):
+        current = load_chat_session(session["session_id"])
+        if current and current["user"] == session["user"]:
+            session.clear()
+            session.update(current)
+
+        _apply_chat_turn(session, message, answer, doctype, schema, sent)
+        save_chat_session(session)
+
+
+def _apply_chat_turn(session, message, answer, doctype, schema, sent):
+    at = str(now_datetime())
+    messages = [
+        {"role": "user", "text": message, "at": at},
+        {"role": "ai", "text": answer or "", "at": at},
+    ]
+    session["history"] = (session["history"] + messages)[-get_history_limit():]
+
+    if not sent:
+        return
+
+    if doctype and schema is not None:
+        session["context"][doctype] = _schema_hash(schema)
+
+    session["recap_pending"] = False
+    session["window"].extend(messages)
+    session["turns"] += 1
+
+    if session["turns"] >= get_max_turns():
+        compact_chat_session(session)
+
+
+def compact_chat_session(session):
+    """
+    ضغط تدريجي: الرسائل القديمة تُضاف إلى الملخص (ويُحذف الأقدم منه عند تجاوز الحد)،
+    وآخر langflow_chat_keep_turns أسئلة تبقى كما هي، ثم تبدأ جلسة Langflow جديدة بذاكرة فارغة
+    """
+    keep = cint(frappe.conf.get("langflow_chat_keep_turns")) or DEFAULT_KEEP_TURNS
+    older, recent = session["window"][:-keep * 2], session["window"][-keep * 2:]
+
+    lines = [line for line in session["summary"].split("\n") if line]
+    lines.extend(_summary_line(m) for m in older)
+
+    limit = cint(frappe.conf.get("langflow_chat_summary_tokens")) or DEFAULT_SUMMARY_TOKENS
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > limit:
+        lines.pop(0)
+
+    session.update({
+        "summary": "\n".join(lines),
+        "window": recent,
+        "turns": 0,
+        "compactions": session.get("compactions", 0) + 1,
+        "langflow_session_id": frappe.generate_hash(length=32),
+        # الذاكرة الجديدة لا تحتوي الـ Schema ولا المحادثة السابقة
+        "context": {},
+        "recap_pending": True,
+    })
+
+
+@frappe.whitelist()
+def get_chat_history(doctype=None, session_id=None):
+    """
+    الجلسة النشطة للمستخدم ورسائلها (لاستئناف المحادثة بعد إعادة تحميل الصفحة)
+
+    Args:
+        doctype: نوع المستند (للجلسة النشطة على قائمته)
+        session_id: معرف الجلسة (اختياري)
+
+    Returns:
+        dict: معرف الجلسة والرسائل
+    """
+    try:
+        session = get_chat_session(session_id, doctype)
+
+        return {
+            "success": True,
+            "session_id": session["session_id"],
+            "history": session["history"],
+            "last_activity": session.get("last_activity"),
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+@frappe.whitelist(methods=["POST"])
+def end_chat_session(doctype=None, session_id=None):
+    """
+    إنهاء الجلسة (محادثة جديدة)
+
+    Returns:
+        dict: حالة الحذف
+    """
+    try:
+        session = get_chat_session(session_id, doctype)
+
+        cache = frappe.cache()
+        cache.delete_value([_session_key(session["session_id"]), _active_key(session["user"], session["doctype"])])
+
+        return {
+            "success": True
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def get_idle_ttl():
+    return cint(frappe.conf.get("langflow_chat_session_idle_ttl")) or DEFAULT_IDLE_TTL
+
+
+def get_max_turns():
+    return cint(frappe.conf.get("langflow_chat_max_turns")) or DEFAULT_MAX_TURNS
+
+
+def get_history_limit():
+    return cint(frappe.conf.get("langflow_chat_history_limit")) or DEFAULT_HISTORY_LIMIT
+
+
+def _new_session(session_id, doctype):
+    now = str(now_datetime())
+    return {
+        "session_id": session_id,
+        "user": frappe.session.user,
+        "doctype": doctype,
+        "created": now,
+        "last_activity": now,
+        # معرف الذاكرة في Langflow، يُولد على الخادم (وليس session_id القادم من المتصفح) ويتغير عند كل ضغط
+        "langflow_session_id": frappe.generate_hash(length=32),
+        # DocType ← بصمة الـ Schema المحقون في ذاكرة Langflow الحالية
+        "context": {},
+        "history": [],
+        # رسائل ذاكرة Langflow الحالية (تُضغط إلى summary)
+        "window": [],
+        "summary": "",
+        "turns": 0,
+        "recap_pending": False,
+    }
+
+
+@contextmanager
+def _session_lock(session_id):
+    cache = frappe.cache()
+    lock = cache.lock(
+        cache.make_key(f"langflow_chat_lock::{session_id}"),
+        timeout=SESSION_LOCK_TIMEOUT,
+        blocking_timeout=SESSION_LOCK_WAIT
+    )
+
+    if not lock.acquire():
+        # الرد وصل من Langflow بالفعل: الحفظ بدون قفل أفضل من فقدانه
+        frappe.logger().warning(f"Chat session {session_id} is locked, saving the turn without the lock")
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            # انتهت مدة القفل قبل التحرير
+            pass
+
+
+def _summary_line(message):
+    text = " ".join(str(message.get("text") or "").split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS] + "…"
+    return f"{'User' if message['role'] == 'user' else 'AI'}: {text}"
+
+
+def _schema_hash(schema):
+    return hashlib.sha1(str(schema).encode()).hexdigest()
+
+
+def _session_key(session_id):
+    return f"langflow_chat_session::{session_id}"
+
+
+def _active_key(user, doctype):
+    return f"langflow_chat_active::{user}::{doctype or ''}"
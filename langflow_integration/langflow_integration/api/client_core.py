@@ -0,0 +1,299 @@
+"""
+Langflow Client Core
+Transport-independent pieces shared by the sync (requests) and async (httpx) Langflow clients:
+request building, stream event parsing, error classification and result shaping
+"""
+
+import json
+import re
+import time
+
+import frappe
+import httpx
+import requests
+from frappe import _
+from frappe.utils import cint, now_datetime
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+from langflow_integration.langflow_integration.api.prompt_budget import LangflowBudgetError, check_prompt_budget
+from langflow_integration.langflow_integration.api.request_log import log_langflow_request
+from langflow_integration.langflow_integration.api.transport import get_langflow_headers, get_langflow_url
+
+
+class LangflowGuardError(Exception):
+    """
+    رفض الطلب قبل إرساله (القاطع مفتوح، تجاوز حد التزامن أو حد المعدل)
+    """
+
+
+class LangflowStreamError(Exception):
+    """
+    حدث error أو انتهاء البث بدون نتيجة
+    """
+
+
+def build_run_payload(input_data, session_id=None, tweaks=None):
+    payload = {
+        "input_value": str(input_data),
+        "output_type": "chat",
+        "input_type": "chat",
+    }
+
+    if session_id:
+        payload["session_id"] = str(session_id)
+
+    if tweaks and isinstance(tweaks, dict):
+        payload["tweaks"] = tweaks
+
+    return payload
+
+
+def build_run_request(flow_id, input_data, session_id=None, tweaks=None, stream=False):
+    """
+    كل ما يلزم لإرسال طلب run إلى Langflow بأي مكتبة HTTP
+
+    يرفع LangflowBudgetError إذا تجاوزت المدخلات حد الـ Flow (قبل أي اتصال بالشبكة).
+
+    Returns:
+        dict: langflow_url, url, params, headers, body (bytes)
+    """
+    check_prompt_budget(flow_id, input_data)
+    langflow_url = get_langflow_url()
+
+    return {
+        "langflow_url": langflow_url,
+        "url": f"{langflow_url}/api/v1/run/{flow_id}",
+        "params": {"stream": "true"} if stream else None,
+        "headers": {"Content-Type": "application/json", **get_langflow_headers()},
+        "body": json.dumps(build_run_payload(input_data, session_id, tweaks)).encode(),
+    }
+
+
+def parse_stream_line(line, on_chunk=None):
+    """
+    معالجة سطر واحد من بث Langflow (سطر JSON لكل حدث: token / add_message / end / error)
+
+    Returns:
+        dict: النتيجة النهائية عند حدث end، وإلا None
+    """
+    if not line:
+        return None
+
+    if line.startswith("data:"):
+        line = line[len("data:"):].strip()
+
+    try:
+        event = json.loads(line)
+    except ValueError:
+        return None
+
+    event_type = event.get("event")
+    data = event.get("data") or {}
+
+    if event_type == "token":
+        if on_chunk and data.get("chunk"):
+            on_chunk(data["chunk"])
+    elif event_type == "end":
+        return data.get("result") or data
+    elif event_type == "error":
+        raise LangflowStreamError(data.get("error") or data.get("text") or json.dumps(data, ensure_ascii=False))
+
+    return None
+
+
+def stream_result_or_error(result):
+    if result is None:
+        raise LangflowStreamError(_("Langflow stream ended without a result"))
+    return result
+
+
+def success_response(result, attempts=1):
+    return {
+        "success": True,
+        "data": result,
+        "output": normalize_output(result),
+        "message": _("Langflow executed successfully"),
+        "session_id": result.get("session_id"),
+        "attempts": attempts
+    }
+
+
+def extract_output_text(result):
+    """
+    النص الأول في مخرجات Langflow (outputs[0].outputs[0]) أو None
+    """
+    try:
+        output = result["outputs"][0]["outputs"][0]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+    for message in ((output.get("results") or {}).get("message"), (output.get("results") or {}).get("text"), output.get("message")):
+        if isinstance(message, str):
+            return message
+        if isinstance(message, dict) and message.get("text"):
+            return message["text"]
+
+    return None
+
+
+def extract_output_json(text):
+    """
+    البيانات المنظمة داخل نص الرد: JSON كامل، أو كتلة ```json```، أو أول كائن/مصفوفة في النص
+
+    Returns:
+        dict | list: البيانات، أو None إذا لم يحتوِ النص على JSON صالح
+    """
+    if not isinstance(text, str) or not text.strip():
+        return None
+
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    candidates = [text.strip()]
+    if fenced:
+        candidates.append(fenced.group(1).strip())
+    match = re.search(r"[\[{].*[\]}]", text, re.DOTALL)
+    if match:
+        candidates.append(match.group(0))
+
+    for candidate in candidates:
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(data, (dict, list)):
+            return data
+
+    return None
+
+
+def normalize_output(result):
+    """
+    الرد المختصر المرسل للمتصفح بدلاً من مخرجات Langflow الكاملة
+
+    Returns:
+        dict: {text, json}
+    """
+    text = extract_output_text(result)
+    return {
+        "text": text,
+        "json": extract_output_json(text),
+    }
+
+
+def client_response(result, include_raw=0):
+    """
+    شكل الرد النهائي للـ endpoints: output المختصر دائماً، ومخرجات Langflow الكاملة (data) عند include_raw فقط
+    """
+    if not isinstance(result, dict) or "data" not in result:
+        return result
+
+    response = {**result, "output": result.get("output") or normalize_output(result["data"])}
+    if not cint(include_raw):
+        response.pop("data")
+    return response
+
+
+def start_request_log(flow_id, session_id=None):
+    return {
+        "timestamp": now_datetime(),
+        "started": time.monotonic(),
+        "flow_id": flow_id,
+        "session_id": session_id,
+        "user": frappe.session.user
+    }
+
+
+def classify_error(e):
+    """
+    تصنيف موحد لأخطاء requests و httpx
+
+    Returns:
+        str: guard / stream / connect / timeout / connection / http / other
+    """
+    if isinstance(e, (LangflowGuardError, LangflowBudgetError)):
+        return "guard"
+
+    if isinstance(e, LangflowStreamError):
+        return "stream"
+
+    # connect: الطلب لم يصل إلى Langflow أصلاً
+    if isinstance(e, (requests.exceptions.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout)):
+        return "connect"
+
+    if isinstance(e, requests.exceptions.ConnectionError) and e.args:
+        reason = getattr(e.args[0], "reason", None)
+        if isinstance(reason, (NewConnectionError, ConnectTimeoutError)):
+            return "connect"
+
+    if isinstance(e, (requests.exceptions.Timeout, httpx.TimeoutException)):
+        return "timeout"
+
+    if isinstance(e, (requests.exceptions.ConnectionError, httpx.TransportError)):
+        return "connection"
+
+    if isinstance(e, (requests.exceptions.HTTPError, httpx.HTTPStatusError)) and e.response is not None:
+        return "http"
+
+    return "other"
+
+
+def get_error_status(e):
+    response = getattr(e, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def langflow_error_response(e, flow_id, langflow_url=None, request_log=None):
+    """
+    تحويل أخطاء الاتصال بـ Langflow إلى نتيجة فشل موحدة (مع تسجيل الفشل)
+    """
+    kind = classify_error(e)
+
+    if kind == "guard":
+        # رفض مقصود قبل الإرسال، لا داعي لملء Error Log
+        error_msg = str(e)
+        frappe.logger().warning(f"Langflow request rejected - Flow: {flow_id}: {error_msg}")
+
+    elif kind == "timeout":
+        error_msg = _("Request timeout - Langflow took too long to respond")
+        frappe.log_error(f"Langflow Timeout: {flow_id}", "Langflow Integration")
+
+    elif kind in ("connect", "connection"):
+        error_msg = _("Cannot connect to Langflow server. Please check the URL and network connection.")
+        frappe.log_error(f"Langflow Connection Error: {langflow_url}", "Langflow Integration")
+
+    elif kind == "http":
+        try:
+            error_detail = e.response.json()
+            error_msg = f"HTTP Error {e.response.status_code}: {json.dumps(error_detail, ensure_ascii=False)}"
+        except Exception:
+            error_msg = f"HTTP Error {e.response.status_code}: {e.response.text}"
+
+        frappe.log_error(f"Langflow HTTP Error: {error_msg}", "Langflow Integration")
+
+    elif kind == "stream":
+        error_msg = str(e)
+        frappe.log_error(f"Langflow Stream Error: {error_msg}", "Langflow Integration")
+
+    else:
+        error_msg = str(e)
+        frappe.log_error(f"Langflow API Error: {str(e)}\n{frappe.get_traceback()}", "Langflow Integration")
+
+    response = {
+        "success": False,
+        "error": error_msg
+    }
+
+    if hasattr(e, "langflow_attempts"):
+        response["attempts"] = e.langflow_attempts
+
+    if request_log:
+        request_log.update({
+            "attempts": getattr(e, "langflow_attempts", 1),
+            "error": str(error_msg)[:1000],
+        })
+        log_langflow_request(
+            flow_id=flow_id,
+            status="Rejected" if kind == "guard" else "Failed",
+            request_data=request_log
+        )
+
+    return response
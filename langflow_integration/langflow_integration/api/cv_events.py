@@ -0,0 +1,77 @@
+"""
+CV Auto Extraction
+Opt-in doc_events hook that extracts a Job Applicant's CV in the background when it is created or its resume changes
+"""
+
+import frappe
+from frappe.utils import cint
+
+DEFAULT_QUEUE = "long"
+DEFAULT_USER = "Administrator"
+EXTRACTED_EVENT = "langflow_cv_extracted"
+
+# إعادة التنفيذ داخل نفس المهمة إذا تغير الملف أثناء الاستخراج
+MAX_PASSES = 3
+
+
+def enqueue_cv_extraction(doc, method=None):
+    """
+    إضافة الاستخراج إلى الطابور عند إنشاء المتقدم أو تغيير resume_attachment (doc_events)
+
+    الحفظ المتكرر يُدمج في مهمة واحدة لكل متقدم (job_id ثابت مع deduplicate)،
+    والمهمة تقرأ الملف الحالي عند تنفيذها وليس وقت الإضافة.
+    """
+    if not cint(frappe.conf.get("langflow_cv_auto_extract")):
+        return
+
+    if not doc.get("resume_attachment") or not doc.has_value_changed("resume_attachment"):
+        return
+
+    frappe.enqueue(
+        "langflow_integration.langflow_integration.api.cv_events.run_cv_extraction",
+        queue=frappe.conf.get("langflow_cv_auto_extract_queue") or DEFAULT_QUEUE,
+        job_id=f"langflow_cv_extract::{doc.name}",
+        deduplicate=True,
+        enqueue_after_commit=True,
+        applicant_name=doc.name,
+    )
+
+
+def run_cv_extraction(applicant_name):
+    """
+    استخراج السيرة الذاتية وحفظ النتيجة في كاش النتائج، فتظهر فوراً عند ضغط "AI Extract CV"
+
+    تُنفذ باسم langflow_cv_auto_extract_user وليس المستخدم الذي حفظ المتقدم
+    (Guest عند التقديم من بوابة الوظائف، فترفض الصلاحيات الاستخراج).
+    """
+    original_user = frappe.session.user
+    frappe.set_user(frappe.conf.get("langflow_cv_auto_extract_user") or DEFAULT_USER)
+    try:
+        _run_cv_extraction(applicant_name)
+    finally:
+        frappe.set_user(original_user)
+
+
+def _run_cv_extraction(applicant_name):
+    from langflow_integration.langflow_integration.api.langflow_client import extract_cv_data
+
+    processed = None
+    for _pass in range(MAX_PASSES):
+        file_url = frappe.db.get_value("Job Applicant", applicant_name, "resume_attachment")
+        if not file_url or file_url == processed:
+            return
+
+        result = extract_cv_data(applicant_name, file_url)
+        processed = file_url
+
+        if not result.get("success"):
+            frappe.logger().error(f"Automatic CV extraction failed for {applicant_name}: {result.get('error')}")
+            return
+
+        frappe.publish_realtime(
+            EXTRACTED_EVENT,
+            {"applicant": applicant_name, "file_url": file_url, "cached": bool(result.get("cached"))},
+            doctype="Job Applicant",
+            docname=applicant_name,
+            after_commit=False,
+        )
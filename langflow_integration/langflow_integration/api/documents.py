@@ -0,0 +1,191 @@
+"""
+Document Projection
+Loads only the fields an AI prompt needs, for one or many documents, straight from the database
+"""
+
+import json
+
+import frappe
+from frappe.model import default_fields, no_value_fields, table_fields
+from frappe.utils import cint
+
+from langflow_integration.langflow_integration.api.prompt_budget import estimate_tokens
+
+# حقول النظام المرسلة افتراضياً (عند عدم تحديد include_fields)
+DEFAULT_STANDARD_FIELDS = ("name", "creation", "modified", "docstatus")
+
+# عدد المستندات في كل استعلام IN
+FETCH_CHUNK_SIZE = 500
+
+DEFAULT_MAX_CHILD_ROWS = 100
+
+
+def parse_include_fields(include_fields):
+    if isinstance(include_fields, str):
+        include_fields = json.loads(include_fields) if include_fields.strip().startswith("[") else include_fields.split(",")
+    return [f.strip() for f in include_fields or [] if f and f.strip()]
+
+
+def get_projection(doctype, include_fields=None):
+    """
+    تحديد أعمدة المستند والجداول الفرعية المطلوبة
+
+    Args:
+        doctype: نوع المستند
+        include_fields: قائمة الحقول (اختياري)؛ اسم جدول فرعي يعني كل أعمدته،
+            و "items.item_code" يعني عموداً واحداً من الجدول الفرعي
+
+    Returns:
+        tuple: (أعمدة المستند، {اسم الجدول: (DocType الفرعي، الأعمدة)})
+    """
+    meta = frappe.get_meta(doctype)
+    include_fields = parse_include_fields(include_fields)
+
+    if not include_fields:
+        fields = [*DEFAULT_STANDARD_FIELDS, *_data_fields(meta)]
+        tables = {df.fieldname: (df.options, _data_fields(frappe.get_meta(df.options))) for df in meta.get_table_fields()}
+        return fields, tables
+
+    fields = ["name"]
+    tables = {}
+
+    for fieldname in include_fields:
+        fieldname, _sep, column = fieldname.partition(".")
+        df = meta.get_field(fieldname)
+
+        if df and df.fieldtype in table_fields:
+            child_meta = frappe.get_meta(df.options)
+            _child_doctype, columns = tables.setdefault(fieldname, (df.options, []))
+            if not column:
+                columns.extend(_data_fields(child_meta))
+            elif child_meta.has_field(column) or column in default_fields:
+                columns.append(column)
+
+        elif not column and (df and df.fieldtype not in no_value_fields or fieldname in default_fields):
+            fields.append(fieldname)
+
+    return (
+        list(dict.fromkeys(fields)),
+        {name: (child, list(dict.fromkeys(columns))) for name, (child, columns) in tables.items() if columns},
+    )
+
+
+def get_max_child_rows(max_child_rows=None):
+    return cint(max_child_rows) or cint(frappe.conf.get("langflow_max_child_rows")) or DEFAULT_MAX_CHILD_ROWS
+
+
+def fetch_document(doctype, docname, include_fields=None, max_child_rows=None):
+    """
+    جلب مستند واحد بالحقول المطلوبة فقط (بدون get_doc)
+
+    Returns:
+        dict: بيانات المستند، أو None إذا لم يكن موجوداً أو متاحاً للمستخدم
+    """
+    return fetch_documents(doctype, [docname], include_fields, max_child_rows).get(docname)
+
+
+def fetch_documents(doctype, names, include_fields=None, max_child_rows=None):
+    """
+    جلب عدة مستندات بعدد ثابت من الاستعلامات (استعلام للمستندات واستعلام لكل جدول فرعي)
+    بدلاً من get_doc لكل مستند
+
+    الجداول الفرعية تُقص إلى max_child_rows صف لكل مستند، وعدد الصفوف الكامل يُذكر في _truncated.
+
+    Returns:
+        dict: اسم المستند ← بياناته (بنفس ترتيب names، المستندات غير المتاحة تُحذف)
+    """
+    fields, tables = get_projection(doctype, include_fields)
+    max_child_rows = get_max_child_rows(max_child_rows)
+    documents = {}
+
+    for start in range(0, len(names), FETCH_CHUNK_SIZE):
+        chunk = names[start:start + FETCH_CHUNK_SIZE]
+
+        # get_list يطبق صلاحيات المستخدم على المستندات نفسها
+        rows = frappe.get_list(
+            doctype,
+            filters={"name": ["in", chunk]},
+            fields=fields,
+            limit_page_length=0,
+            order_by=None
+        )
+        found = {row.name: row for row in rows}
+
+        for table_field, (child_doctype, columns) in tables.items():
+            for row in found.values():
+                row[table_field] = []
+
+            if not found:
+                continue
+
+            for child in _fetch_child_rows(doctype, table_field, child_doctype, columns, list(found), max_child_rows):
+                row = found[child.pop("parent")]
+                child.pop("_row")
+                total = child.pop("_total")
+                if total > max_child_rows:
+                    row.setdefault("_truncated", {})[table_field] = total
+                row[table_field].append(child)
+
+        documents.update((name, found[name]) for name in chunk if name in found)
+
+    return documents
+
+
+def _fetch_child_rows(parenttype, parentfield, child_doctype, columns, parents, max_rows):
+    """
+    أول max_rows صف (حسب idx) لكل مستند في استعلام واحد، مع عدد صفوف المستند الكامل في _total
+
+    ROW_NUMBER و COUNT على PARTITION BY parent: الحد يُطبق في قاعدة البيانات لكل مستند،
+    فلا تُحمّل كل صفوف الجداول الكبيرة إلى الذاكرة ثم تُقص
+    """
+    # الأعمدة من get_projection (حقول الـ meta فقط)
+    selected = ", ".join(f"`{column}`" for column in ["parent", *columns])
+    return frappe.db.sql(
+        f"""
+        select * from (
+            select {selected},
+                row_number() over (partition by `parent` order by `idx`) as `_row`,
+                count(*) over (partition by `parent`) as `_total`
+            from `tab{child_doctype}`
+            where `parenttype` = %(parenttype)s and `parentfield` = %(parentfield)s and `parent` in %(parents)s
+        ) as `child_rows`
+        where `_row` <= %(max_rows)s
+        order by `parent`, `_row`
+        """,
+        {
+            "parenttype": parenttype,
+            "parentfield": parentfield,
+            "parents": tuple(parents),
+            "max_rows": max_rows,
+        },
+        as_dict=True
+    )
+
+
+def serialize_document(data):
+    """
+    JSON مضغوط بدون مسافات وبدون القيم الفارغة (None، نص فارغ، جداول فارغة)
+    """
+    return json.dumps(_strip_empty(data), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def get_input_size(text):
+    """
+    حجم النص المرسل بالبايت وتقدير عدد الـ tokens
+    """
+    return {
+        "bytes": len(text.encode()),
+        "tokens": estimate_tokens(text),
+    }
+
+
+def _strip_empty(value):
+    if isinstance(value, dict):
+        return {k: v for k, v in ((k, _strip_empty(v)) for k, v in value.items()) if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [_strip_empty(v) for v in value]
+    return value
+
+
+def _data_fields(meta):
+    return [df.fieldname for df in meta.fields if df.fieldtype not in no_value_fields]
@@ -0,0 +1,157 @@
+"""
+Langflow File Upload
+Resolves attachments through the File DocType and streams them to Langflow's upload API,
+reusing the returned file reference for identical content
+"""
+
+import mimetypes
+import os
+import uuid
+from io import BytesIO
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+from langflow_integration.langflow_integration.api.guard import langflow_guard
+from langflow_integration.langflow_integration.api.result_cache import FILE_CHUNK_SIZE
+from langflow_integration.langflow_integration.api.retry import call_with_retry
+from langflow_integration.langflow_integration.api.transport import (
+    get_http_session,
+    get_langflow_headers,
+    get_langflow_url,
+)
+
+DEFAULT_FILE_REF_TTL = 7 * 24 * 60 * 60
+
+
+class MultipartFileStream:
+    """
+    جسم multipart/form-data يُقرأ من الملف على دفعات
+
+    الطول معروف مسبقاً (__len__)، فيرسله requests مع Content-Length دون تحميل الملف في الذاكرة.
+    """
+
+    def __init__(self, file_path, file_name, field="file"):
+        boundary = uuid.uuid4().hex
+        mime_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        file_name = file_name.replace('"', "").replace("\r", "").replace("\n", "")
+
+        head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{file_name}"\r\n'
+            f"Content-Type: {mime_type}\r\n\r\n"
+        ).encode()
+        tail = f"\r\n--{boundary}--\r\n".encode()
+
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._length = len(head) + os.path.getsize(file_path) + len(tail)
+        self._file = open(file_path, "rb")
+        self._parts = [BytesIO(head), self._file, BytesIO(tail)]
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+
+        chunks = []
+        while size > 0 and self._parts:
+            chunk = self._parts[0].read(min(size, FILE_CHUNK_SIZE))
+            if not chunk:
+                self._parts.pop(0)
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+
+        return b"".join(chunks)
+
+    def close(self):
+        self._file.close()
+
+
+def get_attached_file(file_url, doctype=None, docname=None):
+    """
+    سجل الـ File للرابط (المرفق بالمستند أولاً)، مع التحقق من صلاحية قراءة الملفات الخاصة
+
+    Returns:
+        Document: سجل الـ File، أو None إذا لم يكن موجوداً أو متاحاً للمستخدم
+    """
+    filters = {"file_url": file_url}
+    file_name = None
+    if doctype and docname:
+        file_name = frappe.db.get_value("File", {**filters, "attached_to_doctype": doctype, "attached_to_name": docname})
+    file_name = file_name or frappe.db.get_value("File", filters)
+
+    if not file_name:
+        return None
+
+    file_doc = frappe.get_doc("File", file_name)
+    if file_doc.is_private and not file_doc.has_permission("read"):
+        return None
+
+    return file_doc
+
+
+def get_langflow_file_path(flow_id, file_doc, content_hash):
+    """
+    مرجع الملف داخل Langflow: يُرفع مرة واحدة لكل (Flow، بصمة المحتوى) ويُعاد استخدام المرجع بعدها
+
+    Args:
+        flow_id: معرف الـ Flow
+        file_doc: سجل الـ File
+        content_hash: بصمة محتوى الملف (result_cache.get_file_hash)
+
+    Returns:
+        str: المسار الذي أرجعه Langflow (file_path)
+    """
+    cache_key = f"langflow_file_ref::{flow_id}::{content_hash}"
+    file_path = frappe.cache().get_value(cache_key)
+    if file_path:
+        return file_path
+
+    file_path = upload_file_to_langflow(flow_id, file_doc.get_full_path(), file_doc.file_name)
+    frappe.cache().set_value(cache_key, file_path, expires_in_sec=get_file_ref_ttl())
+    return file_path
+
+
+def upload_file_to_langflow(flow_id, file_path, file_name=None):
+    """
+    رفع الملف إلى /api/v1/files/upload/{flow_id} على دفعات (مع حد التزامن وإعادة المحاولة)
+
+    Returns:
+        str: file_path كما أرجعه Langflow
+    """
+    langflow_url = get_langflow_url()
+    url = f"{langflow_url}/api/v1/files/upload/{flow_id}"
+    file_name = file_name or os.path.basename(file_path)
+
+    def send(attempt_timeout):
+        # جسم جديد لكل محاولة لأن المحاولة السابقة استهلكت الملف
+        body = MultipartFileStream(file_path, file_name)
+        try:
+            with langflow_guard(flow_id):
+                response = get_http_session(langflow_url).post(
+                    url,
+                    data=body,
+                    headers={**get_langflow_headers(), "Content-Type": body.content_type},
+                    timeout=attempt_timeout
+                )
+                response.raise_for_status()
+                return response
+        finally:
+            body.close()
+
+    response, _attempts = call_with_retry(send, flow_id)
+    reference = response.json().get("file_path")
+
+    if not reference:
+        frappe.throw(_("Langflow did not return a file reference for {0}").format(file_name))
+
+    frappe.logger().info(f"Uploaded {file_name} to Langflow flow {flow_id}: {reference}")
+    return reference
+
+
+def get_file_ref_ttl():
+    return cint(frappe.conf.get("langflow_file_ref_ttl")) or DEFAULT_FILE_REF_TTL
@@ -0,0 +1,321 @@
+"""
+Langflow Guard
+Cross-worker (Redis) concurrency limiter, circuit breaker and rate limiter in front of the Langflow server
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from langflow_integration.langflow_integration.api.client_core import (
+    LangflowGuardError,
+    classify_error,
+    get_error_status,
+)
+
+DEFAULT_MAX_INFLIGHT = 16
+DEFAULT_MAX_INFLIGHT_PER_FLOW = 8
+DEFAULT_SLOT_WAIT = 5
+DEFAULT_SLOT_LEASE = 300
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30
+DEFAULT_BREAKER_WINDOW = 300
+
+SITE_SCOPE = "*"
+SLOT_POLL_INTERVAL = 0.1
+
+
+def get_guard_settings():
+    """
+    إعدادات الحماية من site_config.json
+    """
+    conf = frappe.conf
+    return {
+        "max_inflight": cint(conf.get("langflow_max_inflight")) or DEFAULT_MAX_INFLIGHT,
+        "max_inflight_per_flow": cint(conf.get("langflow_max_inflight_per_flow")) or DEFAULT_MAX_INFLIGHT_PER_FLOW,
+        "slot_wait": flt(conf.get("langflow_slot_wait", DEFAULT_SLOT_WAIT)),
+        "slot_lease": cint(conf.get("langflow_slot_lease")) or DEFAULT_SLOT_LEASE,
+        "breaker_threshold": cint(conf.get("langflow_breaker_threshold")) or DEFAULT_BREAKER_THRESHOLD,
+        "breaker_cooldown": cint(conf.get("langflow_breaker_cooldown")) or DEFAULT_BREAKER_COOLDOWN,
+        "rate_limit": cint(conf.get("langflow_rate_limit")),
+        "rate_limit_window": cint(conf.get("langflow_rate_limit_window")) or 60,
+    }
+
+
+@contextmanager
+def langflow_guard(flow_id, user=None):
+    """
+    حجز مكان للطلب لدى Langflow وتسجيل نتيجته في القاطع
+
+    يرفع LangflowGuardError قبل أي اتصال بالشبكة إذا كان الطلب مرفوضاً.
+    """
+    settings = get_guard_settings()
+
+    check_circuit(flow_id)
+    check_rate_limit(flow_id, user or frappe.session.user, settings)
+    tokens = acquire_slots(flow_id, settings)
+
+    try:
+        yield
+    except Exception as e:
+        if is_breaker_failure(e):
+            record_failure(flow_id, settings)
+        raise
+    else:
+        record_success(flow_id)
+    finally:
+        release_slots(tokens)
+
+
+@asynccontextmanager
+async def alangflow_guard(flow_id, user=None):
+    """
+    نفس langflow_guard للعميل غير المتزامن
+
+    عمليات Redis (frappe.cache) متزامنة، فتُنفذ في خيط منفصل (asyncio.to_thread)
+    ولا يبقى على الـ event loop إلا الانتظار، فلا توقف باقي الطلبات الجارية.
+    """
+    settings = get_guard_settings()
+    user = user or frappe.session.user
+
+    await asyncio.to_thread(_check_request, flow_id, user, settings)
+    tokens = await aacquire_slots(flow_id, settings)
+
+    try:
+        yield
+    except Exception as e:
+        if is_breaker_failure(e):
+            await asyncio.to_thread(record_failure, flow_id, settings)
+        raise
+    else:
+        await asyncio.to_thread(record_success, flow_id)
+    finally:
+        await asyncio.to_thread(release_slots, tokens)
+
+
+def _check_request(flow_id, user, settings):
+    check_circuit(flow_id)
+    check_rate_limit(flow_id, user, settings)
+
+
+def is_breaker_failure(e):
+    """
+    المهلة وأخطاء الاتصال وأخطاء 5xx تُحسب على القاطع، أما أخطاء 4xx فهي أخطاء الطلب نفسه
+    """
+    kind = classify_error(e)
+
+    if kind in ("connect", "timeout", "connection"):
+        return True
+
+    if kind == "http":
+        return get_error_status(e) >= 500
+
+    return False
+
+
+# ----------------------------------
+# Concurrency limiter
+# ----------------------------------
+
+def acquire_slots(flow_id, settings=None):
+    """
+    حجز مكان على مستوى الموقع ثم على مستوى الـ Flow
+
+    Returns:
+        list: مفاتيح الحجز لتحريرها لاحقاً عبر release_slots
+    """
+    settings = settings or get_guard_settings()
+    deadline = time.monotonic() + settings["slot_wait"]
+    tokens = []
+
+    try:
+        for scope, limit in _slot_scopes(flow_id, settings):
+            while not _try_acquire_slot(scope, limit, settings["slot_lease"], tokens):
+                _check_slot_deadline(scope, deadline)
+                time.sleep(SLOT_POLL_INTERVAL)
+    except Exception:
+        release_slots(tokens)
+        raise
+
+    frappe.cache().sadd("langflow_guard_flows", flow_id)
+    return tokens
+
+
+async def aacquire_slots(flow_id, settings=None):
+    settings = settings or get_guard_settings()
+    deadline = time.monotonic() + settings["slot_wait"]
+    tokens = []
+
+    try:
+        for scope, limit in _slot_scopes(flow_id, settings):
+            while not await asyncio.to_thread(_try_acquire_slot, scope, limit, settings["slot_lease"], tokens):
+                _check_slot_deadline(scope, deadline)
+                await asyncio.sleep(SLOT_POLL_INTERVAL)
+    except BaseException:
+        await asyncio.to_thread(release_slots, tokens)
+        raise
+
+    await asyncio.to_thread(frappe.cache().sadd, "langflow_guard_flows", flow_id)
+    return tokens
+
+
+def release_slots(tokens):
+    if not tokens:
+        return
+
+    cache = frappe.cache()
+    pipe = cache.pipeline()
+    for key, token in tokens:
+        pipe.zrem(key, token)
+    pipe.execute()
+
+
+def _slot_scopes(flow_id, settings):
+    return ((SITE_SCOPE, settings["max_inflight"]), (flow_id, settings["max_inflight_per_flow"]))
+
+
+def _try_acquire_slot(scope, limit, lease, tokens):
+    """
+    سيمافور موزع مبني على sorted set: كل طلب يضيف مفتاحاً بتوقيته، والمفاتيح الأقدم
+    من مدة الحجز تُحذف تلقائياً حتى لا يحجز worker متوقف مكاناً للأبد
+    """
+    cache = frappe.cache()
+    key = _inflight_key(scope)
+    token = frappe.generate_hash(length=12)
+    now = time.time()
+
+    pipe = cache.pipeline()
+    pipe.zremrangebyscore(key, 0, now - lease)
+    pipe.zadd(key, {token: now})
+    pipe.zcard(key)
+    pipe.expire(key, lease)
+    _removed, _added, inflight, _expire = pipe.execute()
+
+    if inflight <= limit:
+        tokens.append((key, token))
+        return True
+
+    cache.pipeline().zrem(key, token).execute()
+    return False
+
+
+def _check_slot_deadline(scope, deadline):
+    if time.monotonic() < deadline:
+        return
+
+    if scope == SITE_SCOPE:
+        raise LangflowGuardError(_("Langflow is busy. Too many AI requests are running on this site, please try again shortly."))
+    raise LangflowGuardError(_("Langflow is busy. Too many requests are running for this flow, please try again shortly."))
+
+
+def get_inflight(scope, lease=None):
+    cache = frappe.cache()
+    key = _inflight_key(scope)
+    lease = lease or get_guard_settings()["slot_lease"]
+    return cache.zcount(key, time.time() - lease, "+inf")
+
+
+# ----------------------------------
+# Circuit breaker
+# ----------------------------------
+
+def check_circuit(flow_id):
+    cache = frappe.cache()
+    retry_after = cache.ttl(_breaker_key(flow_id, "open"))
+    if retry_after and retry_after > 0:
+        raise LangflowGuardError(
+            _("Langflow is temporarily unavailable for this flow after repeated failures. Please try again in {0} seconds.").format(retry_after)
+        )
+
+
+def record_failure(flow_id, settings=None):
+    """
+    بعد N فشل متتالٍ يُفتح القاطع لفترة التهدئة؛ العداد لا يُصفّر عند الفتح
+    فيعيد أول فشل بعد التهدئة فتح القاطع مباشرة (half-open)
+    """
+    settings = settings or get_guard_settings()
+    cache = frappe.cache()
+    failures_key = _breaker_key(flow_id, "failures")
+
+    pipe = cache.pipeline()
+    pipe.incr(failures_key)
+    pipe.expire(failures_key, max(DEFAULT_BREAKER_WINDOW, settings["breaker_cooldown"] * 2))
+    failures, _expire = pipe.execute()
+
+    if failures >= settings["breaker_threshold"]:
+        cache.set(_breaker_key(flow_id, "open"), int(time.time()), ex=settings["breaker_cooldown"])
+        frappe.logger().warning(f"Langflow circuit opened for flow {flow_id} after {failures} consecutive failures")
+
+
+def record_success(flow_id):
+    frappe.cache().delete(_breaker_key(flow_id, "failures"))
+
+
+def reset_circuit(flow_id):
+    cache = frappe.cache()
+    cache.delete(_breaker_key(flow_id, "failures"), _breaker_key(flow_id, "open"))
+
+
+# ----------------------------------
+# Rate limiter
+# ----------------------------------
+
+def check_rate_limit(flow_id, user, settings=None):
+    """
+    حد الطلبات لكل مستخدم ولكل Flow خلال نافذة زمنية ثابتة (معطل إذا كان langflow_rate_limit = 0)
+    """
+    settings = settings or get_guard_settings()
+    if not settings["rate_limit"]:
+        return
+
+    cache = frappe.cache()
+    window = settings["rate_limit_window"]
+    key = cache.make_key(f"langflow_rate::{flow_id}::{user}::{int(time.time() // window)}")
+
+    pipe = cache.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, window)
+    count, _expire = pipe.execute()
+
+    if count > settings["rate_limit"]:
+        raise LangflowGuardError(_("Rate limit exceeded: at most {0} AI requests per {1} seconds").format(settings["rate_limit"], window))
+
+
+# ----------------------------------
+# Status
+# ----------------------------------
+
+def get_guard_status():
+    """
+    حالة الحماية الحالية لكل Flow (للعرض في واجهة الإدارة)
+    """
+    cache = frappe.cache()
+    settings = get_guard_settings()
+
+    flows = {}
+    for flow_id in sorted(frappe.safe_decode(f) for f in cache.smembers("langflow_guard_flows")):
+        open_for = cache.ttl(_breaker_key(flow_id, "open"))
+        flows[flow_id] = {
+            "inflight": get_inflight(flow_id, settings["slot_lease"]),
+            "consecutive_failures": cint(cache.get(_breaker_key(flow_id, "failures"))),
+            "circuit": "open" if open_for and open_for > 0 else "closed",
+            "circuit_retry_after": max(open_for or 0, 0),
+        }
+
+    return {
+        "inflight": get_inflight(SITE_SCOPE, settings["slot_lease"]),
+        "flows": flows,
+        "settings": settings,
+    }
+
+
+def _inflight_key(scope):
+    return frappe.cache().make_key(f"langflow_inflight::{scope}")
+
+
+def _breaker_key(flow_id, name):
+    return frappe.cache().make_key(f"langflow_breaker::{flow_id}::{name}")
@@ -0,0 +1,154 @@
+"""
+Langflow Background Jobs
+Runs Langflow calls on the background workers (RQ) and hands the result back to the browser
+"""
+
+import frappe
+from frappe import _
+
+JOB_EVENT = "langflow_job_update"
+JOB_STATE_TTL = 60 * 60
+DEFAULT_JOB_QUEUE = "default"
+DEFAULT_JOB_TIMEOUT = 600
+
+
+def enqueue_langflow_job(target, queue=None, timeout=None, **kwargs):
+    """
+    إضافة استدعاء Langflow إلى طابور المهام الخلفية وإرجاع معرف المهمة فوراً
+
+    Args:
+        target: المسار الكامل للدالة التي ستُنفذ في الخلفية
+        queue: اسم الطابور (اختياري، الافتراضي langflow_job_queue أو default)
+        timeout: المهلة القصوى للمهمة بالثواني (اختياري)
+        **kwargs: معاملات الدالة
+
+    Returns:
+        dict: حالة الإضافة مع job_id
+    """
+    job_id = frappe.generate_hash(length=20)
+
+    set_job_state(job_id, {
+        "status": "queued",
+        "user": frappe.session.user,
+        "target": target,
+    })
+
+    frappe.enqueue(
+        "langflow_integration.langflow_integration.api.jobs.execute_langflow_job",
+        queue=queue or frappe.conf.get("langflow_job_queue") or DEFAULT_JOB_QUEUE,
+        timeout=timeout or DEFAULT_JOB_TIMEOUT,
+        langflow_job_id=job_id,
+        target=target,
+        target_kwargs=kwargs,
+    )
+
+    return {
+        "success": True,
+        "queued": True,
+        "job_id": job_id,
+        "message": _("Request queued for background processing"),
+    }
+
+
+def execute_langflow_job(langflow_job_id, target, target_kwargs=None):
+    """
+    تنفيذ المهمة داخل الـ worker ثم حفظ النتيجة وإرسالها للمستخدم عبر realtime
+    """
+    state = get_job_state(langflow_job_id) or {"user": frappe.session.user, "target": target}
+    state["status"] = "running"
+    set_job_state(langflow_job_id, state)
+    publish_job_update(langflow_job_id, state)
+
+    # متاح للدالة المنفذة لإرسال التقدم عبر publish_job_progress
+    frappe.local.langflow_job_id = langflow_job_id
+
+    try:
+        result = frappe.get_attr(target)(**(target_kwargs or {}))
+    except Exception as e:
+        frappe.log_error(f"Langflow Job Error: {str(e)}\n{frappe.get_traceback()}", "Langflow Integration")
+        result = {
+            "success": False,
+            "error": str(e)
+        }
+
+    state["status"] = "finished"
+    state["result"] = result
+    set_job_state(langflow_job_id, state)
+    publish_job_update(langflow_job_id, state)
+
+    return result
+
+
+@frappe.whitelist()
+def get_langflow_job(job_id):
+    """
+    الاستعلام عن حالة مهمة خلفية (بديل عن realtime عند انقطاع الاتصال)
+
+    Args:
+        job_id: معرف المهمة
+
+    Returns:
+        dict: حالة المهمة والنتيجة إن وجدت
+    """
+    state = get_job_state(job_id)
+
+    if not state or not _can_access_job(state):
+        return {
+            "success": False,
+            "error": _("Job not found or expired")
+        }
+
+    return {
+        "success": True,
+        "job_id": job_id,
+        "status": state.get("status"),
+        "progress": state.get("progress"),
+        "result": state.get("result"),
+    }
+
+
+def publish_job_progress(progress):
+    """
+    إرسال تقدم المهمة الحالية (يُستدعى من داخل الدالة المنفذة في الخلفية)
+
+    Args:
+        progress: قاموس يصف التقدم الحالي
+    """
+    job_id = getattr(frappe.local, "langflow_job_id", None)
+    if not job_id:
+        return
+
+    state = get_job_state(job_id) or {"user": frappe.session.user, "status": "running"}
+    state["progress"] = progress
+    set_job_state(job_id, state)
+    publish_job_update(job_id, state)
+
+
+def get_job_state(job_id):
+    return frappe.cache().get_value(_job_cache_key(job_id))
+
+
+def set_job_state(job_id, state):
+    frappe.cache().set_value(_job_cache_key(job_id), state, expires_in_sec=JOB_STATE_TTL)
+
+
+def publish_job_update(job_id, state):
+    frappe.publish_realtime(
+        JOB_EVENT,
+        {
+            "job_id": job_id,
+            "status": state.get("status"),
+            "progress": state.get("progress"),
+            "result": state.get("result"),
+        },
+        user=state.get("user"),
+        after_commit=False,
+    )
+
+
+def _can_access_job(state):
+    return state.get("user") == frappe.session.user or frappe.session.user == "Administrator"
+
+
+def _job_cache_key(job_id):
+    return f"langflow_job::{job_id}"
@@ -4,13 +4,74 @@ Handles communication between ERPNext and Langflow AI platform
 """
 
 import frappe
+import os
 import requests
-import json
+import time
 from frappe import _
-from frappe.utils import now_datetime
+from frappe.utils import cint
+
+from langflow_integration.langflow_integration.api.chat_sessions import (
+    get_chat_session,
+    get_session_recap,
+    needs_context,
+    record_chat_turn,
+)
+from langflow_integration.langflow_integration.api.client_core import (
+    client_response,
+    extract_output_text,
+    build_run_request,
+    langflow_error_response,
+    parse_stream_line,
+    start_request_log,
+    stream_result_or_error,
+    success_response,
+)
+from langflow_integration.langflow_integration.api.documents import (
+    fetch_document,
+    get_input_size,
+    parse_include_fields,
+    serialize_document,
+)
+from langflow_integration.langflow_integration.api.file_upload import get_attached_file, get_langflow_file_path
+from langflow_integration.langflow_integration.api.guard import (
+    get_guard_status,
+    langflow_guard,
+    reset_circuit,
+)
+from langflow_integration.langflow_integration.api.jobs import enqueue_langflow_job
+from langflow_integration.langflow_integration.api.metrics import instrument, phase, set_flow
+from langflow_integration.langflow_integration.api.prompt_budget import budget_document, budget_schema
+from langflow_integration.langflow_integration.api.request_log import log_langflow_request
+from langflow_integration.langflow_integration.api.response_cache import (
+    get_cached_response,
+    is_response_cache_enabled,
+    make_response_key,
+    set_cached_response,
+)
+from langflow_integration.langflow_integration.api.result_cache import (
+    get_cached_result,
+    get_file_hash,
+    make_cache_key,
+    set_cached_result,
+)
+
+from langflow_integration.langflow_integration.api.retrieval import retrieve_records
+from langflow_integration.langflow_integration.api.retry import call_with_retry
+from langflow_integration.langflow_integration.api.schema import get_doctype_schema
+from langflow_integration.langflow_integration.api.single_flight import make_flight_key, single_flight
+from langflow_integration.langflow_integration.api.text_extraction import get_cv_text, is_pre_extract_enabled
+from langflow_integration.langflow_integration.api.transport import (
+    get_http_session,
+    get_langflow_headers,
+    get_langflow_url,
+    get_pool_settings,
+    get_timeout,
+)
 
 @frappe.whitelist()
-def extract_cv_data(applicant_name, cv_file_url, flow_id=None):
+@instrument("extract_cv_data")
+def extract_cv_data(applicant_name, cv_file_url, flow_id=None, run_async=0, force_refresh=0, include_raw=0,
+                    pre_extract=None):
     """
     استخراج بيانات السيرة الذاتية باستخدام AI
     
@@ -18,13 +79,20 @@ def extract_cv_data(applicant_name, cv_file_url, flow_id=None):
         applicant_name: اسم المتقدم للوظيفة
         cv_file_url: رابط ملف السيرة الذاتية
         flow_id: معرف الـ Flow الخاص باستخراج البيانات (اختياري)
+        run_async: تنفيذ الطلب في الخلفية وإرجاع job_id فوراً (اختياري)
+        force_refresh: تجاهل النتيجة المحفوظة وإعادة الاستخراج (اختياري)
+        include_raw: إرجاع مخرجات Langflow الكاملة في data (اختياري، الافتراضي output المختصر فقط)
+        pre_extract: استخراج نص الملف محلياً وإرسال النص بدلاً من الملف (اختياري، الافتراضي langflow_cv_pre_extract)
         
     Returns:
-        dict: البيانات المستخرجة
+        dict: البيانات المستخرجة (output: {text, json})، أو job_id عند التنفيذ في الخلفية
     """
     try:
         # التحقق من الصلاحيات
-        if not frappe.has_permission("Job Applicant", "read", applicant_name):
+        with phase("permission"):
+            has_access = frappe.has_permission("Job Applicant", "read", applicant_name)
+        
+        if not has_access:
             return {
                 "success": False,
                 "error": _("You don't have permission to access this applicant")
@@ -47,35 +115,71 @@ def extract_cv_data(applicant_name, cv_file_url, flow_id=None):
                 "error": _("CV extraction flow ID not configured. Please set 'langflow_cv_extract_flow_id' in site_config.json")
             }
         
-        # الحصول على مسار الملف الكامل
-        # file_path = frappe.get_site_path('public', cv_file_url.lstrip('/'))
-        base_path = "/home/frappe/frappe-bench/sites/erpnext.ivalueconsult.com"
-        file_url = cv_file_url
-
-        if file_url.startswith("/"):
-            file_url = file_url[1:]
-
-        file_path = f"{base_path}/{file_url}"
+        set_flow(flow_id)
+        
+        # الملف من سجل الـ File ومسار الموقع (العام أو الخاص)
+        with phase("fetch"):
+            file_doc = get_attached_file(cv_file_url, "Job Applicant", applicant_name)
+            file_path = file_doc.get_full_path() if file_doc else None
         
         # التحقق من وجود الملف
-        import os
-        if not os.path.exists(file_path):
+        if not file_path or not os.path.exists(file_path):
             return {
                 "success": False,
-                "error": _("CV file not found at path: {0}").format(file_path)
+                "error": _("CV file not found: {0}").format(cv_file_url)
             }
         
-        # إرسال المسار الكامل فقط إلى Langflow
-        frappe.logger().info(f"Sending CV file path to Langflow: {file_path}")
+        # نفس الملف مع نفس الـ Flow لا يحتاج استدعاء LLM مرة أخرى
+        # (نتيجة النص المستخرج محلياً تُحفظ منفصلة عن نتيجة الملف)
+        pre_extract = is_pre_extract_enabled(pre_extract)
+        with phase("fetch"):
+            content_hash = get_file_hash(file_path)
+            cache_key = make_cache_key(content_hash, flow_id, {"pre_extract": 1} if pre_extract else None)
+        
+        if not cint(force_refresh):
+            with phase("cache"):
+                cached = get_cached_result(cache_key)
+            if cached is not None:
+                return client_response({**cached, "cached": True}, include_raw)
+        
+        # التنفيذ في الخلفية: النتيجة تصل عبر realtime أو get_langflow_job
+        if cint(run_async):
+            return enqueue_langflow_job(
+                "langflow_integration.langflow_integration.api.langflow_client.extract_cv_data",
+                applicant_name=applicant_name,
+                cv_file_url=cv_file_url,
+                flow_id=flow_id,
+                force_refresh=force_refresh,
+                include_raw=include_raw,
+                pre_extract=pre_extract
+            )
+        
+        # الاستخراج المحلي (اختياري): نص موحد ومحفوظ حسب بصمة الملف بدلاً من تحليل الملف داخل Langflow
+        input_data = None
+        if pre_extract:
+            with phase("extract"):
+                input_data = get_cv_text(file_path, content_hash)
+        pre_extracted = input_data is not None
+        
+        # رفع الملف إلى Langflow على دفعات (مرة واحدة لكل محتوى) بدلاً من مشاركة نظام الملفات
+        # (أيضاً عند فشل الاستخراج المحلي، مثل الملفات الممسوحة ضوئياً)
+        if input_data is None:
+            with phase("upload"):
+                input_data = get_langflow_file_path(flow_id, file_doc, content_hash)
+            frappe.logger().info(f"Sending CV file reference to Langflow: {input_data}")
         
-        # استدعاء Langflow بالمسار فقط
         result = call_langflow(
             flow_id=flow_id,
-            input_data=file_path,  # ✅ إرسال المسار فقط
-            session_id=None
+            input_data=input_data,
+            session_id=None,
+            include_raw=1
         )
+        result["input_size"] = {**get_input_size(input_data), "pre_extracted": pre_extracted}
+        
+        if result.get("success"):
+            set_cached_result(cache_key, result, flow_id=flow_id, content_hash=content_hash)
         
-        return result
+        return client_response(result, include_raw)
         
     except Exception as e:
         frappe.log_error(f"CV Extraction Error: {str(e)}\n{frappe.get_traceback()}", "CV Extraction")
@@ -85,7 +189,8 @@ def extract_cv_data(applicant_name, cv_file_url, flow_id=None):
         }
 
 @frappe.whitelist()
-def call_langflow(flow_id, input_data, session_id=None, tweaks=None, timeout=30):
+@instrument("call_langflow")
+def call_langflow(flow_id, input_data, session_id=None, tweaks=None, timeout=None, include_raw=0):
     """
     استدعاء Langflow flow من ERPNext
     
@@ -94,68 +199,82 @@ def call_langflow(flow_id, input_data, session_id=None, tweaks=None, timeout=30)
         input_data: البيانات المدخلة (نص أو JSON)
         session_id: معرف الجلسة (اختياري)
         tweaks: تعديلات على معاملات الـ Flow (اختياري)
-        timeout: وقت الانتظار الأقصى بالثواني
+        timeout: وقت انتظار القراءة الأقصى بالثواني (الافتراضي langflow_read_timeout أو 30)
+        include_raw: إرجاع مخرجات Langflow الكاملة في data (اختياري)
         
     Returns:
-        dict: النتيجة مع حالة النجاح والبيانات
+        dict: النتيجة مع حالة النجاح والرد المختصر (output: {text, json}) وعدد المحاولات
     """
     try:
         # التحقق البسيط من تسجيل الدخول
         if frappe.session.user == 'Guest':
             frappe.throw(_("Please login to use this feature"))
-        
-        # إعدادات Langflow
-        langflow_url = frappe.conf.get("langflow_url") or "http://localhost:7860"
-        langflow_api_key = frappe.conf.get("langflow_api_key")
-        
-        if not flow_id:
-            return {
-                "success": False,
-                "error": _("Flow ID is required")
-            }
-        
-        # بناء الطلب
-        url = f"{langflow_url}/api/v1/run/{flow_id}"
-        
-        headers = {
-            "Content-Type": "application/json",
-        }
-        
-        if langflow_api_key:
-            headers["x-api-key"] = langflow_api_key
-        
-        payload = {
-            "input_value": str(input_data),
-            "output_type": "chat",
-            "input_type": "chat",
+    except Exception as e:
+        return langflow_error_response(e, flow_id, None, None)
+    
+    if not flow_id:
+        return {
+            "success": False,
+            "error": _("Flow ID is required")
         }
-        
-        if session_id:
-            payload["session_id"] = str(session_id)
-            
-        if tweaks and isinstance(tweaks, dict):
-            payload["tweaks"] = tweaks
-        
+    
+    set_flow(flow_id)
+    
+    # طلبات المستخدم المتطابقة الجارية في نفس الوقت (نقر مزدوج، نفس المستند في عدة تبويبات)
+    # تنتظر استدعاءً واحداً لـ Langflow وتحصل على نتيجته إذا نجح
+    result = single_flight(
+        "call_langflow",
+        flow_id,
+        make_flight_key(flow_id, input_data, tweaks, session_id, frappe.session.user),
+        lambda: _run_langflow(flow_id, input_data, session_id, tweaks, timeout)
+    )
+    
+    return client_response(result, include_raw)
+
+
+def _run_langflow(flow_id, input_data, session_id=None, tweaks=None, timeout=None):
+    """
+    الاستدعاء الفعلي لـ Langflow (بدون تحويل الرد للعميل)
+    """
+    langflow_url = None
+    request_log = None
+    try:
         # تسجيل الطلب
-        request_log = {
-            "timestamp": now_datetime(),
-            "flow_id": flow_id,
-            "input_preview": str(input_data)[:200],
-            "user": frappe.session.user
-        }
-        
-        # إرسال الطلب
-        response = requests.post(
-            url, 
-            json=payload, 
-            headers=headers,
-            timeout=timeout
-        )
-        response.raise_for_status()
-        
-        result = response.json()
+        request_log = start_request_log(flow_id, session_id)
+        
+        # بناء الطلب (نفس البناء المستخدم في العميل غير المتزامن)
+        # المدخلات الأكبر من حد الـ Flow تُرفض هنا قبل أي اتصال بالشبكة
+        with phase("serialize"):
+            run_request = build_run_request(flow_id, input_data, session_id, tweaks)
+        
+        langflow_url = run_request["langflow_url"]
+        
+        # إرسال الطلب عبر الجلسة المشتركة (اتصالات keep-alive جاهزة)
+        # مع حد التزامن والقاطع المشترك بين جميع الـ workers لكل محاولة
+        def send(attempt_timeout):
+            with langflow_guard(flow_id):
+                response = get_http_session(langflow_url).post(
+                    run_request["url"], 
+                    data=run_request["body"], 
+                    headers=run_request["headers"],
+                    timeout=attempt_timeout
+                )
+                response.raise_for_status()
+                return response
+        
+        # إعادة المحاولة عند الأخطاء العابرة (طلبات الجلسات لا تُكرر إلا إذا لم تصل إلى Langflow)
+        with phase("network"):
+            response, attempts = call_with_retry(send, flow_id, timeout, idempotent=not session_id)
+        
+        with phase("parse"):
+            result = response.json()
         
         # تسجيل النجاح
+        request_log.update({
+            "attempts": attempts,
+            "request_size": len(run_request["body"]),
+            "response_size": len(response.content),
+        })
         log_langflow_request(
             flow_id=flow_id,
             status="Success",
@@ -163,52 +282,116 @@ def call_langflow(flow_id, input_data, session_id=None, tweaks=None, timeout=30)
             response_data=result
         )
         
-        return {
-            "success": True,
-            "data": result,
-            "message": _("Langflow executed successfully"),
-            "session_id": result.get("session_id")
-        }
+        return success_response(result, attempts)
         
-    except requests.exceptions.Timeout:
-        error_msg = _("Request timeout - Langflow took too long to respond")
-        frappe.log_error(f"Langflow Timeout: {flow_id}", "Langflow Integration")
-        return {
-            "success": False,
-            "error": error_msg
-        }
+    except Exception as e:
+        return langflow_error_response(e, flow_id, langflow_url, request_log)
+
+
+def stream_langflow(flow_id, input_data, session_id=None, tweaks=None, timeout=None, on_chunk=None):
+    """
+    استدعاء Langflow في وضع البث (stream=true) وتمرير كل جزء من الرد فور وصوله
+    
+    Args:
+        flow_id: معرف الـ Flow في Langflow
+        input_data: البيانات المدخلة (نص أو JSON)
+        session_id: معرف الجلسة (اختياري)
+        tweaks: تعديلات على معاملات الـ Flow (اختياري)
+        timeout: أقصى مدة انتظار بين جزأين متتاليين بالثواني (اختياري)
+        on_chunk: دالة تُستدعى مع كل جزء نصي جديد (اختياري)
         
-    except requests.exceptions.ConnectionError:
-        error_msg = _("Cannot connect to Langflow server. Please check the URL and network connection.")
-        frappe.log_error(f"Langflow Connection Error: {langflow_url}", "Langflow Integration")
-        return {
-            "success": False,
-            "error": error_msg
-        }
+    Returns:
+        dict: نفس شكل نتيجة call_langflow بعد اكتمال الرد
+    """
+    langflow_url = None
+    request_log = None
+    try:
+        if frappe.session.user == 'Guest':
+            frappe.throw(_("Please login to use this feature"))
+        
+        if not flow_id:
+            return {
+                "success": False,
+                "error": _("Flow ID is required")
+            }
         
-    except requests.exceptions.HTTPError as e:
-        try:
-            error_detail = e.response.json()
-            error_msg = f"HTTP Error {e.response.status_code}: {json.dumps(error_detail, ensure_ascii=False)}"
-        except:
-            error_msg = f"HTTP Error {e.response.status_code}: {e.response.text}"
+        request_log = start_request_log(flow_id, session_id)
+        
+        run_request = build_run_request(flow_id, input_data, session_id, tweaks, stream=True)
+        langflow_url = run_request["langflow_url"]
+        emitted = False
+        
+        def forward(chunk):
+            nonlocal emitted
+            emitted = True
+            if on_chunk:
+                on_chunk(chunk)
+        
+        def send(attempt_timeout):
+            with langflow_guard(flow_id):
+                response = get_http_session(langflow_url).post(
+                    run_request["url"],
+                    params=run_request["params"],
+                    data=run_request["body"],
+                    headers=run_request["headers"],
+                    timeout=attempt_timeout,
+                    stream=True
+                )
+                
+                with response:
+                    response.raise_for_status()
+                    
+                    # إصدارات Langflow التي لا تدعم البث ترجع JSON كاملاً
+                    if "application/json" in response.headers.get("Content-Type", ""):
+                        return response.json()
+                    return _consume_langflow_stream(response, forward)
+        
+        # لا إعادة بعد وصول أول جزء إلى المتصفح
+        with phase("network"):
+            result, attempts = call_with_retry(
+                send,
+                flow_id,
+                timeout,
+                idempotent=not session_id,
+                can_retry=lambda: not emitted
+            )
+        
+        request_log.update({
+            "attempts": attempts,
+            "request_size": len(run_request["body"]),
+        })
+        log_langflow_request(
+            flow_id=flow_id,
+            status="Success",
+            request_data=request_log,
+            response_data=result
+        )
         
-        frappe.log_error(f"Langflow HTTP Error: {error_msg}", "Langflow Integration")
-        return {
-            "success": False,
-            "error": error_msg
-        }
+        return success_response(result, attempts)
         
     except Exception as e:
-        frappe.log_error(f"Langflow API Error: {str(e)}\n{frappe.get_traceback()}", "Langflow Integration")
-        return {
-            "success": False,
-            "error": str(e)
-        }
+        return langflow_error_response(e, flow_id, langflow_url, request_log)
+
+
+def _consume_langflow_stream(response, on_chunk=None):
+    """
+    قراءة أحداث البث من Langflow (سطر JSON لكل حدث: token / add_message / end / error)
+    
+    Returns:
+        dict: النتيجة النهائية المرسلة مع حدث end
+    """
+    result = None
+    
+    for line in response.iter_lines(decode_unicode=True):
+        result = parse_stream_line(line, on_chunk) or result
+    
+    return stream_result_or_error(result)
 
 
 @frappe.whitelist()
-def process_document_with_ai(doctype, docname, prompt, flow_id=None, include_fields=None):
+@instrument("process_document_with_ai")
+def process_document_with_ai(doctype, docname, prompt, flow_id=None, include_fields=None, run_async=0, max_child_rows=None,
+                             force_refresh=0, include_raw=0):
     """
     معالجة مستند ERPNext باستخدام AI من Langflow
     
@@ -217,46 +400,23 @@ def process_document_with_ai(doctype, docname, prompt, flow_id=None, include_fie
         docname: اسم المستند
         prompt: الطلب أو السؤال
         flow_id: معرف الـ Flow (اختياري، يمكن أخذه من الإعدادات)
-        include_fields: قائمة الحقول المطلوب تضمينها (اختياري)
+        include_fields: قائمة الحقول المطلوب تضمينها (اختياري، مثل ["customer", "items.item_code"])
+        run_async: تنفيذ الطلب في الخلفية وإرجاع job_id فوراً (اختياري)
+        max_child_rows: أقصى عدد صفوف لكل جدول فرعي (اختياري، الافتراضي langflow_max_child_rows أو 100)
+        force_refresh: تجاهل الرد المحفوظ في كاش الردود (اختياري)
+        include_raw: إرجاع مخرجات Langflow الكاملة في data (اختياري)
         
     Returns:
-        dict: النتيجة مع حالة النجاح والبيانات
+        dict: النتيجة مع حالة النجاح والرد المختصر (output: {text, json}) وحجم المدخلات، أو job_id عند التنفيذ في الخلفية
     """
     try:
         # التحقق من صلاحيات المستند فقط
-        if not frappe.has_permission(doctype, "read", docname):
-            frappe.throw(_("You don't have permission to access this document"))
+        with phase("permission"):
+            has_access = frappe.has_permission(doctype, "read", docname)
         
-        # جلب المستند
-        doc = frappe.get_doc(doctype, docname)
-        doc_data = doc.as_dict()
-        
-        # تصفية الحقول إذا تم تحديدها
-        if include_fields:
-            if isinstance(include_fields, str):
-                include_fields = json.loads(include_fields)
-            doc_data = {k: v for k, v in doc_data.items() if k in include_fields}
-        
-        # إزالة الحقول غير الضرورية
-        fields_to_remove = [
-            'modified_by', 'owner', 'idx',
-            '_user_tags', '_comments', '_assign', '_liked_by'
-        ]
-        for field in fields_to_remove:
-            doc_data.pop(field, None)
-        
-        # تحضير البيانات لـ Langflow
-        input_text = f"""
-Prompt: {prompt}
-
-Document Type: {doctype}
-Document Name: {docname}
-
-Document Data:
-{json.dumps(doc_data, indent=2, ensure_ascii=False, default=str)}
-"""
+        if not has_access:
+            frappe.throw(_("You don't have permission to access this document"))
         
-        # استدعاء Langflow
         if not flow_id:
             flow_id = frappe.conf.get("langflow_document_processor_id")
             
@@ -266,9 +426,82 @@ Document Data:
                 "error": _("Flow ID not configured. Please set 'langflow_document_processor_id' in site_config.json")
             }
         
-        result = call_langflow(flow_id, input_text)
+        set_flow(flow_id)
+        
+        # نفس السؤال على مستند لم يتغير (نفس modified) لا يحتاج استدعاء LLM مرة أخرى
+        response_key = None
+        if is_response_cache_enabled(flow_id):
+            with phase("cache"):
+                response_key = make_response_key(
+                    flow_id,
+                    prompt,
+                    doctype,
+                    docname,
+                    frappe.db.get_value(doctype, docname, "modified"),
+                    extra=[parse_include_fields(include_fields), cint(max_child_rows)]
+                )
+                cached = None if cint(force_refresh) else get_cached_response(flow_id, response_key)
+            if cached is not None:
+                return client_response({**cached, "cached": True}, include_raw)
+        
+        # التنفيذ في الخلفية: النتيجة تصل عبر realtime أو get_langflow_job
+        if cint(run_async):
+            return enqueue_langflow_job(
+                "langflow_integration.langflow_integration.api.langflow_client.process_document_with_ai",
+                doctype=doctype,
+                docname=docname,
+                prompt=prompt,
+                flow_id=flow_id,
+                include_fields=include_fields,
+                max_child_rows=max_child_rows,
+                force_refresh=force_refresh,
+                include_raw=include_raw
+            )
+        
+        # جلب الحقول المطلوبة فقط من قاعدة البيانات، مع حد لصفوف الجداول الفرعية
+        with phase("fetch"):
+            doc_data = fetch_document(doctype, docname, include_fields, max_child_rows)
+        
+        if doc_data is None:
+            return {
+                "success": False,
+                "error": _("{0} {1} not found").format(_(doctype), docname)
+            }
+        
+        # تحضير البيانات لـ Langflow (JSON مضغوط بدون القيم الفارغة)
+        # مع قص الأجزاء الأقل أهمية إذا تجاوزت حد الـ Flow
+        with phase("serialize"):
+            input_text, budget = budget_document(
+                flow_id,
+                doc_data,
+                lambda data: f"""
+Prompt: {prompt}
+
+Document Type: {doctype}
+Document Name: {docname}
+
+Document Data:
+{serialize_document(data)}
+"""
+            )
+            input_size = get_input_size(input_text)
+        
+        frappe.logger().info(
+            f"Langflow document input - {doctype} {docname}: {input_size['bytes']} bytes, ~{input_size['tokens']} tokens"
+        )
         
-        return result
+        result = call_langflow(flow_id, input_text, include_raw=1)
+        result["input_size"] = {
+            **input_size,
+            "limit": budget["limit"],
+            "dropped": budget["dropped"],
+            "truncated": doc_data.get("_truncated"),
+        }
+        
+        if response_key and result.get("success"):
+            set_cached_response(flow_id, response_key, result, doctype, docname)
+        
+        return client_response(result, include_raw)
         
     except Exception as e:
         frappe.log_error(f"AI Processing Error: {str(e)}\n{frappe.get_traceback()}", "Langflow Integration")
@@ -279,88 +512,90 @@ Document Data:
 
 
 @frappe.whitelist()
-def chat_with_langflow(message, flow_id=None, session_id=None, doctype=None):
+@instrument("chat_with_langflow")
+def chat_with_langflow(message, flow_id=None, session_id=None, doctype=None, include_raw=0):
     """
     Chat with Langflow
-    - Inject DocType Schema (metadata) on first message only
+    - Server-side session per user (see chat_sessions): resumed after page reload, expires when idle
+    - Inject DocType Schema (metadata) only when the session's Langflow memory does not have it yet
+    - Schema is memoized per DocType (see schema.get_doctype_schema)
+    - Long conversations are compacted into a summary so prompts stay bounded
+    - The top-k matching records are attached to each question (retrieval.py, opt-in per DocType)
+    - Returns the normalized answer (output: {text, json}); Langflow's raw payload only with include_raw
     - No permission checks
     """
 
     try:
+        chat = _prepare_chat_message(message, flow_id, session_id, doctype)
+        if not chat["success"]:
+            return chat
+
+        cached = _get_cached_chat_response(chat, message)
+        if cached is not None:
+            return client_response(cached, include_raw)
+
         # ----------------------------------
-        # Flow ID
+        # Call Langflow
         # ----------------------------------
-        if not flow_id:
-            flow_id = frappe.conf.get("langflow_chat_flow_id")
+        result = call_langflow(
+            flow_id=chat["flow_id"],
+            input_data=chat["input_data"],
+            session_id=chat["langflow_session_id"],
+            include_raw=1
+        )
 
-        if not flow_id:
-            return {
-                "success": False,
-                "error": "Chat flow ID not configured"
-            }
+        _record_chat_turn(chat, result)
+        _cache_chat_response(chat, result)
 
-        if not session_id:
-            session_id = frappe.generate_hash(length=32)
+        return client_response(result, include_raw)
 
-        # ----------------------------------
-        # Session handling (first message only)
-        # ----------------------------------
-        cache = frappe.cache()
-        cache_key = f"langflow_session_initialized::{session_id}"
-
-        context_prefix = ""
-        is_first_message = not cache.get_value(cache_key)
-
-        # if is_first_message and doctype:
-        if doctype:
-            # Mark session as initialized
-            cache.set_value(cache_key, True, expires_in_sec=60 * 60)
-
-            # ----------------------------------
-            # Get DocType Schema (Metadata)
-            # ----------------------------------
-            meta = frappe.get_meta(doctype)
-            output_lines = []
-            
-            # Parent DocType
-            output_lines.append(f"DocType: {meta.name} | Type: Parent")
-            for field in meta.fields:
-                output_lines.append(f"  - {field.fieldname} ({field.fieldtype})")
-            
-            # Child DocTypes
-            for field in meta.fields:
-                if field.fieldtype == "Table":
-                    child_meta = frappe.get_meta(field.options)
-                    output_lines.append(f"\nDocType: {child_meta.name} | Type: Child | Parent Field: {field.fieldname}")
-                    for f in child_meta.fields:
-                        output_lines.append(f"  - {f.fieldname} ({f.fieldtype})")
-            
-            # Convert to single string
-            schema_string = "\n".join(output_lines)
+    except Exception as e:
+        frappe.log_error(
+            message=f"{str(e)}\n{frappe.get_traceback()}",
+            title="Langflow Chat Error"
+        )
+        return {
+            "success": False,
+            "error": str(e)
+        }
 
-            context_prefix = f"""
-أنت مساعد ذكي متصل مباشرة بقاعدة بيانات ERPNext.
 
-هيكل البيانات (Schema):
-{schema_string}
+@frappe.whitelist()
+@instrument("stream_chat_with_langflow")
+def stream_chat_with_langflow(message, flow_id=None, session_id=None, doctype=None, stream_id=None, include_raw=0):
+    """
+    Chat with Langflow (streaming)
+    - Same context and response handling as chat_with_langflow
+    - Tokens are pushed to the browser as they arrive (realtime event: langflow_chat_stream)
+    - Returns the complete response once generation ends
+    """
 
-"""
+    try:
+        chat = _prepare_chat_message(message, flow_id, session_id, doctype)
+        if not chat["success"]:
+            return chat
 
-        # ----------------------------------
-        # Final message
-        # ----------------------------------
-        final_message = f"{context_prefix}\n\n{message}" if context_prefix else message
+        stream_id = stream_id or frappe.generate_hash(length=16)
 
-        # ----------------------------------
-        # Call Langflow
-        # ----------------------------------
-        result = call_langflow(
-            flow_id=flow_id,
-            input_data=final_message,
-            session_id=session_id
+        cached = _get_cached_chat_response(chat, message)
+        if cached is not None:
+            return client_response({**cached, "stream_id": stream_id}, include_raw)
+
+        push_chunk, flush_chunks = _make_stream_publisher(stream_id)
+
+        result = stream_langflow(
+            flow_id=chat["flow_id"],
+            input_data=chat["input_data"],
+            session_id=chat["langflow_session_id"],
+            on_chunk=push_chunk
         )
+        flush_chunks(done=True)
+
+        _record_chat_turn(chat, result)
+        _cache_chat_response(chat, result)
 
-        return result
+        result["stream_id"] = stream_id
+        return client_response(result, include_raw)
 
     except Exception as e:
         frappe.log_error(
@@ -373,6 +608,195 @@ def chat_with_langflow(message, flow_id=None, session_id=None, doctype=None):
         }
 
 
+def _prepare_chat_message(message, flow_id=None, session_id=None, doctype=None):
+    """
+    تجهيز رسالة المحادثة: معرف الـ Flow والجلسة وحقن الـ Schema وملخص المحادثة عند الحاجة
+    """
+    # ----------------------------------
+    # Flow ID
+    # ----------------------------------
+    if not flow_id:
+        flow_id = frappe.conf.get("langflow_chat_flow_id")
+
+    if not flow_id:
+        return {
+            "success": False,
+            "error": "Chat flow ID not configured"
+        }
+
+    set_flow(flow_id)
+
+    # ----------------------------------
+    # Session (owned by the current user)
+    # ----------------------------------
+    try:
+        session = get_chat_session(session_id, doctype)
+    except frappe.PermissionError as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+    recap = get_session_recap(session)
+
+    # ----------------------------------
+    # Get DocType Schema (cached per DocType), only if Langflow's memory lacks it
+    # ----------------------------------
+    schema_string = None
+    if doctype:
+        with phase("fetch"):
+            schema_string = get_doctype_schema(doctype)
+        if not needs_context(session, doctype, schema_string):
+            schema_string = None
+
+    # ----------------------------------
+    # Most relevant records for this question (local BM25 index, opt-in per DocType)
+    # ----------------------------------
+    records = ""
+    if doctype:
+        with phase("retrieve"):
+            records = _records_context(doctype, retrieve_records(doctype, message))
+
+    if schema_string is not None:
+        # ----------------------------------
+        # Final message (schema trimmed to the flow's token limit)
+        # ----------------------------------
+        with phase("serialize"):
+            final_message, budget = budget_schema(
+                flow_id,
+                schema_string,
+                message,
+                lambda schema: _compose_chat_message(message, _schema_context(schema), recap, records)
+            )
+    else:
+        final_message = _compose_chat_message(message, recap=recap, records=records)
+        budget = None
+
+    return {
+        "success": True,
+        "flow_id": flow_id,
+        "session": session,
+        "session_id": session["session_id"],
+        "langflow_session_id": session["langflow_session_id"],
+        "message": message,
+        "input_data": final_message,
+        "doctype": doctype,
+        "schema": schema_string,
+        "budget": budget,
+    }
+
+
+def _compose_chat_message(message, context="", recap="", records=""):
+    return "\n\n".join(part.strip("\n") for part in (context, recap, records, message) if part)
+
+
+def _records_context(doctype, rows):
+    if not rows:
+        return ""
+    lines = "\n".join(serialize_document(row) for row in rows)
+    return f"سجلات {doctype} الأكثر صلة بالسؤال:\n{lines}"
+
+
+def _get_cached_chat_response(chat, message):
+    """
+    Opt-in response cache (per flow): same opening question on the same DocType list
+    - Only while Langflow's memory for the session is empty (no earlier turns or summary):
+      later answers depend on the conversation and would never be asked again verbatim
+    - Keyed on the user's normalized message, not the schema-prefixed input
+    - Scoped to the user: the answer may include records filtered by the user's permissions
+    - Invalidated whenever a document of that DocType is saved
+    """
+    chat["response_key"] = None
+    if not is_response_cache_enabled(chat["flow_id"]):
+        return None
+
+    session = chat["session"]
+    if session["window"] or session["summary"]:
+        return None
+
+    chat["response_key"] = make_response_key(
+        chat["flow_id"],
+        message,
+        chat["doctype"],
+        extra=[frappe.session.user]
+    )
+
+    with phase("cache"):
+        cached = get_cached_response(chat["flow_id"], chat["response_key"])
+
+    if cached is None:
+        return None
+
+    # The answer was not sent through Langflow: shown in the history, but Langflow's memory is unchanged
+    record_chat_turn(chat["session"], message, _output_text(cached), sent=False)
+
+    return {**cached, "session_id": chat["session_id"], "cached": True}
+
+
+def _cache_chat_response(chat, result):
+    if chat.get("response_key") and result.get("success"):
+        set_cached_response(chat["flow_id"], chat["response_key"], result, chat["doctype"])
+
+
+def _schema_context(schema_string):
+    return f"""
+أنت مساعد ذكي متصل مباشرة بقاعدة بيانات ERPNext.
+
+هيكل البيانات (Schema):
+{schema_string}
+
+"""
+
+
+def _record_chat_turn(chat, result):
+    # Save the turn (and the injected schema) only once Langflow has it in its memory
+    if result.get("success"):
+        record_chat_turn(
+            chat["session"],
+            chat["message"],
+            _output_text(result),
+            chat["doctype"],
+            chat["schema"]
+        )
+        result["session_id"] = chat["session_id"]
+
+    # Report schema sections dropped to fit the flow's token limit
+    if chat.get("budget") and chat["budget"]["dropped"]:
+        result["prompt_budget"] = chat["budget"]
+
+
+def _output_text(result):
+    # الردود المحفوظة قبل إضافة output تُقرأ من مخرجات Langflow الكاملة
+    return (result.get("output") or {}).get("text") or extract_output_text(result.get("data"))
+
+
+def _make_stream_publisher(stream_id, interval=0.05):
+    """
+    تجميع أجزاء البث وإرسالها للمتصفح كل interval ثانية بدلاً من رسالة لكل token
+    """
+    buffer = []
+    last_flush = time.monotonic()
+
+    def flush(done=False):
+        nonlocal last_flush
+        if buffer or done:
+            frappe.publish_realtime(
+                "langflow_chat_stream",
+                {"stream_id": stream_id, "chunk": "".join(buffer), "done": done},
+                user=frappe.session.user,
+                after_commit=False
+            )
+            buffer.clear()
+        last_flush = time.monotonic()
+
+    def push(chunk):
+        buffer.append(chunk)
+        if time.monotonic() - last_flush >= interval:
+            flush()
+
+    return push, flush
+
+
 @frappe.whitelist()
 def test_connection():
     """
@@ -382,10 +806,15 @@ def test_connection():
         dict: حالة الاتصال
     """
     try:
-        langflow_url = frappe.conf.get("langflow_url") or "http://localhost:7860"
+        langflow_url = get_langflow_url()
         
         # محاولة الوصول إلى صفحة الصحة
-        response = requests.get(f"{langflow_url}/health", timeout=5)
+        connect_timeout, _read_timeout = get_timeout()
+        response = get_http_session(langflow_url).get(
+            f"{langflow_url}/health",
+            headers=get_langflow_headers(),
+            timeout=(connect_timeout, 5)
+        )
         
         if response.status_code == 200:
             return {
@@ -413,19 +842,6 @@ def test_connection():
         }
 
 
-def log_langflow_request(flow_id, status, request_data, response_data=None):
-    """
-    تسجيل طلبات Langflow (داخلي)
-    """
-    try:
-        # يمكن إضافة DocType خاص للتسجيل لاحقاً
-        frappe.logger().info(f"Langflow Request - Flow: {flow_id}, Status: {status}")
-        
-    except Exception as e:
-        # لا نريد أن يفشل الطلب الأصلي بسبب خطأ في التسجيل
-        frappe.logger().error(f"Failed to log Langflow request: {str(e)}")
-
-
 @frappe.whitelist()
 def get_langflow_config():
     """
@@ -443,10 +859,12 @@ def get_langflow_config():
             }
         
         config = {
-            "langflow_url": frappe.conf.get("langflow_url") or "http://localhost:7860",
+            "langflow_url": get_langflow_url(),
             "api_key_configured": bool(frappe.conf.get("langflow_api_key")),
             "document_processor_id": frappe.conf.get("langflow_document_processor_id"),
-            "chat_flow_id": frappe.conf.get("langflow_chat_flow_id")
+            "chat_flow_id": frappe.conf.get("langflow_chat_flow_id"),
+            "timeout": dict(zip(("connect", "read"), get_timeout())),
+            **get_pool_settings()
         }
         
         return {
@@ -461,9 +879,60 @@ def get_langflow_config():
         }
 
 
+@frappe.whitelist()
+def get_langflow_guard_status():
+    """
+    حالة حد التزامن والقاطع لكل Flow (للإدارة)
+    
+    Returns:
+        dict: الطلبات الجارية وحالة القاطع والإعدادات
+    """
+    try:
+        if not frappe.has_permission("System Settings", "read"):
+            return {
+                "success": False,
+                "error": _("Insufficient permissions")
+            }
+        
+        return {
+            "success": True,
+            "status": get_guard_status()
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
 
 
-
-
-
-
+@frappe.whitelist(methods=["POST"])
+def reset_langflow_circuit(flow_id):
+    """
+    إغلاق القاطع يدوياً لـ Flow معين بعد إصلاح المشكلة
+    
+    Args:
+        flow_id: معرف الـ Flow
+        
+    Returns:
+        dict: حالة العملية
+    """
+    try:
+        if not frappe.has_permission("System Settings", "write"):
+            return {
+                "success": False,
+                "error": _("Insufficient permissions")
+            }
+        
+        reset_circuit(flow_id)
+        
+        return {
+            "success": True,
+            "message": _("Circuit reset for flow {0}").format(flow_id)
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
@@ -0,0 +1,371 @@
+"""
+Langflow Metrics
+Latency histograms, error rates and in-flight counts for the Langflow-backed endpoints, kept in Redis
+"""
+
+import functools
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+# حدود الـ histogram بالمللي ثانية (آخر خانة للقيم الأكبر)
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# نافذة متحركة: خانة لكل دقيقة، تُحذف تلقائياً بعد مدة الاحتفاظ
+SLOT_SECONDS = 60
+RETENTION_MINUTES = 60
+DEFAULT_WINDOW_MINUTES = 15
+
+TOTAL_PHASE = "total"
+NO_FLOW = "-"
+
+
+class RequestTimer:
+    """
+    توقيت طلب واحد مقسم إلى مراحل (permission, fetch, serialize, network, parse)
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.flow_id = None
+        self.phases = {}
+        self.started = time.monotonic()
+
+    def elapsed_ms(self):
+        return (time.monotonic() - self.started) * 1000
+
+
+def instrument(endpoint):
+    """
+    Decorator لقياس زمن الدالة وأخطائها والطلبات الجارية تحت اسم endpoint
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            timer = RequestTimer(endpoint)
+            parent = getattr(frappe.local, "langflow_timer", None)
+            frappe.local.langflow_timer = timer
+            _track_inflight(endpoint, 1)
+
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                frappe.local.langflow_timer = parent
+                _track_inflight(endpoint, -1)
+
+                # المهام المضافة للطابور تُقاس عند تنفيذها في الخلفية
+                if not (isinstance(result, dict) and result.get("queued")):
+                    success = isinstance(result, dict) and bool(result.get("success"))
+                    record_request(endpoint, timer.flow_id, timer.elapsed_ms(), success, timer.phases)
+
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def phase(name):
+    """
+    قياس مرحلة داخل الطلب الحالي (لا يفعل شيئاً خارج دالة مقاسة)
+    """
+    timer = getattr(frappe.local, "langflow_timer", None)
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        if timer:
+            timer.phases[name] = timer.phases.get(name, 0) + (time.monotonic() - started) * 1000
+
+
+def set_flow(flow_id):
+    """
+    ربط القياس الحالي بمعرف الـ Flow
+    """
+    timer = getattr(frappe.local, "langflow_timer", None)
+    if timer:
+        timer.flow_id = flow_id
+
+
+def record_request(endpoint, flow_id, duration_ms, success, phases=None):
+    """
+    تسجيل القياس في الخانة الحالية (نافذة متحركة) وفي العدادات التراكمية (Prometheus)
+    """
+    try:
+        cache = frappe.cache()
+        slot_key = _slot_key(int(time.time() // SLOT_SECONDS))
+        total_key = cache.make_key("langflow_metrics::total")
+        series = f"{endpoint}|{flow_id or NO_FLOW}"
+
+        observations = {TOTAL_PHASE: duration_ms, **(phases or {})}
+
+        pipe = cache.pipeline()
+        for key in (slot_key, total_key):
+            for phase_name, value in observations.items():
+                prefix = f"{series}|{phase_name}"
+                pipe.hincrby(key, f"{prefix}|b{_bucket_index(value)}", 1)
+                pipe.hincrby(key, f"{prefix}|count", 1)
+                pipe.hincrbyfloat(key, f"{prefix}|sum", round(value, 3))
+            if not success:
+                pipe.hincrby(key, f"{series}|{TOTAL_PHASE}|errors", 1)
+        pipe.expire(slot_key, (RETENTION_MINUTES + 1) * SLOT_SECONDS)
+        pipe.execute()
+
+    except Exception as e:
+        # لا نريد أن يفشل الطلب الأصلي بسبب خطأ في القياس
+        frappe.logger().error(f"Failed to record Langflow metrics: {str(e)}")
+
+
+def record_coalesced(endpoint, flow_id, saved_ms):
+    """
+    تسجيل طلب مكرر حصل على نتيجة طلب مطابق جارٍ بدلاً من استدعاء Langflow، والزمن الموفر
+    """
+    try:
+        cache = frappe.cache()
+        slot_key = _slot_key(int(time.time() // SLOT_SECONDS))
+        total_key = cache.make_key("langflow_metrics::total")
+        prefix = f"{endpoint}|{flow_id or NO_FLOW}|{TOTAL_PHASE}"
+
+        pipe = cache.pipeline()
+        for key in (slot_key, total_key):
+            pipe.hincrby(key, f"{prefix}|coalesced", 1)
+            pipe.hincrbyfloat(key, f"{prefix}|saved", round(saved_ms, 3))
+        pipe.expire(slot_key, (RETENTION_MINUTES + 1) * SLOT_SECONDS)
+        pipe.execute()
+
+    except Exception as e:
+        frappe.logger().error(f"Failed to record Langflow metrics: {str(e)}")
+
+
+def get_metrics(window=None):
+    """
+    تجميع الخانات خلال آخر window دقيقة
+
+    Returns:
+        dict: لكل endpoint و flow: العدد، الأخطاء، المعدل، p50/p95/p99 ومراحل الزمن
+    """
+    window = min(cint(window) or DEFAULT_WINDOW_MINUTES, RETENTION_MINUTES)
+    cache = frappe.cache()
+    current_slot = int(time.time() // SLOT_SECONDS)
+
+    pipe = cache.pipeline()
+    for slot in range(current_slot - window + 1, current_slot + 1):
+        pipe.hgetall(_slot_key(slot))
+
+    merged = {}
+    for slot_data in pipe.execute():
+        for field, value in slot_data.items():
+            field = frappe.safe_decode(field)
+            merged[field] = merged.get(field, 0) + flt(frappe.safe_decode(value))
+
+    series = {}
+    for (endpoint, flow_id, phase_name), stats in _group_fields(merged).items():
+        entry = series.setdefault(f"{endpoint}|{flow_id}", {
+            "endpoint": endpoint,
+            "flow_id": None if flow_id == NO_FLOW else flow_id,
+            "phases": {},
+        })
+        summary = _summarize(stats)
+        if phase_name == TOTAL_PHASE:
+            errors = cint(stats.get("errors"))
+            entry.update(summary)
+            entry["errors"] = errors
+            entry["error_rate"] = round(errors / summary["count"], 4) if summary["count"] else 0
+            entry["throughput_per_min"] = round(summary["count"] / window, 3)
+            entry["coalesced"] = cint(stats.get("coalesced"))
+            entry["saved_ms"] = round(flt(stats.get("saved")), 2)
+        else:
+            entry["phases"][phase_name] = summary
+
+    return {
+        "window_minutes": window,
+        "inflight": get_inflight_counts(),
+        "series": sorted(series.values(), key=lambda s: (s["endpoint"], s["flow_id"] or "")),
+    }
+
+
+def get_inflight_counts():
+    inflight = _raw_hgetall(frappe.cache().make_key("langflow_metrics::inflight"))
+    return {
+        frappe.safe_decode(endpoint): max(cint(frappe.safe_decode(count)), 0)
+        for endpoint, count in inflight.items()
+    }
+
+
+def render_prometheus():
+    """
+    العدادات التراكمية بصيغة Prometheus النصية
+    """
+    raw = _raw_hgetall(frappe.cache().make_key("langflow_metrics::total"))
+    merged = {frappe.safe_decode(k): flt(frappe.safe_decode(v)) for k, v in raw.items()}
+
+    lines = [
+        "# HELP langflow_request_duration_seconds Latency of Langflow-backed endpoints by phase",
+        "# TYPE langflow_request_duration_seconds histogram",
+    ]
+    error_lines = [
+        "# HELP langflow_request_errors_total Failed calls of Langflow-backed endpoints",
+        "# TYPE langflow_request_errors_total counter",
+    ]
+    coalesced_lines = [
+        "# HELP langflow_coalesced_requests_total Calls served by an identical in-flight call instead of Langflow",
+        "# TYPE langflow_coalesced_requests_total counter",
+    ]
+    saved_lines = [
+        "# HELP langflow_coalesced_saved_seconds_total Langflow time saved by coalesced calls",
+        "# TYPE langflow_coalesced_saved_seconds_total counter",
+    ]
+
+    for (endpoint, flow_id, phase_name), stats in sorted(_group_fields(merged).items()):
+        labels = f'endpoint="{endpoint}",flow_id="{flow_id}",phase="{phase_name}"'
+        cumulative = 0
+        for index, bound in enumerate(BUCKETS):
+            cumulative += cint(stats["buckets"].get(index))
+            lines.append(f'langflow_request_duration_seconds_bucket{{{labels},le="{bound / 1000:g}"}} {cumulative}')
+        lines.append(f'langflow_request_duration_seconds_bucket{{{labels},le="+Inf"}} {cint(stats.get("count"))}')
+        lines.append(f"langflow_request_duration_seconds_sum{{{labels}}} {flt(stats.get('sum')) / 1000:g}")
+        lines.append(f"langflow_request_duration_seconds_count{{{labels}}} {cint(stats.get('count'))}")
+
+        if phase_name == TOTAL_PHASE:
+            error_lines.append(
+                f'langflow_request_errors_total{{endpoint="{endpoint}",flow_id="{flow_id}"}} {cint(stats.get("errors"))}'
+            )
+            coalesced_lines.append(
+                f'langflow_coalesced_requests_total{{endpoint="{endpoint}",flow_id="{flow_id}"}} {cint(stats.get("coalesced"))}'
+            )
+            saved_lines.append(
+                f'langflow_coalesced_saved_seconds_total{{endpoint="{endpoint}",flow_id="{flow_id}"}} {flt(stats.get("saved")) / 1000:g}'
+            )
+
+    lines.extend(error_lines)
+    lines.extend(coalesced_lines)
+    lines.extend(saved_lines)
+    lines.extend([
+        "# HELP langflow_requests_inflight Langflow-backed calls currently running",
+        "# TYPE langflow_requests_inflight gauge",
+    ])
+    for endpoint, count in sorted(get_inflight_counts().items()):
+        lines.append(f'langflow_requests_inflight{{endpoint="{endpoint}"}} {count}')
+
+    return "\n".join(lines) + "\n"
+
+
+@frappe.whitelist()
+def get_langflow_metrics(window=None):
+    """
+    مقاييس الأداء لجميع واجهات Langflow خلال آخر window دقيقة
+
+    Args:
+        window: عدد الدقائق (اختياري، الافتراضي 15 والحد الأقصى 60)
+
+    Returns:
+        dict: المقاييس
+    """
+    try:
+        if not frappe.has_permission("System Settings", "read"):
+            return {
+                "success": False,
+                "error": _("Insufficient permissions")
+            }
+
+        return {
+            "success": True,
+            "metrics": get_metrics(window)
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+@frappe.whitelist()
+def prometheus_metrics():
+    """
+    نقطة Prometheus (text exposition format)، تُقرأ بمفتاح API لمستخدم لديه صلاحية System Settings
+    """
+    from werkzeug.wrappers import Response
+
+    if not frappe.has_permission("System Settings", "read"):
+        frappe.throw(_("Insufficient permissions"), frappe.PermissionError)
+
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+def _track_inflight(endpoint, delta):
+    try:
+        cache = frappe.cache()
+        cache.pipeline().hincrby(cache.make_key("langflow_metrics::inflight"), endpoint, delta).execute()
+    except Exception:
+        pass
+
+
+def _raw_hgetall(key):
+    # عبر pipeline لتجاوز hgetall الخاص بـ RedisWrapper (يضيف بادئة ويفك pickle)
+    return frappe.cache().pipeline().hgetall(key).execute()[0]
+
+
+def _group_fields(merged):
+    """
+    تحويل حقول الـ hash (endpoint|flow|phase|stat) إلى قاموس لكل سلسلة
+    """
+    grouped = {}
+    for field, value in merged.items():
+        parts = field.rsplit("|", 3)
+        if len(parts) != 4:
+            continue
+        endpoint, flow_id, phase_name, stat = parts
+        stats = grouped.setdefault((endpoint, flow_id, phase_name), {"buckets": {}})
+        if stat.startswith("b"):
+            stats["buckets"][cint(stat[1:])] = value
+        else:
+            stats[stat] = value
+    return grouped
+
+
+def _summarize(stats):
+    count = cint(stats.get("count"))
+    return {
+        "count": count,
+        "avg_ms": round(flt(stats.get("sum")) / count, 2) if count else 0,
+        "p50_ms": _percentile(stats["buckets"], count, 0.50),
+        "p95_ms": _percentile(stats["buckets"], count, 0.95),
+        "p99_ms": _percentile(stats["buckets"], count, 0.99),
+    }
+
+
+def _percentile(buckets, count, quantile):
+    """
+    تقدير النسبة المئوية من الـ histogram بالاستيفاء الخطي داخل الخانة
+    """
+    if not count:
+        return 0
+
+    target = quantile * count
+    cumulative = 0
+    for index in range(len(BUCKETS) + 1):
+        in_bucket = cint(buckets.get(index))
+        if in_bucket and cumulative + in_bucket >= target:
+            if index >= len(BUCKETS):
+                return BUCKETS[-1]
+            lower = BUCKETS[index - 1] if index else 0
+            upper = BUCKETS[index]
+            return round(lower + (upper - lower) * (target - cumulative) / in_bucket, 2)
+        cumulative += in_bucket
+
+    return BUCKETS[-1]
+
+
+def _bucket_index(value):
+    for index, bound in enumerate(BUCKETS):
+        if value <= bound:
+            return index
+    return len(BUCKETS)
+
+
+def _slot_key(slot):
+    return frappe.cache().make_key(f"langflow_metrics::slot::{slot}")
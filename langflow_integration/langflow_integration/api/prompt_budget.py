@@ -0,0 +1,224 @@
+"""
+Prompt Budget
+Offline token estimates, per-flow input limits and priority-ordered trimming of Langflow inputs
+"""
+
+import math
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+# تقدير تقريبي بدون tokenizer: حوالي 4 بايت UTF-8 لكل token
+# (حرف لاتيني ≈ ربع token، حرف عربي ≈ نصف token)
+BYTES_PER_TOKEN = 4
+
+# حدود قص الحقول النصية الطويلة، من الأخف إلى الأشد
+TEXT_LIMITS = (2000, 500, 150)
+TRUNCATION_MARK = "…"
+
+
+class LangflowBudgetError(Exception):
+    """
+    المدخلات أكبر من حد الـ Flow حتى بعد القص (تُرفض قبل الإرسال)
+    """
+
+
+def estimate_tokens(text):
+    return math.ceil(len(str(text).encode()) / BYTES_PER_TOKEN)
+
+
+def get_token_limit(flow_id=None):
+    """
+    حد الـ tokens للمدخلات: langflow_flow_token_limit[flow_id] ثم langflow_max_input_tokens (0 = بدون حد)
+    """
+    per_flow = (frappe.conf.get("langflow_flow_token_limit") or {}).get(flow_id) if flow_id else None
+    return cint(per_flow) or cint(frappe.conf.get("langflow_max_input_tokens"))
+
+
+def check_prompt_budget(flow_id, text):
+    """
+    رفض المدخلات التي تتجاوز حد الـ Flow قبل أي اتصال بالشبكة
+    """
+    limit = get_token_limit(flow_id)
+    if not limit:
+        return
+
+    tokens = estimate_tokens(text)
+    if tokens > limit:
+        raise LangflowBudgetError(
+            _("Input is too large for this flow: about {0} tokens, the limit is {1}").format(tokens, limit)
+        )
+
+
+def trim_to_budget(render, steps, limit):
+    """
+    تطبيق خطوات القص بالترتيب (الأقل أهمية أولاً) حتى يصبح النص ضمن الحد
+
+    Args:
+        render: دالة تبني النص من الحالة الحالية
+        steps: دوال تقص جزءاً من الحالة وترجع False عندما لا يبقى ما تقصه
+        limit: حد الـ tokens
+
+    Returns:
+        str: النص ضمن الحد (يرفع LangflowBudgetError إذا لم يكفِ القص)
+    """
+    text = render()
+
+    for step in steps:
+        while estimate_tokens(text) > limit and step():
+            text = render()
+
+    tokens = estimate_tokens(text)
+    if tokens > limit:
+        raise LangflowBudgetError(
+            _("Input is too large for this flow even after trimming: about {0} tokens, the limit is {1}").format(tokens, limit)
+        )
+
+    return text
+
+
+def budget_document(flow_id, doc_data, render):
+    """
+    بناء مدخلات مستند ضمن حد الـ Flow: تُقص صفوف الجداول الفرعية أولاً ثم الحقول النصية الطويلة
+
+    Args:
+        flow_id: معرف الـ Flow
+        doc_data: بيانات المستند (تُعدل مباشرة عند القص)
+        render: دالة تبني النص من doc_data
+
+    Returns:
+        tuple: (النص، تقرير الميزانية {tokens, limit, dropped})
+    """
+    limit = get_token_limit(flow_id)
+    dropped = {}
+
+    if limit:
+        text = trim_to_budget(
+            lambda: render(doc_data),
+            [_child_rows_step(doc_data, dropped), _long_text_step(doc_data, dropped)],
+            limit
+        )
+    else:
+        text = render(doc_data)
+
+    return text, _budget_report(text, limit, dropped)
+
+
+def budget_schema(flow_id, schema, message, render):
+    """
+    بناء رسالة المحادثة ضمن حد الـ Flow: تُحذف أقسام الجداول الفرعية غير المذكورة في السؤال أولاً،
+    ثم بقية الجداول الفرعية، ثم حقول الـ DocType الرئيسي من الآخر
+
+    Args:
+        flow_id: معرف الـ Flow
+        schema: نص الـ Schema (schema.build_doctype_schema)
+        message: سؤال المستخدم (لتحديد الجداول المستخدمة)
+        render: دالة تبني الرسالة النهائية من نص الـ Schema
+
+    Returns:
+        tuple: (النص، تقرير الميزانية {tokens, limit, dropped})
+    """
+    limit = get_token_limit(flow_id)
+    dropped = {}
+
+    if not limit:
+        text = render(schema)
+        return text, _budget_report(text, limit, dropped)
+
+    parent, *children = schema.split("\n\n")
+    parent_lines = parent.split("\n")
+    message = (message or "").lower()
+
+    def is_used(section):
+        header = section.split("\n", 1)[0]
+        names = [header.split("|", 1)[0].replace("DocType:", "").strip()]
+        if "Parent Field:" in header:
+            names.append(header.rsplit("Parent Field:", 1)[1].strip())
+        return any(name and name.lower() in message for name in names)
+
+    def drop_child(predicate):
+        def step():
+            for section in reversed(children):
+                if predicate(section):
+                    children.remove(section)
+                    dropped.setdefault("schema_sections", []).append(section.split("\n", 1)[0])
+                    return True
+            return False
+        return step
+
+    def drop_parent_field():
+        # السطر الأول عنوان الـ DocType ويبقى دائماً
+        if len(parent_lines) <= 1:
+            return False
+        parent_lines.pop()
+        dropped["schema_fields"] = dropped.get("schema_fields", 0) + 1
+        return True
+
+    text = trim_to_budget(
+        lambda: render("\n\n".join(["\n".join(parent_lines), *children])),
+        [drop_child(lambda section: not is_used(section)), drop_child(lambda section: True), drop_parent_field],
+        limit
+    )
+
+    return text, _budget_report(text, limit, dropped)
+
+
+def _child_rows_step(doc_data, dropped):
+    """
+    في كل خطوة يُقص نصف صفوف أكبر جدول فرعي (من الآخر)
+    """
+    def step():
+        tables = [(field, rows) for field, rows in doc_data.items() if isinstance(rows, list) and rows]
+        if not tables:
+            return False
+
+        field, rows = max(tables, key=lambda table: len(table[1]))
+        keep = len(rows) // 2
+        removed = len(rows) - keep
+
+        child_rows = dropped.setdefault("child_rows", {})
+        child_rows[field] = child_rows.get(field, 0) + removed
+        del rows[keep:]
+        return True
+
+    return step
+
+
+def _long_text_step(doc_data, dropped):
+    """
+    في كل خطوة تُقص النصوص الأطول من الحد التالي في TEXT_LIMITS
+    """
+    limits = list(TEXT_LIMITS)
+
+    def shorten(row, prefix=""):
+        for field, value in row.items():
+            if isinstance(value, str) and len(value) > limits[0]:
+                row[field] = value[:limits[0]] + TRUNCATION_MARK
+                fields = dropped.setdefault("shortened_fields", [])
+                if prefix + field not in fields:
+                    fields.append(prefix + field)
+            elif isinstance(value, list):
+                for child in value:
+                    if isinstance(child, dict):
+                        shorten(child, f"{field}.")
+
+    def step():
+        if not limits:
+            return False
+        shorten(doc_data)
+        limits.pop(0)
+        return True
+
+    return step
+
+
+def _budget_report(text, limit, dropped):
+    if dropped:
+        frappe.logger().info(f"Langflow prompt trimmed to fit {limit} tokens: {dropped}")
+
+    return {
+        "tokens": estimate_tokens(text),
+        "limit": limit or None,
+        "dropped": dropped,
+    }
@@ -0,0 +1,135 @@
+"""
+Langflow Request Log
+Buffers request log entries in Redis on the hot path and bulk-inserts them into "Langflow Request Log" from the scheduler
+"""
+
+import json
+import time
+
+import frappe
+from frappe.utils import add_days, cint, now_datetime
+
+LOG_DOCTYPE = "Langflow Request Log"
+BUFFER_KEY = "langflow_request_log_buffer"
+DEFAULT_RETENTION_DAYS = 30
+
+# حد أعلى للمخزن المؤقت إذا توقف المجدول، حتى لا تمتلئ ذاكرة Redis
+MAX_BUFFER_SIZE = 50000
+FLUSH_BATCH_SIZE = 1000
+MAX_FLUSH_BATCHES = 50
+
+LOG_FIELDS = (
+    "flow_id",
+    "status",
+    "user",
+    "session_id",
+    "timestamp",
+    "duration",
+    "attempts",
+    "request_size",
+    "response_size",
+    "error",
+)
+
+
+def log_langflow_request(flow_id, status, request_data, response_data=None):
+    """
+    تسجيل طلبات Langflow (داخلي)
+
+    السجل يُضاف إلى مخزن مؤقت في Redis، وينقله المجدول إلى Langflow Request Log على دفعات
+    """
+    try:
+        entry = dict(request_data or {})
+        started = entry.pop("started", None)
+        if started is not None:
+            entry["duration"] = round((time.monotonic() - started) * 1000, 2)
+        entry["flow_id"] = flow_id
+        entry["status"] = status
+
+        buffer_request_log(entry)
+        frappe.logger().info(f"Langflow Request - Flow: {flow_id}, Status: {status}, Duration: {entry.get('duration')}ms")
+
+    except Exception as e:
+        # لا نريد أن يفشل الطلب الأصلي بسبب خطأ في التسجيل
+        frappe.logger().error(f"Failed to log Langflow request: {str(e)}")
+
+
+def buffer_request_log(entry):
+    """
+    إضافة سجل إلى المخزن المؤقت في Redis (رحلة واحدة إلى Redis، بدون قاعدة البيانات)
+    """
+    cache = frappe.cache()
+    key = cache.make_key(BUFFER_KEY)
+
+    pipe = cache.pipeline()
+    pipe.rpush(key, json.dumps({f: entry.get(f) for f in LOG_FIELDS}, default=str))
+    pipe.ltrim(key, -MAX_BUFFER_SIZE, -1)
+    pipe.execute()
+
+
+def flush_request_logs():
+    """
+    نقل السجلات من Redis إلى قاعدة البيانات على دفعات (مهمة مجدولة كل دقيقة)
+
+    كل دفعة تُسحب من Redis في خطوة واحدة (فلا ينقلها مجدولان مرتين)، وتُعاد إليه إذا فشل الإدخال.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(BUFFER_KEY)
+
+    for _batch in range(MAX_FLUSH_BATCHES):
+        pipe = cache.pipeline()
+        pipe.lrange(key, 0, FLUSH_BATCH_SIZE - 1)
+        pipe.ltrim(key, FLUSH_BATCH_SIZE, -1)
+        items, _trimmed = pipe.execute()
+
+        if not items:
+            break
+
+        try:
+            _insert_entries(items)
+            frappe.db.commit()
+        except Exception:
+            # إعادة الدفعة إلى بداية المخزن بنفس الترتيب لتُنقل في التشغيل التالي
+            frappe.db.rollback()
+            cache.lpush(key, *reversed(items))
+            frappe.logger().error(
+                f"Failed to flush {len(items)} Langflow request logs, returned them to the buffer\n{frappe.get_traceback()}"
+            )
+            raise
+
+        if len(items) < FLUSH_BATCH_SIZE:
+            break
+
+
+def prune_request_logs():
+    """
+    حذف السجلات الأقدم من مدة الاحتفاظ (langflow_request_log_retention_days)
+    """
+    days = cint(frappe.conf.get("langflow_request_log_retention_days")) or DEFAULT_RETENTION_DAYS
+    frappe.db.delete(LOG_DOCTYPE, {"timestamp": ("<", add_days(now_datetime(), -days))})
+    frappe.db.commit()
+
+
+def _insert_entries(items):
+    now = now_datetime()
+    fields = ["name", "creation", "modified", "owner", "modified_by", *LOG_FIELDS]
+    values = []
+
+    for item in items:
+        try:
+            entry = json.loads(item)
+        except ValueError:
+            continue
+
+        user = entry.get("user") or "Administrator"
+        values.append([
+            frappe.generate_hash(length=10),
+            now,
+            now,
+            user,
+            user,
+            *(entry.get(f) for f in LOG_FIELDS),
+        ])
+
+    if values:
+        frappe.db.bulk_insert(LOG_DOCTYPE, fields, values)
@@ -0,0 +1,194 @@
+"""
+Langflow Response Cache
+Opt-in per-flow cache of answers to repeated prompts on unchanged documents, invalidated from doc_events
+"""
+
+import hashlib
+import json
+import re
+import time
+import unicodedata
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+DEFAULT_TTL = 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+
+# مفتاح الفهرس للإجابات المرتبطة بالـ DocType كاملاً (محادثة القائمة)
+ANY_DOCUMENT = "*"
+
+LRU_KEY = "langflow_response_cache_lru"
+STATS_KEY = "langflow_response_cache_stats"
+
+
+def is_response_cache_enabled(flow_id):
+    """
+    الكاش اختياري لكل Flow عبر langflow_response_cache_flows
+    """
+    return bool(flow_id) and flow_id in (frappe.conf.get("langflow_response_cache_flows") or [])
+
+
+def normalize_prompt(prompt):
+    """
+    توحيد صيغة السؤال: حالة الأحرف والمسافات وعلامات الترقيم في الطرفين
+    """
+    prompt = unicodedata.normalize("NFKC", str(prompt or "")).casefold()
+    prompt = re.sub(r"\s+", " ", prompt)
+    return prompt.strip(" .!?؟،,;:")
+
+
+def make_response_key(flow_id, prompt, doctype=None, docname=None, modified=None, tweaks=None, extra=None):
+    """
+    مفتاح الكاش من (Flow، السؤال الموحد، المستند وتاريخ تعديله، التعديلات، معاملات إضافية)
+    """
+    raw = json.dumps(
+        [flow_id, normalize_prompt(prompt), doctype, docname, modified, tweaks or {}, extra],
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cached_response(flow_id, key):
+    """
+    Returns:
+        dict: الرد المحفوظ أو None
+    """
+    cache = frappe.cache()
+    result = cache.get_value(_entry_key(key))
+
+    pipe = cache.pipeline()
+    if result is not None:
+        pipe.zadd(cache.make_key(LRU_KEY), {key: time.time()})
+    pipe.hincrby(cache.make_key(STATS_KEY), f"{flow_id}|{'hits' if result is not None else 'misses'}", 1)
+    pipe.execute()
+
+    return result
+
+
+def set_cached_response(flow_id, key, result, doctype=None, docname=None):
+    """
+    حفظ الرد مع مدة صلاحية، وإخراج الأقدم استخداماً عند تجاوز الحد الأقصى
+    """
+    try:
+        cache = frappe.cache()
+        ttl = get_response_cache_ttl()
+        lru_key = cache.make_key(LRU_KEY)
+        now = time.time()
+
+        cache.set_value(_entry_key(key), result, expires_in_sec=ttl)
+
+        pipe = cache.pipeline()
+        if doctype:
+            index_key = cache.make_key(_index_key(doctype, docname or ANY_DOCUMENT))
+            pipe.sadd(index_key, key)
+            pipe.expire(index_key, ttl)
+        pipe.zremrangebyscore(lru_key, 0, now - ttl)
+        pipe.zadd(lru_key, {key: now})
+        pipe.zcard(lru_key)
+        size = pipe.execute()[-1]
+
+        overflow = size - get_response_cache_max_entries()
+        if overflow > 0:
+            evicted = [frappe.safe_decode(member) for member, _score in cache.zpopmin(lru_key, overflow)]
+            cache.delete_value([_entry_key(k) for k in evicted])
+
+    except Exception as e:
+        # لا نريد أن يفشل الطلب الأصلي بسبب خطأ في الكاش
+        frappe.logger().error(f"Failed to cache Langflow response: {str(e)}")
+
+
+def invalidate_document_responses(doc, method=None):
+    """
+    حذف الإجابات المرتبطة بالمستند وبمحادثات الـ DocType عند حفظه أو حذفه (doc_events)
+    """
+    if not frappe.conf.get("langflow_response_cache_flows"):
+        return
+
+    cache = frappe.cache()
+    index_keys = [
+        cache.make_key(_index_key(doc.doctype, doc.name)),
+        cache.make_key(_index_key(doc.doctype, ANY_DOCUMENT)),
+    ]
+
+    pipe = cache.pipeline()
+    for index_key in index_keys:
+        pipe.smembers(index_key)
+    keys = {frappe.safe_decode(k) for members in pipe.execute() for k in members}
+
+    if not keys:
+        return
+
+    # delete_value يمسح أيضاً النسخة المحفوظة في ذاكرة الطلب الحالي
+    cache.delete_value([_entry_key(k) for k in keys])
+
+    pipe = cache.pipeline()
+    pipe.delete(*index_keys)
+    pipe.zrem(cache.make_key(LRU_KEY), *keys)
+    pipe.execute()
+
+
+def get_response_cache_ttl():
+    return cint(frappe.conf.get("langflow_response_cache_ttl")) or DEFAULT_TTL
+
+
+def get_response_cache_max_entries():
+    return cint(frappe.conf.get("langflow_response_cache_max_entries")) or DEFAULT_MAX_ENTRIES
+
+
+@frappe.whitelist()
+def get_response_cache_stats():
+    """
+    إحصائيات كاش الردود لكل Flow (نسبة الإصابة وعدد المدخلات)
+
+    Returns:
+        dict: الإحصائيات
+    """
+    try:
+        if not frappe.has_permission("System Settings", "read"):
+            return {
+                "success": False,
+                "error": _("Insufficient permissions")
+            }
+
+        cache = frappe.cache()
+        pipe = cache.pipeline()
+        pipe.hgetall(cache.make_key(STATS_KEY))
+        pipe.zcard(cache.make_key(LRU_KEY))
+        counters, entries = pipe.execute()
+
+        flows = {}
+        for field, value in counters.items():
+            flow_id, _sep, name = frappe.safe_decode(field).rpartition("|")
+            flows.setdefault(flow_id, {"hits": 0, "misses": 0})[name] = cint(frappe.safe_decode(value))
+
+        for stats in flows.values():
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0
+
+        return {
+            "success": True,
+            "stats": {
+                "flows": flows,
+                "entries": entries,
+                "max_entries": get_response_cache_max_entries(),
+                "ttl": get_response_cache_ttl(),
+                "enabled_flows": frappe.conf.get("langflow_response_cache_flows") or [],
+            }
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def _entry_key(key):
+    return f"langflow_response_cache::{key}"
+
+
+def _index_key(doctype, docname):
+    return f"langflow_response_cache_doc::{doctype}::{docname}"
@@ -0,0 +1,236 @@
+"""
+Langflow Result Cache
+Content-addressed cache for Langflow results: Redis first, "Langflow Result Cache" DocType as a persistent fallback
+"""
+
+import hashlib
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, cint, get_datetime, now_datetime
+
+CACHE_DOCTYPE = "Langflow Result Cache"
+DEFAULT_TTL = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 10000
+FILE_CHUNK_SIZE = 1024 * 1024
+
+# إصابات Redis تُجمع هنا وتُنقل إلى قاعدة البيانات دورياً (flush_result_cache_access)
+ACCESSED_KEY = "langflow_result_cache_access::last"
+HITS_KEY = "langflow_result_cache_access::hits"
+
+
+def get_file_hash(file_path):
+    """
+    بصمة SHA-256 لمحتوى الملف (قراءة على دفعات بدون تحميل الملف كاملاً في الذاكرة)
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(FILE_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(content_hash, flow_id, tweaks=None):
+    """
+    مفتاح الكاش من (بصمة المحتوى، معرف الـ Flow، التعديلات)
+    """
+    raw = json.dumps([content_hash, flow_id, tweaks or {}], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_cached_result(cache_key):
+    """
+    البحث في Redis ثم في قاعدة البيانات
+
+    Returns:
+        dict: النتيجة المحفوظة أو None
+    """
+    cache = frappe.cache()
+    result = cache.get_value(_redis_key(cache_key))
+
+    if result is not None:
+        _record_access(cache_key)
+    else:
+        result = _get_persisted_result(cache_key)
+        if result is not None:
+            # إعادة تسخين Redis من النسخة الدائمة
+            cache.set_value(_redis_key(cache_key), result, expires_in_sec=get_cache_ttl())
+
+    _increment_counter("hits" if result is not None else "misses")
+    return result
+
+
+def set_cached_result(cache_key, result, flow_id=None, content_hash=None):
+    """
+    حفظ النتيجة في Redis وفي قاعدة البيانات
+    """
+    ttl = get_cache_ttl()
+    frappe.cache().set_value(_redis_key(cache_key), result, expires_in_sec=ttl)
+
+    try:
+        values = {
+            "result": json.dumps(result, ensure_ascii=False, default=str),
+            "last_accessed": now_datetime(),
+            "expires_on": add_to_date(now_datetime(), seconds=ttl),
+        }
+
+        if frappe.db.exists(CACHE_DOCTYPE, cache_key):
+            frappe.db.set_value(CACHE_DOCTYPE, cache_key, values, update_modified=False)
+        else:
+            frappe.get_doc({
+                "doctype": CACHE_DOCTYPE,
+                "cache_key": cache_key,
+                "flow_id": flow_id,
+                "content_hash": content_hash,
+                **values
+            }).insert(ignore_permissions=True)
+
+    except frappe.DuplicateEntryError:
+        # طلب متزامن سبقنا إلى الحفظ
+        pass
+    except Exception as e:
+        # لا نريد أن يفشل الطلب الأصلي بسبب خطأ في الكاش
+        frappe.logger().error(f"Failed to persist Langflow result cache: {str(e)}")
+
+
+def get_cache_ttl():
+    return cint(frappe.conf.get("langflow_result_cache_ttl")) or DEFAULT_TTL
+
+
+def prune_result_cache():
+    """
+    حذف المدخلات المنتهية ثم الأقدم استخداماً عند تجاوز الحد الأقصى (مهمة مجدولة)
+    """
+    # ترتيب الحذف يعتمد على last_accessed، فتُنقل إصابات Redis أولاً
+    flush_result_cache_access()
+
+    frappe.db.delete(CACHE_DOCTYPE, {"expires_on": ("<", now_datetime())})
+
+    max_entries = cint(frappe.conf.get("langflow_result_cache_max_entries")) or DEFAULT_MAX_ENTRIES
+    overflow = frappe.db.count(CACHE_DOCTYPE) - max_entries
+    if overflow <= 0:
+        frappe.db.commit()
+        return
+
+    stale = frappe.get_all(
+        CACHE_DOCTYPE,
+        order_by="last_accessed desc",
+        limit_start=max_entries,
+        limit_page_length=overflow,
+        pluck="name"
+    )
+
+    for start in range(0, len(stale), 500):
+        frappe.db.delete(CACHE_DOCTYPE, {"name": ("in", stale[start:start + 500])})
+
+    frappe.db.commit()
+
+
+def flush_result_cache_access():
+    """
+    نقل إصابات Redis (عدد الإصابات وآخر استخدام لكل مفتاح) إلى قاعدة البيانات (مهمة مجدولة)
+    """
+    cache = frappe.cache()
+    accessed_key = cache.make_key(ACCESSED_KEY)
+    hits_key = cache.make_key(HITS_KEY)
+
+    # القراءة والحذف في MULTI واحد حتى لا تضيع إصابة تُسجل بينهما
+    pipe = cache.pipeline()
+    pipe.hgetall(accessed_key)
+    pipe.hgetall(hits_key)
+    pipe.delete(accessed_key, hits_key)
+    accessed, hits, _deleted = pipe.execute()
+
+    if not accessed:
+        return
+
+    table = frappe.qb.DocType(CACHE_DOCTYPE)
+    for key, last_accessed in accessed.items():
+        (
+            frappe.qb.update(table)
+            .set(table.hits, table.hits + cint(frappe.safe_decode(hits.get(key))))
+            .set(table.last_accessed, frappe.safe_decode(last_accessed))
+            .where(table.name == frappe.safe_decode(key))
+        ).run()
+
+    frappe.db.commit()
+
+
+@frappe.whitelist()
+def get_result_cache_stats():
+    """
+    إحصائيات كاش النتائج (نسبة الإصابة وعدد المدخلات)
+
+    Returns:
+        dict: الإحصائيات
+    """
+    try:
+        if not frappe.has_permission("System Settings", "read"):
+            return {
+                "success": False,
+                "error": _("Insufficient permissions")
+            }
+
+        hits = _get_counter("hits")
+        misses = _get_counter("misses")
+        lookups = hits + misses
+
+        return {
+            "success": True,
+            "stats": {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0,
+                "persisted_entries": frappe.db.count(CACHE_DOCTYPE),
+                "ttl": get_cache_ttl(),
+            }
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def _get_persisted_result(cache_key):
+    row = frappe.db.get_value(CACHE_DOCTYPE, cache_key, ["result", "expires_on", "hits"], as_dict=True)
+    if not row or not row.result:
+        return None
+
+    if row.expires_on and get_datetime(row.expires_on) < now_datetime():
+        return None
+
+    frappe.db.set_value(
+        CACHE_DOCTYPE,
+        cache_key,
+        {"hits": cint(row.hits) + 1, "last_accessed": now_datetime()},
+        update_modified=False
+    )
+    return json.loads(row.result)
+
+
+def _record_access(cache_key):
+    try:
+        cache = frappe.cache()
+        pipe = cache.pipeline()
+        pipe.hset(cache.make_key(ACCESSED_KEY), cache_key, str(now_datetime()))
+        pipe.hincrby(cache.make_key(HITS_KEY), cache_key, 1)
+        pipe.execute()
+    except Exception as e:
+        frappe.logger().error(f"Failed to record Langflow result cache access: {str(e)}")
+
+
+def _redis_key(cache_key):
+    return f"langflow_result_cache::{cache_key}"
+
+
+def _increment_counter(name):
+    cache = frappe.cache()
+    cache.incr(cache.make_key(f"langflow_result_cache_stats::{name}"))
+
+
+def _get_counter(name):
+    cache = frappe.cache()
+    return cint(cache.get(cache.make_key(f"langflow_result_cache_stats::{name}")))
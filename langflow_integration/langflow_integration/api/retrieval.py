@@ -0,0 +1,446 @@
+"""
+Record Retrieval
+In-process BM25 index (NumPy) over a DocType's records, kept current from doc_events,
+so chat questions are sent with the most relevant rows attached
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+
+import frappe
+import numpy as np
+from frappe.model import no_value_fields
+from frappe.utils import cint
+
+DEFAULT_TOP_K = 5
+BUILD_CHUNK_SIZE = 5000
+
+# عدد المرشحين قبل تطبيق الصلاحيات (بعضهم قد لا يكون متاحاً للمستخدم)
+CANDIDATE_FACTOR = 4
+
+# آخر N تغييرات محفوظة لكل DocType؛ العملية المتأخرة أكثر من ذلك تعيد بناء الفهرس
+MAX_CHANGES = 10000
+
+# الحقول النصية المفهرسة افتراضياً
+TEXT_FIELDTYPES = ("Data", "Small Text", "Text", "Long Text", "Text Editor", "Select", "Link", "Dynamic Link")
+
+TOKEN_PATTERN = re.compile(r"\w\w+", re.UNICODE)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# INCR + ZADD في خطوة واحدة: القارئ لا يرى رقم النسخة الجديد قبل اسم المستند المعدل
+PUBLISH_CHANGE_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('ZADD', KEYS[2], version, ARGV[1])
+redis.call('ZREMRANGEBYRANK', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+return version
+"""
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).casefold())
+
+
+class BM25Index:
+    """
+    فهرس BM25 بتمثيل CSR حسب الكلمة (postings مرتبة في مصفوفات NumPy)
+
+    الإضافات بعد البناء تُحفظ في جزء صغير (pending) وتُدمج في المصفوفات الرئيسية عند كبره.
+    المستند المعدل يأخذ صفاً جديداً ويُعلم صفه القديم كمحذوف حتى الدمج التالي.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.names = []
+        self.rows = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.df = np.zeros(0, dtype=np.int32)
+        self.alive_count = 0
+        self.total_len = 0.0
+
+        # الجزء الرئيسي: postings الكلمة t في [offsets[t], offsets[t + 1])
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.post_rows = np.zeros(0, dtype=np.int32)
+        self.post_tf = np.zeros(0, dtype=np.float32)
+
+        # الجزء الصغير: الكلمة ← ([الصفوف]، [التكرارات])
+        self.pending = {}
+        self.pending_count = 0
+        self.dead_count = 0
+
+    def build(self, documents):
+        """
+        بناء الفهرس دفعة واحدة من (الاسم، النص)
+        """
+        terms, rows, tfs, lengths, names = [], [], [], [], []
+
+        for name, text in documents:
+            tokens = tokenize(text)
+            row = len(names)
+            names.append(name)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                terms.append(self._term_id(term))
+                rows.append(row)
+                tfs.append(tf)
+
+        self.names = names
+        self.rows = {name: row for row, name in enumerate(names)}
+        self.alive = np.ones(len(names), dtype=bool)
+        self.doc_len = np.asarray(lengths, dtype=np.float32)
+        self.alive_count = len(names)
+        self.total_len = float(self.doc_len.sum())
+        self.pending, self.pending_count, self.dead_count = {}, 0, 0
+        self._set_postings(np.asarray(terms, dtype=np.int32), np.asarray(rows, dtype=np.int32),
+                           np.asarray(tfs, dtype=np.float32))
+
+    def add(self, name, text):
+        """
+        إضافة مستند أو تحديثه
+        """
+        self.remove(name)
+
+        tokens = tokenize(text)
+        row = len(self.names)
+        self.names.append(name)
+        self.rows[name] = row
+        if row >= len(self.alive):
+            # سعة مضاعفة بدلاً من نسخ المصفوفات عند كل إضافة
+            grow = max(1024, len(self.alive))
+            self.alive = np.concatenate([self.alive, np.zeros(grow, dtype=bool)])
+            self.doc_len = np.concatenate([self.doc_len, np.zeros(grow, dtype=np.float32)])
+        self.alive[row] = True
+        self.doc_len[row] = len(tokens)
+        self.alive_count += 1
+        self.total_len += len(tokens)
+
+        for term, tf in Counter(tokens).items():
+            term_id = self._term_id(term)
+            self.df[term_id] += 1
+            term_rows, term_tfs = self.pending.setdefault(term_id, ([], []))
+            term_rows.append(row)
+            term_tfs.append(tf)
+            self.pending_count += 1
+
+        if self.pending_count > max(10000, len(self.post_rows) // 10):
+            self.merge()
+
+    def remove(self, name):
+        row = self.rows.pop(name, None)
+        if row is None:
+            return
+
+        self.alive[row] = False
+        self.alive_count -= 1
+        self.total_len -= float(self.doc_len[row])
+        self.dead_count += 1
+
+        # df لا ينقص حتى الدمج (تقريب مقبول لحساب idf)
+        if self.dead_count > max(1000, len(self.names) // 5):
+            self.merge()
+
+    def merge(self):
+        """
+        دمج الجزء الصغير وحذف الصفوف الميتة ثم إعادة ترقيم الصفوف
+        """
+        terms = [np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int32), np.diff(self.offsets))]
+        rows, tfs = [self.post_rows], [self.post_tf]
+        for term_id, (term_rows, term_tfs) in self.pending.items():
+            terms.append(np.full(len(term_rows), term_id, dtype=np.int32))
+            rows.append(np.asarray(term_rows, dtype=np.int32))
+            tfs.append(np.asarray(term_tfs, dtype=np.float32))
+
+        terms, rows, tfs = np.concatenate(terms), np.concatenate(rows), np.concatenate(tfs)
+        alive = self.alive[:len(self.names)]
+        keep = alive[rows]
+        new_row = np.cumsum(alive, dtype=np.int64) - 1
+
+        self.names = [name for name, is_alive in zip(self.names, alive) if is_alive]
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self.doc_len = self.doc_len[:len(alive)][alive]
+        self.alive = np.ones(len(self.names), dtype=bool)
+        self.pending, self.pending_count, self.dead_count = {}, 0, 0
+        self._set_postings(terms[keep], new_row[rows[keep]].astype(np.int32), tfs[keep])
+
+    def search(self, query, k=DEFAULT_TOP_K):
+        """
+        Returns:
+            list: [(الاسم، الدرجة)] مرتبة تنازلياً (المستندات بدون أي كلمة مشتركة لا تظهر)
+        """
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not self.alive_count:
+            return []
+
+        avgdl = self.total_len / self.alive_count or 1.0
+        scores = np.zeros(len(self.names), dtype=np.float32)
+
+        for term_id in term_ids:
+            rows, tf = self._postings(term_id)
+            if not len(rows):
+                continue
+            df = self.df[term_id]
+            idf = math.log(1 + (self.alive_count - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / avgdl)
+            # الصف لا يتكرر داخل postings الكلمة الواحدة
+            scores[rows] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        scores[~self.alive[:len(self.names)]] = 0
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.names[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    def memory_bytes(self):
+        arrays = (self.alive, self.doc_len, self.df, self.offsets, self.post_rows, self.post_tf)
+        return sum(a.nbytes for a in arrays)
+
+    def _term_id(self, term):
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            term_id = self.vocab[term] = len(self.vocab)
+            if term_id >= len(self.df):
+                self.df = np.concatenate([self.df, np.zeros(max(1024, len(self.df)), dtype=np.int32)])
+        return term_id
+
+    def _postings(self, term_id):
+        start, end = (self.offsets[term_id], self.offsets[term_id + 1]) if term_id + 1 < len(self.offsets) else (0, 0)
+        rows, tf = self.post_rows[start:end], self.post_tf[start:end]
+
+        pending = self.pending.get(term_id)
+        if pending:
+            rows = np.concatenate([rows, np.asarray(pending[0], dtype=np.int32)])
+            tf = np.concatenate([tf, np.asarray(pending[1], dtype=np.float32)])
+        return rows, tf
+
+    def _set_postings(self, terms, rows, tfs):
+        order = np.argsort(terms, kind="stable")
+        counts = np.bincount(terms, minlength=len(self.vocab)).astype(np.int32)
+
+        self.post_rows = rows[order]
+        self.post_tf = tfs[order]
+        self.offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        self.df = np.concatenate([counts, np.zeros(max(1024, len(counts) // 4), dtype=np.int32)])
+
+
+def get_retrieval_fields(doctype):
+    """
+    الحقول المفهرسة: langflow_retrieval_doctypes[doctype] أو الحقول النصية في الـ DocType
+
+    Returns:
+        list: الحقول، أو None إذا لم يكن الفهرس مفعلاً لهذا الـ DocType
+    """
+    config = frappe.conf.get("langflow_retrieval_doctypes") or {}
+    if doctype not in config:
+        return None
+
+    fields = config.get(doctype) if isinstance(config, dict) else None
+    if not fields:
+        meta = frappe.get_meta(doctype)
+        fields = [df.fieldname for df in meta.fields if df.fieldtype in TEXT_FIELDTYPES and df.fieldtype not in no_value_fields]
+    return list(dict.fromkeys(fields))
+
+
+def retrieve_records(doctype, question, k=None):
+    """
+    أكثر سجلات الـ DocType صلة بالسؤال، بعد تطبيق صلاحيات المستخدم
+
+    Returns:
+        list: السجلات (name + الحقول المفهرسة)، فارغة إذا لم يكن الفهرس مفعلاً
+    """
+    fields = get_retrieval_fields(doctype)
+    if not fields or not question:
+        return []
+
+    k = cint(k) or cint(frappe.conf.get("langflow_retrieval_top_k")) or DEFAULT_TOP_K
+    index = get_index(doctype, fields)
+
+    with _get_state(doctype)["lock"]:
+        hits = index.search(question, k * CANDIDATE_FACTOR)
+
+    if not hits:
+        return []
+
+    ranked = {name: rank for rank, (name, _score) in enumerate(hits)}
+    # get_list يطبق الصلاحيات ويعيد القيم الحالية
+    rows = frappe.get_list(
+        doctype,
+        filters={"name": ["in", list(ranked)]},
+        fields=["name", *fields],
+        limit_page_length=0,
+        order_by=None
+    )
+    rows.sort(key=lambda row: ranked[row.name])
+    return rows[:k]
+
+
+def get_index(doctype, fields):
+    """
+    فهرس الـ DocType في هذه العملية: يُبنى عند أول استخدام ثم يُحدث من سجل التغييرات في Redis
+
+    البناء يتم خارج الأقفال ثم يُستبدل الفهرس، فلا يوقف المحادثات على DocTypes أخرى.
+    أثناء إعادة البناء تُخدم الطلبات الأخرى من الفهرس القديم؛ وإذا لم يوجد فهرس بعد تنتظر نفس البناء.
+    """
+    state = _get_state(doctype)
+
+    with state["lock"]:
+        stale = _refresh(state, doctype, fields)
+        if stale is None:
+            return state["index"]
+
+    # بانٍ واحد لكل DocType
+    if not state["build_lock"].acquire(blocking=stale is False):
+        return stale
+
+    try:
+        with state["lock"]:
+            # ربما انتهى بانٍ آخر أثناء الانتظار
+            if _refresh(state, doctype, fields) is None:
+                return state["index"]
+
+        # رقم النسخة قبل القراءة: التغييرات أثناء البناء تُطبق في الاستدعاء التالي (add يستبدل الصف)
+        version = _current_version(doctype)
+        index = build_index(doctype, fields)
+
+        with state["lock"]:
+            state.update({"index": index, "fields": fields, "version": version})
+        return index
+    finally:
+        state["build_lock"].release()
+
+
+def build_index(doctype, fields):
+    """
+    بناء الفهرس من قاعدة البيانات على دفعات (keyset pagination حسب name)
+    """
+    def documents():
+        last_name = None
+        while True:
+            filters = {"name": [">", last_name]} if last_name is not None else {}
+            chunk = frappe.get_all(
+                doctype,
+                filters=filters,
+                fields=["name", *fields],
+                order_by="name asc",
+                limit_page_length=BUILD_CHUNK_SIZE
+            )
+            for row in chunk:
+                yield row.name, _row_text(row, fields)
+            if len(chunk) < BUILD_CHUNK_SIZE:
+                return
+            last_name = chunk[-1].name
+
+    index = BM25Index()
+    index.build(documents())
+    frappe.logger().info(f"Langflow retrieval index built for {doctype}: {index.alive_count} records, {index.memory_bytes()} bytes")
+    return index
+
+
+def record_document_change(doc, method=None):
+    """
+    تسجيل المستند المعدل أو المحذوف في سجل التغييرات بعد نجاح الـ commit (doc_events)
+    """
+    config = frappe.conf.get("langflow_retrieval_doctypes")
+    if not config or doc.doctype not in config:
+        return
+
+    doctype, name = doc.doctype, doc.name
+
+    def publish():
+        cache = frappe.cache()
+        # نفس المستند يُسجل مرة واحدة بآخر رقم نسخة
+        cache.eval(
+            PUBLISH_CHANGE_SCRIPT,
+            2,
+            cache.make_key(_version_key(doctype)),
+            cache.make_key(_changes_key(doctype)),
+            name,
+            MAX_CHANGES
+        )
+
+    frappe.db.after_commit.add(publish)
+
+
+def _get_state(doctype):
+    key = (frappe.local.site, doctype)
+
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = {
+                "index": None,
+                "fields": None,
+                "version": 0,
+                # الحالة والبحث وتطبيق التغييرات (أجزاء من الثانية)
+                "lock": threading.Lock(),
+                # إعادة البناء (ثوانٍ) بدون قفل البحث
+                "build_lock": threading.Lock(),
+            }
+        return _indexes[key]
+
+
+def _refresh(state, doctype, fields):
+    """
+    تطبيق التغييرات على الفهرس الحالي (تحت state["lock"])
+
+    Returns:
+        None إذا كان الفهرس صالحاً، وإلا الفهرس القديم للخدمة أثناء إعادة البناء (False إذا لم يوجد)
+    """
+    version = _current_version(doctype)
+
+    if state["index"] is not None and state["fields"] == fields and 0 <= version - state["version"] <= MAX_CHANGES:
+        if version > state["version"]:
+            _apply_changes(state, doctype, version)
+        return None
+
+    if state["index"] is None or state["fields"] != fields:
+        return False
+    return state["index"]
+
+
+def _apply_changes(state, doctype, version):
+    cache = frappe.cache()
+    changed = [
+        frappe.safe_decode(name)
+        for name in cache.zrangebyscore(cache.make_key(_changes_key(doctype)), state["version"] + 1, version)
+    ]
+
+    if changed:
+        fields = state["fields"]
+        rows = {row.name: row for row in frappe.get_all(
+            doctype,
+            filters={"name": ["in", changed]},
+            fields=["name", *fields],
+            limit_page_length=0,
+            order_by=None
+        )}
+
+        index = state["index"]
+        for name in changed:
+            if name in rows:
+                index.add(name, _row_text(rows[name], fields))
+            else:
+                index.remove(name)
+
+    state["version"] = version
+
+
+def _current_version(doctype):
+    cache = frappe.cache()
+    return cint(frappe.safe_decode(cache.get(cache.make_key(_version_key(doctype))) or 0))
+
+
+def _row_text(row, fields):
+    return " ".join(str(row.get(field)) for field in ("name", *fields) if row.get(field))
+
+
+def _version_key(doctype):
+    return f"langflow_retrieval_version::{doctype}"
+
+
+def _changes_key(doctype):
+    return f"langflow_retrieval_changes::{doctype}"
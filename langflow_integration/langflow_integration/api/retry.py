@@ -0,0 +1,158 @@
+"""
+Langflow Retry Policy
+Retries transient Langflow failures with exponential backoff and full jitter inside a total deadline budget
+"""
+
+import asyncio
+import random
+import time
+
+import frappe
+from frappe.utils import cint, flt
+
+from langflow_integration.langflow_integration.api.client_core import classify_error, get_error_status
+from langflow_integration.langflow_integration.api.transport import get_timeout
+
+DEFAULT_RETRY_POLICY = {
+    "max_attempts": 3,
+    "backoff_base": 0.5,
+    "backoff_max": 8,
+    "retry_statuses": [502, 503, 504],
+    # None: مدة الاتصال + مدة القراءة، أي نفس أقصى زمن كان ينتظره المستدعي بدون إعادة محاولة
+    "deadline": None,
+    # None: تلقائي، الطلبات المرتبطة بجلسة محادثة تضيف رسائل إلى ذاكرة Langflow فلا تُكرر
+    "idempotent": None,
+}
+
+# رموز تعني أن Langflow لم يعالج الطلب أصلاً، فإعادتها آمنة حتى للطلبات غير القابلة للتكرار
+SAFE_RETRY_STATUSES = {502, 503}
+
+# لا نبدأ محاولة جديدة إذا كان المتبقي من الميزانية أقل من هذا
+MIN_ATTEMPT_TIME = 0.5
+
+
+def get_retry_policy(flow_id=None):
+    """
+    سياسة إعادة المحاولة: الافتراضي ثم langflow_retry ثم langflow_flow_retry[flow_id]
+    """
+    policy = dict(DEFAULT_RETRY_POLICY)
+    policy.update(frappe.conf.get("langflow_retry") or {})
+    if flow_id:
+        policy.update((frappe.conf.get("langflow_flow_retry") or {}).get(flow_id) or {})
+    return policy
+
+
+def call_with_retry(send, flow_id, timeout=None, idempotent=True, can_retry=None):
+    """
+    تنفيذ محاولة واحدة أو أكثر حسب سياسة الـ Flow
+
+    Args:
+        send: دالة تستقبل مهلة (connect, read) وتنفذ محاولة واحدة
+        flow_id: معرف الـ Flow (لاختيار السياسة)
+        timeout: مهلة القراءة لكل محاولة (اختياري)
+        idempotent: هل تكرار الطلب آمن (تتجاوزه السياسة إذا حددت idempotent)
+        can_retry: دالة اختيارية تمنع الإعادة عند إرجاع False (مثلاً بعد بدء البث)
+
+    Returns:
+        tuple: (نتيجة send، عدد المحاولات)
+
+    الاستثناء الأخير يُرفع كما هو مع الخاصية langflow_attempts.
+    """
+    policy, deadline, connect_timeout, read_timeout, idempotent = _start_budget(flow_id, timeout, idempotent)
+
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline - time.monotonic()
+
+        try:
+            return send((min(connect_timeout, remaining), min(read_timeout, remaining))), attempt
+
+        except Exception as e:
+            delay = _next_delay(e, flow_id, attempt, policy, deadline, idempotent, can_retry)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+
+async def async_call_with_retry(send, flow_id, timeout=None, idempotent=True, can_retry=None):
+    """
+    نفس call_with_retry لكن send دالة غير متزامنة، والانتظار بين المحاولات لا يوقف الـ event loop
+    """
+    policy, deadline, connect_timeout, read_timeout, idempotent = _start_budget(flow_id, timeout, idempotent)
+
+    attempt = 0
+    while True:
+        attempt += 1
+        remaining = deadline - time.monotonic()
+
+        try:
+            return await send((min(connect_timeout, remaining), min(read_timeout, remaining))), attempt
+
+        except Exception as e:
+            delay = _next_delay(e, flow_id, attempt, policy, deadline, idempotent, can_retry)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+
+
+def _start_budget(flow_id, timeout, idempotent):
+    policy = get_retry_policy(flow_id)
+    if policy.get("idempotent") is not None:
+        idempotent = bool(policy["idempotent"])
+
+    connect_timeout, read_timeout = get_timeout(timeout)
+    budget = flt(policy.get("deadline")) or (connect_timeout + read_timeout)
+    return policy, time.monotonic() + budget, connect_timeout, read_timeout, idempotent
+
+
+def _next_delay(e, flow_id, attempt, policy, deadline, idempotent, can_retry):
+    """
+    مدة الانتظار قبل المحاولة التالية، أو None لإنهاء المحاولات (مع تسجيل عددها على الاستثناء)
+    """
+    delay = get_backoff(attempt, policy)
+
+    if (
+        attempt >= max(cint(policy.get("max_attempts")), 1)
+        or not is_retryable(e, policy, idempotent)
+        or (can_retry and not can_retry())
+        or time.monotonic() + delay + MIN_ATTEMPT_TIME > deadline
+    ):
+        e.langflow_attempts = attempt
+        return None
+
+    frappe.logger().info(
+        f"Langflow retry - Flow: {flow_id}, Attempt: {attempt}, Error: {type(e).__name__}, Backoff: {delay:.2f}s"
+    )
+    return delay
+
+
+def get_backoff(attempt, policy):
+    """
+    Exponential backoff مع full jitter: قيمة عشوائية بين 0 و min(max, base * 2^(attempt-1))
+    """
+    ceiling = min(flt(policy.get("backoff_max")), flt(policy.get("backoff_base")) * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+
+def is_retryable(e, policy, idempotent=True):
+    """
+    هل الخطأ عابر ويمكن إعادة الطلب بعده
+    """
+    kind = classify_error(e)
+
+    if kind == "connect":
+        # الطلب لم يصل إلى Langflow أصلاً
+        return True
+
+    if kind == "http":
+        status = get_error_status(e)
+        if status not in set(policy.get("retry_statuses") or []):
+            return False
+        return idempotent or status in SAFE_RETRY_STATUSES
+
+    if kind in ("timeout", "connection"):
+        # ربما عالج Langflow الطلب ولم يصل الرد
+        return idempotent
+
+    return False
@@ -0,0 +1,57 @@
+"""
+DocType Schema Renderer
+Builds the compact DocType schema sent to the chat flow and memoizes it per DocType
+"""
+
+import frappe
+
+SCHEMA_CACHE_KEY = "langflow_doctype_schema"
+
+
+def get_doctype_schema(doctype):
+    """
+    هيكل الـ DocType (مع الجداول الفرعية) كنص، محفوظ في الكاش لكل DocType
+
+    Args:
+        doctype: نوع المستند
+
+    Returns:
+        str: الهيكل كنص
+    """
+    return frappe.cache().hget(
+        SCHEMA_CACHE_KEY,
+        doctype,
+        generator=lambda: build_doctype_schema(doctype)
+    )
+
+
+def build_doctype_schema(doctype):
+    """
+    بناء هيكل الـ DocType من الـ Meta (بدون كاش)
+    """
+    meta = frappe.get_meta(doctype)
+    output_lines = []
+
+    # Parent DocType
+    output_lines.append(f"DocType: {meta.name} | Type: Parent")
+    for field in meta.fields:
+        output_lines.append(f"  - {field.fieldname} ({field.fieldtype})")
+
+    # Child DocTypes
+    for field in meta.fields:
+        if field.fieldtype == "Table":
+            child_meta = frappe.get_meta(field.options)
+            output_lines.append(f"\nDocType: {child_meta.name} | Type: Child | Parent Field: {field.fieldname}")
+            for f in child_meta.fields:
+                output_lines.append(f"  - {f.fieldname} ({f.fieldtype})")
+
+    return "\n".join(output_lines)
+
+
+def clear_schema_cache(doc=None, method=None):
+    """
+    مسح الكاش عند تعديل DocType أو Custom Field أو Property Setter (doc_events و clear_cache)
+
+    يُمسح الكاش كاملاً لأن تعديل جدول فرعي يغير هيكل كل DocType يحتويه.
+    """
+    frappe.cache().delete_key(SCHEMA_CACHE_KEY)
@@ -0,0 +1,121 @@
+"""
+Single Flight
+Cross-worker (Redis) coalescing of identical in-flight Langflow calls: one worker runs the flow,
+the others wait for its result instead of running it again
+"""
+
+import hashlib
+import json
+import time
+
+import frappe
+from frappe.utils import cint
+
+from langflow_integration.langflow_integration.api.metrics import phase, record_coalesced
+
+DEFAULT_LEASE = 300
+RESULT_TTL = 60
+POLL_INTERVAL = 0.1
+
+
+def is_single_flight_enabled():
+    return bool(cint(frappe.conf.get("langflow_single_flight", 1)))
+
+
+def make_flight_key(flow_id, input_data, tweaks=None, session_id=None, user=None):
+    """
+    مفتاح الطلب من (Flow، بصمة المدخلات، التعديلات، الجلسة، المستخدم)
+
+    المستخدم جزء من المفتاح: كل مستخدم يمر بحد الطلبات الخاص به ولا يشارك طلبات مستخدم آخر.
+    """
+    input_hash = hashlib.sha256(json.dumps(input_data, sort_keys=True, default=str).encode()).hexdigest()
+    raw = json.dumps([flow_id, input_hash, tweaks or {}, session_id, user], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def single_flight(endpoint, flow_id, key, fn):
+    """
+    تنفيذ fn مرة واحدة لكل الطلبات المتطابقة الجارية في نفس الوقت
+
+    أول طلب يحجز المفتاح (SET NX) وينفذ fn ثم يحفظ النتيجة تحت رمز الحجز،
+    وبقية الطلبات تنتظر نتيجة هذا الرمز بالذات (وليس نتيجة طلب سابق انتهى).
+    النتيجة الناجحة فقط تُشارك: إذا فشل المنفذ (أو توقف وانتهى الحجز بعد langflow_single_flight_lease)
+    يحاول المنتظر الحجز والتنفيذ بنفسه.
+
+    Returns:
+        النتيجة (مشتركة بين الطلبات المتطابقة)
+    """
+    if not is_single_flight_enabled():
+        return fn()
+
+    cache = frappe.cache()
+    lock_key = cache.make_key(f"langflow_flight::{key}")
+    lease = cint(frappe.conf.get("langflow_single_flight_lease")) or DEFAULT_LEASE
+    deadline = time.monotonic() + lease
+
+    while True:
+        token = frappe.generate_hash(length=12)
+        if cache.set(lock_key, token, nx=True, ex=lease):
+            return _run_leader(cache, lock_key, token, fn)
+
+        leader = frappe.safe_decode(cache.get(lock_key))
+        if not leader:
+            # تحرر الحجز بين SET NX والقراءة
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        with phase("coalesce"):
+            flight = _wait_for_result(cache, lock_key, leader, deadline)
+
+        if flight is not None:
+            record_coalesced(endpoint, flow_id, flight["duration_ms"])
+            return flight["result"]
+
+        if time.monotonic() >= deadline:
+            return fn()
+
+
+def _run_leader(cache, lock_key, token, fn):
+    started = time.monotonic()
+    try:
+        result = fn()
+        # الأخطاء (حد الطلبات، الحماية، المهلة...) لا تُشارك: المنتظرون ينفذون بأنفسهم
+        if _is_success(result):
+            cache.set_value(
+                _result_key(token),
+                {"result": result, "duration_ms": (time.monotonic() - started) * 1000},
+                expires_in_sec=RESULT_TTL
+            )
+        return result
+    finally:
+        # الحذف فقط إذا كان الحجز ما زال لنا (لم ينتهِ ويحجزه طلب آخر)
+        if frappe.safe_decode(cache.get(lock_key)) == token:
+            cache.delete(lock_key)
+
+
+def _wait_for_result(cache, lock_key, token, deadline):
+    """
+    Returns:
+        dict: {result, duration_ms} من المنفذ، أو None إذا انتهى الحجز بدون نتيجة أو انتهت المهلة
+    """
+    while time.monotonic() < deadline:
+        # expires=True: بدون frappe.local.cache، وإلا تبقى أول قراءة فارغة محفوظة طوال الطلب
+        flight = cache.get_value(_result_key(token), expires=True)
+        if flight is not None:
+            return flight
+
+        if frappe.safe_decode(cache.get(lock_key)) != token:
+            # النتيجة تُحفظ قبل تحرير الحجز، فقراءة أخيرة تكفي
+            return cache.get_value(_result_key(token), expires=True)
+
+        time.sleep(POLL_INTERVAL)
+
+    return None
+
+
+def _is_success(result):
+    return isinstance(result, dict) and bool(result.get("success"))
+
+
+def _result_key(token):
+    return f"langflow_flight_result::{token}"
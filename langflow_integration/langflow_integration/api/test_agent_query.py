@@ -0,0 +1,111 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from langflow_integration.langflow_integration.api import agent_query
+from langflow_integration.langflow_integration.api.agent_query import AgentQueryError
+
+# salary بمستوى صلاحية (permlevel 1) لا يملكه المستخدم
+FIELDS = [
+    SimpleNamespace(fieldname="applicant_name", fieldtype="Data", search_index=0, unique=0),
+    SimpleNamespace(fieldname="email_id", fieldtype="Data", search_index=0, unique=1),
+    SimpleNamespace(fieldname="status", fieldtype="Select", search_index=1, unique=0),
+    SimpleNamespace(fieldname="salary", fieldtype="Currency", search_index=1, unique=0),
+    SimpleNamespace(fieldname="details", fieldtype="Section Break", search_index=0, unique=0),
+]
+
+
+class FakeMeta:
+    fields = FIELDS
+
+    def get_permitted_fieldnames(self, permission_type="read"):
+        return ["applicant_name", "email_id", "status"]
+
+
+class TestBuildQuery(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            patch.dict(frappe.conf, {"langflow_agent_doctypes": {"Job Applicant": {}}, "langflow_agent_max_rows": 100}),
+            patch("frappe.has_permission", return_value=True),
+            patch("frappe.get_meta", return_value=FakeMeta()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def build(self, fields=None, filters=None, cursor=None, limit=None):
+        return agent_query._build_query("Job Applicant", fields, filters, cursor, limit)
+
+    def test_default_fields_skip_unreadable_permlevels(self):
+        query = self.build()
+
+        self.assertEqual(query["fields"], ["name", "applicant_name", "email_id", "status"])
+        self.assertEqual(query["filters"], [])
+        self.assertEqual(query["limit"], 50)
+
+    def test_unreadable_field_is_rejected(self):
+        with self.assertRaisesRegex(frappe.PermissionError, "salary"):
+            self.build(fields='["applicant_name", "salary"]')
+
+    def test_field_outside_config_is_rejected(self):
+        frappe.conf["langflow_agent_doctypes"] = {"Job Applicant": ["applicant_name"]}
+
+        with self.assertRaisesRegex(AgentQueryError, "status"):
+            self.build(fields="applicant_name,status")
+
+    def test_filters_dict_and_list_forms(self):
+        query = self.build(filters='{"status": "Open", "modified": [">", "2024-01-01"]}')
+        self.assertEqual(query["filters"], [["status", "=", "Open"], ["modified", ">", "2024-01-01"]])
+
+        query = self.build(filters=[["email_id", "LIKE", "ali%"]])
+        self.assertEqual(query["filters"], [["email_id", "like", "ali%"]])
+
+    def test_invalid_filters_are_rejected(self):
+        invalid = [
+            ({"applicant_name": "Ali"}, AgentQueryError, "not indexed"),
+            ([["status", "Open"]], AgentQueryError, r"\[field, operator, value\]"),
+            ([["status", "regexp", "O.*"]], AgentQueryError, "Operator regexp"),
+            ([["email_id", "like", "%@gmail.com"]], AgentQueryError, "prefix"),
+            # مفهرس لكن المستخدم لا يقرؤه
+            ({"salary": [">", 10000]}, frappe.PermissionError, "salary"),
+        ]
+        for filters, error, message in invalid:
+            with self.subTest(filters=filters), self.assertRaisesRegex(error, message):
+                self.build(filters=filters)
+
+    def test_cursor_and_limit(self):
+        cursor = agent_query._encode_cursor("HR-APP-0042")
+        query = self.build(cursor=cursor, limit=1000)
+
+        self.assertEqual(query["filters"], [["name", ">", "HR-APP-0042"]])
+        self.assertEqual(query["limit"], 100)
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ("not-base64!", "gA"):
+            with self.subTest(cursor=cursor), self.assertRaisesRegex(AgentQueryError, "Invalid cursor"):
+                self.build(cursor=cursor)
+
+    def test_doctype_outside_config_is_rejected(self):
+        with self.assertRaisesRegex(AgentQueryError, "not available"):
+            agent_query._build_query("Salary Slip", None, None, None, None)
+
+    def test_doctype_without_read_permission(self):
+        frappe.has_permission.return_value = False
+
+        with self.assertRaises(frappe.PermissionError):
+            self.build()
+
+
+class TestRunQuery(unittest.TestCase):
+    def test_columns_and_next_cursor(self):
+        query = {"doctype": "Job Applicant", "fields": ["name", "status"], "filters": [], "limit": 2}
+        rows = [("APP-1", "Open"), ("APP-2", "Hold"), ("APP-3", "Open")]
+
+        with patch("frappe.get_list", MagicMock(return_value=rows)):
+            result = agent_query._run_query(query)
+
+        self.assertEqual(result["columns"], {"name": ["APP-1", "APP-2"], "status": ["Open", "Hold"]})
+        self.assertEqual(result["count"], 2)
+        self.assertEqual(agent_query._decode_cursor(result["next_cursor"]), "APP-2")
@@ -0,0 +1,27 @@
+import unittest
+
+from langflow_integration.langflow_integration.api.bulk import _split_answers
+
+
+class TestSplitAnswers(unittest.TestCase):
+    def test_single_document_gets_the_whole_text(self):
+        self.assertEqual(_split_answers('{"not": "split"}', ["APP-1"]), {"APP-1": '{"not": "split"}'})
+
+    def test_packed_answers_are_split_by_document(self):
+        text = 'Answers:\n```json\n{"APP-1": "Strong fit", "APP-2": {"score": 7}}\n```'
+
+        self.assertEqual(
+            _split_answers(text, ["APP-1", "APP-2"]),
+            {"APP-1": "Strong fit", "APP-2": '{"score": 7}'}
+        )
+
+    def test_missing_and_empty_answers_are_left_out(self):
+        text = '{"APP-1": "Strong fit", "APP-2": "", "APP-9": "not in this request"}'
+
+        # APP-2 و APP-3 بدون جواب: يُعاد إرسالهما منفردين
+        self.assertEqual(_split_answers(text, ["APP-1", "APP-2", "APP-3"]), {"APP-1": "Strong fit"})
+
+    def test_unparseable_or_empty_response(self):
+        self.assertEqual(_split_answers("Sorry, I can't help with that", ["APP-1", "APP-2"]), {})
+        self.assertEqual(_split_answers('["Strong fit", "Weak fit"]', ["APP-1", "APP-2"]), {})
+        self.assertEqual(_split_answers("", ["APP-1"]), {})
@@ -0,0 +1,92 @@
+import json
+import unittest
+from types import SimpleNamespace
+
+import httpx
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from langflow_integration.langflow_integration.api.client_core import (
+    LangflowGuardError,
+    LangflowStreamError,
+    classify_error,
+    extract_output_json,
+    extract_output_text,
+    parse_stream_line,
+)
+from langflow_integration.langflow_integration.api.prompt_budget import LangflowBudgetError
+
+
+def langflow_result(message):
+    return {"outputs": [{"outputs": [{"results": {"message": message}}]}]}
+
+
+class TestParseStreamLine(unittest.TestCase):
+    def test_token_events_are_passed_to_on_chunk(self):
+        chunks = []
+        line = json.dumps({"event": "token", "data": {"chunk": "مرحبا"}})
+
+        self.assertIsNone(parse_stream_line(line, chunks.append))
+        self.assertEqual(chunks, ["مرحبا"])
+
+    def test_end_event_returns_result_with_sse_prefix(self):
+        result = {"outputs": []}
+        line = "data: " + json.dumps({"event": "end", "data": {"result": result}})
+
+        self.assertEqual(parse_stream_line(line), result)
+
+    def test_error_event_raises(self):
+        line = json.dumps({"event": "error", "data": {"error": "flow failed"}})
+
+        with self.assertRaisesRegex(LangflowStreamError, "flow failed"):
+            parse_stream_line(line)
+
+    def test_blank_and_invalid_lines_are_ignored(self):
+        self.assertIsNone(parse_stream_line(""))
+        self.assertIsNone(parse_stream_line("data: {not json"))
+
+
+class TestOutputExtraction(unittest.TestCase):
+    def test_text_from_message_string_or_dict(self):
+        self.assertEqual(extract_output_text(langflow_result("answer")), "answer")
+        self.assertEqual(extract_output_text(langflow_result({"text": "answer"})), "answer")
+
+    def test_text_missing_from_unexpected_shapes(self):
+        self.assertIsNone(extract_output_text({}))
+        self.assertIsNone(extract_output_text({"outputs": []}))
+        self.assertIsNone(extract_output_text(None))
+
+    def test_json_bare_fenced_and_embedded(self):
+        self.assertEqual(extract_output_json('{"name": "Ali"}'), {"name": "Ali"})
+        self.assertEqual(extract_output_json('Result:\n```json\n{"skills": ["python"]}\n```'), {"skills": ["python"]})
+        self.assertEqual(extract_output_json('Here you go: [1, 2] done'), [1, 2])
+
+    def test_json_rejects_scalars_and_invalid_text(self):
+        self.assertIsNone(extract_output_json("42"))
+        self.assertIsNone(extract_output_json("no data {here"))
+        self.assertIsNone(extract_output_json(None))
+
+
+class TestClassifyError(unittest.TestCase):
+    def test_rejections_before_sending(self):
+        self.assertEqual(classify_error(LangflowGuardError("busy")), "guard")
+        self.assertEqual(classify_error(LangflowBudgetError("too long")), "guard")
+        self.assertEqual(classify_error(LangflowStreamError("failed")), "stream")
+
+    def test_connect_errors_never_reached_langflow(self):
+        self.assertEqual(classify_error(requests.exceptions.ConnectTimeout()), "connect")
+        self.assertEqual(classify_error(httpx.ConnectError("refused")), "connect")
+
+        # requests يغلف سبب urllib3 في MaxRetryError.reason
+        reason = SimpleNamespace(reason=NewConnectionError(None, "refused"))
+        self.assertEqual(classify_error(requests.exceptions.ConnectionError(reason)), "connect")
+
+    def test_timeouts_connections_and_http(self):
+        self.assertEqual(classify_error(requests.exceptions.ReadTimeout()), "timeout")
+        self.assertEqual(classify_error(httpx.ReadTimeout("slow")), "timeout")
+        self.assertEqual(classify_error(requests.exceptions.ConnectionError("reset")), "connection")
+
+        response = requests.Response()
+        response.status_code = 502
+        self.assertEqual(classify_error(requests.exceptions.HTTPError(response=response)), "http")
+        self.assertEqual(classify_error(ValueError("other")), "other")
@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from langflow_integration.langflow_integration.api import cv_events
+
+CV_URL = "/private/files/cv.pdf"
+
+
+class TestCVAutoExtraction(unittest.TestCase):
+    def setUp(self):
+        self.original_user = frappe.session.user
+        # طلب التوظيف من بوابة الوظائف يُحفظ باسم Guest
+        frappe.set_user("Guest")
+
+    def tearDown(self):
+        frappe.set_user(self.original_user)
+
+    def test_guest_save_enqueues_extraction(self):
+        doc = frappe._dict(doctype="Job Applicant", name="HR-APP-0001", resume_attachment=CV_URL)
+        doc.has_value_changed = lambda fieldname: True
+
+        with patch.dict(frappe.conf, {"langflow_cv_auto_extract": 1}), patch("frappe.enqueue") as enqueue:
+            cv_events.enqueue_cv_extraction(doc, "on_update")
+
+        enqueue.assert_called_once()
+        self.assertEqual(enqueue.call_args.kwargs["applicant_name"], "HR-APP-0001")
+
+    def test_guest_job_runs_as_service_user(self):
+        users = []
+
+        def extract_cv_data(applicant_name, file_url):
+            users.append(frappe.session.user)
+            return {"success": True}
+
+        with patch("frappe.db.get_value", return_value=CV_URL), patch(
+            "langflow_integration.langflow_integration.api.langflow_client.extract_cv_data", side_effect=extract_cv_data
+        ), patch("frappe.publish_realtime") as publish_realtime:
+            cv_events.run_cv_extraction("HR-APP-0001")
+
+        self.assertEqual(users, [cv_events.DEFAULT_USER])
+        publish_realtime.assert_called_once()
+        # المستخدم الأصلي يُستعاد بعد المهمة
+        self.assertEqual(frappe.session.user, "Guest")
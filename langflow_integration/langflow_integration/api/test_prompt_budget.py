@@ -0,0 +1,94 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import frappe
+
+from langflow_integration.langflow_integration.api.prompt_budget import (
+    TRUNCATION_MARK,
+    LangflowBudgetError,
+    budget_document,
+    estimate_tokens,
+    trim_to_budget,
+)
+
+
+def make_document():
+    return {"notes": "x" * 3000, "skills": [{"skill": f"s{i:03d}"} for i in range(64)]}
+
+
+class TestEstimateTokens(unittest.TestCase):
+    def test_four_bytes_per_token_rounded_up(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcd" * 10), 10)
+        self.assertEqual(estimate_tokens("abcde"), 2)
+
+    def test_arabic_costs_two_bytes_per_letter(self):
+        # 5 أحرف × 2 بايت
+        self.assertEqual(estimate_tokens("مرحبا"), 3)
+
+
+class TestTrimToBudget(unittest.TestCase):
+    def test_steps_run_in_order_until_within_limit(self):
+        state = {"low": 3, "high": 3}
+        calls = []
+
+        def drop(part):
+            def step():
+                calls.append(part)
+                if not state[part]:
+                    return False
+                state[part] -= 1
+                return True
+            return step
+
+        text = trim_to_budget(
+            lambda: "x" * 4 * (state["low"] + state["high"]),
+            [drop("low"), drop("high")],
+            limit=2
+        )
+
+        # الخطوة الأقل أهمية تُستنفد قبل الانتقال إلى التالية، والقص يتوقف عند الحد
+        self.assertEqual(calls, ["low", "low", "low", "low", "high"])
+        self.assertEqual(state, {"low": 0, "high": 2})
+        self.assertEqual(estimate_tokens(text), 2)
+
+    def test_raises_when_trimming_is_not_enough(self):
+        with self.assertRaises(LangflowBudgetError):
+            trim_to_budget(lambda: "x" * 100, [lambda: False], limit=10)
+
+
+class TestBudgetDocument(unittest.TestCase):
+    def budget(self, limit):
+        with patch.dict(frappe.conf, {"langflow_flow_token_limit": {"flow": limit}}):
+            doc = make_document()
+            return doc, budget_document("flow", doc, json.dumps)
+
+    def test_without_limit_nothing_is_trimmed(self):
+        with patch.dict(frappe.conf, {"langflow_flow_token_limit": {}, "langflow_max_input_tokens": 0}):
+            doc = make_document()
+            text, report = budget_document("flow", doc, json.dumps)
+
+        self.assertEqual(json.loads(text), make_document())
+        self.assertEqual(report, {"tokens": estimate_tokens(text), "limit": None, "dropped": {}})
+
+    def test_child_rows_are_halved_before_text_is_shortened(self):
+        doc, (text, report) = self.budget(900)
+
+        self.assertEqual(len(doc["skills"]), 16)
+        self.assertEqual(doc["skills"][-1], {"skill": "s015"})
+        self.assertEqual(len(doc["notes"]), 3000)
+        self.assertEqual(report["dropped"], {"child_rows": {"skills": 48}})
+        self.assertLessEqual(report["tokens"], 900)
+
+    def test_long_text_is_shortened_after_child_rows_run_out(self):
+        doc, (text, report) = self.budget(600)
+
+        self.assertEqual(doc["skills"], [])
+        self.assertEqual(doc["notes"], "x" * 2000 + TRUNCATION_MARK)
+        self.assertEqual(report["dropped"], {"child_rows": {"skills": 64}, "shortened_fields": ["notes"]})
+        self.assertLessEqual(estimate_tokens(text), 600)
+
+    def test_rejected_when_shortest_text_limit_does_not_fit(self):
+        with self.assertRaises(LangflowBudgetError):
+            self.budget(20)
@@ -0,0 +1,63 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from langflow_integration.langflow_integration.api import request_log
+
+
+class FakeListCache:
+    def __init__(self, items):
+        self.items = list(items)
+
+    def make_key(self, key):
+        return key
+
+    def pipeline(self):
+        cache = self
+        commands = []
+
+        class Pipeline:
+            def lrange(self, key, start, end):
+                commands.append(lambda: cache.items[start:end + 1])
+
+            def ltrim(self, key, start, end):
+                def trim():
+                    cache.items = cache.items[start:]
+                    return True
+                commands.append(trim)
+
+            def execute(self):
+                return [command() for command in commands]
+
+        return Pipeline()
+
+    def lpush(self, key, *values):
+        for value in values:
+            self.items.insert(0, value)
+
+
+class TestFlushRequestLogs(unittest.TestCase):
+    def test_failed_insert_returns_batch_to_buffer(self):
+        items = ['{"flow_id": "a"}', '{"flow_id": "b"}']
+        cache = FakeListCache(items + ['{"flow_id": "c"}'])
+
+        with patch("frappe.cache", return_value=cache), patch("frappe.db", MagicMock()) as db, patch.object(
+            request_log, "FLUSH_BATCH_SIZE", 2
+        ), patch.object(request_log, "_insert_entries", side_effect=RuntimeError("Lock wait timeout")):
+            with self.assertRaises(RuntimeError):
+                request_log.flush_request_logs()
+
+        db.rollback.assert_called_once()
+        # نفس الترتيب، قبل السجلات التي لم تُسحب بعد
+        self.assertEqual(cache.items, items + ['{"flow_id": "c"}'])
+
+    def test_successful_batches_are_removed(self):
+        cache = FakeListCache(['{"flow_id": "a"}', '{"flow_id": "b"}', '{"flow_id": "c"}'])
+
+        with patch("frappe.cache", return_value=cache), patch("frappe.db", MagicMock()) as db, patch.object(
+            request_log, "FLUSH_BATCH_SIZE", 2
+        ), patch.object(request_log, "_insert_entries") as insert_entries:
+            request_log.flush_request_logs()
+
+        self.assertEqual(insert_entries.call_count, 2)
+        self.assertEqual(db.commit.call_count, 2)
+        self.assertEqual(cache.items, [])
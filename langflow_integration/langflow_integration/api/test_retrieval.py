@@ -0,0 +1,65 @@
+import unittest
+
+from langflow_integration.langflow_integration.api.retrieval import BM25Index, tokenize
+
+DOCUMENTS = [
+    ("APP-1", "Python developer with Django and Frappe experience"),
+    ("APP-2", "Accountant, ERPNext accounting and payroll"),
+    ("APP-3", "Python data engineer: Python, Spark and SQL pipelines"),
+]
+
+
+def names(results):
+    return [name for name, _score in results]
+
+
+class TestTokenize(unittest.TestCase):
+    def test_words_are_casefolded_and_single_letters_dropped(self):
+        self.assertEqual(tokenize("Python, SQL & a C++ مطور"), ["python", "sql", "مطور"])
+
+
+class TestBM25Index(unittest.TestCase):
+    def setUp(self):
+        self.index = BM25Index()
+        self.index.build(DOCUMENTS)
+
+    def test_ranking_by_term_frequency(self):
+        results = self.index.search("python")
+
+        # APP-3 يذكر Python مرتين
+        self.assertEqual(names(results), ["APP-3", "APP-1"])
+        self.assertGreater(results[0][1], results[1][1])
+
+    def test_unmatched_documents_are_left_out(self):
+        self.assertEqual(names(self.index.search("payroll")), ["APP-2"])
+        self.assertEqual(self.index.search("kubernetes"), [])
+
+    def test_top_k(self):
+        self.assertEqual(names(self.index.search("python", k=1)), ["APP-3"])
+
+    def test_added_document_is_searchable(self):
+        self.index.add("APP-4", "Python Python Python backend developer")
+
+        self.assertEqual(names(self.index.search("python")), ["APP-4", "APP-3", "APP-1"])
+
+    def test_updated_document_replaces_its_old_text(self):
+        self.index.add("APP-1", "Payroll officer")
+
+        self.assertEqual(names(self.index.search("python")), ["APP-3"])
+        self.assertEqual(names(self.index.search("payroll")), ["APP-1", "APP-2"])
+
+    def test_removed_document_disappears(self):
+        self.index.remove("APP-3")
+
+        self.assertEqual(names(self.index.search("python")), ["APP-1"])
+        self.assertEqual(self.index.search("spark"), [])
+
+    def test_merge_keeps_ranking(self):
+        self.index.add("APP-4", "Python Python Python backend developer")
+        self.index.remove("APP-3")
+        before = self.index.search("python developer")
+
+        self.index.merge()
+
+        self.assertEqual(names(self.index.search("python developer")), names(before))
+        self.assertEqual(self.index.names, ["APP-1", "APP-2", "APP-4"])
@@ -0,0 +1,110 @@
+import unittest
+from unittest.mock import patch
+
+import frappe
+import requests
+
+from langflow_integration.langflow_integration.api import retry
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleep_calls = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleep_calls.append(seconds)
+        self.now += seconds
+
+
+class TestCallWithRetry(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+        patches = [
+            patch.dict(frappe.conf, {"langflow_retry": {}, "langflow_flow_retry": {}}),
+            patch.object(retry, "get_timeout", return_value=(5, 30)),
+            patch.object(retry.time, "monotonic", self.clock.monotonic),
+            patch.object(retry.time, "sleep", self.clock.sleep),
+            # أقصى قيمة للـ jitter حتى تكون الانتظارات معروفة
+            patch.object(retry.random, "uniform", lambda low, high: high),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def failing(self, *errors, result="ok", duration=0.0):
+        errors = list(errors)
+        timeouts = []
+
+        def send(timeout):
+            timeouts.append(timeout)
+            self.clock.now += duration
+            if errors:
+                raise errors.pop(0)
+            return result
+
+        return send, timeouts
+
+    def test_transient_error_then_success(self):
+        send, _timeouts = self.failing(http_error(503))
+
+        self.assertEqual(retry.call_with_retry(send, "flow"), ("ok", 2))
+        self.assertEqual(self.clock.sleep_calls, [0.5])
+
+    def test_stops_after_max_attempts_with_exponential_backoff(self):
+        send, _timeouts = self.failing(*(http_error(503) for _ in range(5)))
+
+        with self.assertRaises(requests.exceptions.HTTPError) as raised:
+            retry.call_with_retry(send, "flow")
+
+        self.assertEqual(raised.exception.langflow_attempts, 3)
+        self.assertEqual(self.clock.sleep_calls, [0.5, 1.0])
+
+    def test_deadline_cuts_retries_and_caps_attempt_timeout(self):
+        frappe.conf["langflow_retry"] = {"deadline": 2.0, "max_attempts": 5}
+        send, timeouts = self.failing(*(http_error(503) for _ in range(5)), duration=0.8)
+
+        with self.assertRaises(requests.exceptions.HTTPError) as raised:
+            retry.call_with_retry(send, "flow")
+
+        # المحاولة الثانية تنتهي عند 2.1 ثانية: لا وقت لمحاولة ثالثة
+        self.assertEqual(raised.exception.langflow_attempts, 2)
+        self.assertEqual(timeouts[0], (2.0, 2.0))
+        self.assertAlmostEqual(timeouts[1][1], 0.7)
+
+    def test_non_idempotent_requests_retry_only_safe_statuses(self):
+        send, _timeouts = self.failing(requests.exceptions.ReadTimeout())
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            retry.call_with_retry(send, "flow", idempotent=False)
+
+        send, _timeouts = self.failing(http_error(502))
+        self.assertEqual(retry.call_with_retry(send, "flow", idempotent=False), ("ok", 2))
+
+        send, _timeouts = self.failing(http_error(504))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            retry.call_with_retry(send, "flow", idempotent=False)
+
+    def test_client_errors_are_not_retried(self):
+        send, _timeouts = self.failing(http_error(422))
+
+        with self.assertRaises(requests.exceptions.HTTPError) as raised:
+            retry.call_with_retry(send, "flow")
+
+        self.assertEqual(raised.exception.langflow_attempts, 1)
+        self.assertEqual(self.clock.sleep_calls, [])
+
+    def test_backoff_is_capped(self):
+        policy = {"backoff_base": 0.5, "backoff_max": 8}
+
+        self.assertEqual(retry.get_backoff(1, policy), 0.5)
+        self.assertEqual(retry.get_backoff(10, policy), 8)
@@ -0,0 +1,144 @@
+import pickle
+import unittest
+from unittest.mock import MagicMock, patch
+
+import frappe
+
+from langflow_integration.langflow_integration.api import single_flight
+
+FLIGHT_KEY = single_flight.make_flight_key("flow", {"input_value": "CV"})
+
+
+class FakeRedisWrapper:
+    """
+    Redis بسلوك RedisWrapper.get_value: كل قراءة (حتى None) تُحفظ في frappe.local.cache إلا مع expires=True
+    """
+
+    def __init__(self):
+        self.store = {}
+        self.local_cache = {}
+
+    def make_key(self, key):
+        return f"site|{key}"
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            return None
+        self.store[key] = value.encode()
+        return True
+
+    def delete(self, key):
+        self.store.pop(key, None)
+
+    def get_value(self, key, expires=False):
+        key = self.make_key(key)
+        if key in self.local_cache:
+            return self.local_cache[key]
+
+        value = self.store.get(key)
+        value = pickle.loads(value) if value is not None else None
+        if not expires:
+            self.local_cache[key] = value
+        return value
+
+    def set_value(self, key, value, expires_in_sec=None):
+        key = self.make_key(key)
+        if not expires_in_sec:
+            self.local_cache[key] = value
+        self.store[key] = pickle.dumps(value)
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.cache = FakeRedisWrapper()
+        self.lock_key = self.cache.make_key(f"langflow_flight::{FLIGHT_KEY}")
+
+        patches = [
+            patch.dict(frappe.conf, {"langflow_single_flight": 1}),
+            patch("frappe.cache", return_value=self.cache),
+            patch.object(single_flight, "record_coalesced"),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_leader_runs_once_and_publishes_result(self):
+        fn = MagicMock(return_value={"success": True})
+
+        result = single_flight.single_flight("call_langflow", "flow", FLIGHT_KEY, fn)
+
+        fn.assert_called_once()
+        self.assertEqual(result, {"success": True})
+        # الحجز يُحرر بعد حفظ النتيجة
+        self.assertNotIn(self.lock_key, self.cache.store)
+
+    def test_waiter_sees_result_written_after_first_poll(self):
+        # worker آخر يشغّل نفس الطلب
+        self.cache.set(self.lock_key, "leader")
+        sleeps = []
+
+        def leader_finishes(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 1:
+                self.cache.store[self.cache.make_key("langflow_flight_result::leader")] = pickle.dumps(
+                    {"result": {"success": True, "answer": 42}, "duration_ms": 1500}
+                )
+                self.cache.delete(self.lock_key)
+
+        fn = MagicMock()
+        with patch.object(single_flight.time, "sleep", side_effect=leader_finishes):
+            result = single_flight.single_flight("call_langflow", "flow", FLIGHT_KEY, fn)
+
+        # القراءة الفارغة الأولى لا تُحفظ، فلا يُعاد تشغيل الـ Flow
+        fn.assert_not_called()
+        self.assertEqual(result, {"success": True, "answer": 42})
+        single_flight.record_coalesced.assert_called_once_with("call_langflow", "flow", 1500)
+
+    def test_failure_is_not_shared_with_waiters(self):
+        fn = MagicMock(return_value={"success": False, "error": "Rate limit exceeded"})
+
+        result = single_flight.single_flight("call_langflow", "flow", FLIGHT_KEY, fn)
+
+        self.assertEqual(result["error"], "Rate limit exceeded")
+        self.assertEqual(self.cache.store, {})
+
+    def test_waiter_runs_itself_when_leader_fails(self):
+        self.cache.set(self.lock_key, "leader")
+
+        def leader_fails(seconds):
+            # المنفذ فشل: حرر الحجز بدون نتيجة
+            self.cache.delete(self.lock_key)
+
+        fn = MagicMock(return_value={"success": True, "answer": 42})
+        with patch.object(single_flight.time, "sleep", side_effect=leader_fails):
+            result = single_flight.single_flight("call_langflow", "flow", FLIGHT_KEY, fn)
+
+        fn.assert_called_once()
+        self.assertEqual(result, {"success": True, "answer": 42})
+        single_flight.record_coalesced.assert_not_called()
+
+    def test_waits_when_lock_is_released_before_it_is_read(self):
+        set_lock = self.cache.set
+        attempts = []
+
+        def set_after_release(key, value, nx=False, ex=None):
+            attempts.append(key)
+            # أول SET NX يفشل، والحجز يتحرر قبل قراءته
+            return None if len(attempts) == 1 else set_lock(key, value, nx=nx, ex=ex)
+
+        fn = MagicMock(return_value={"success": True})
+        with patch.object(self.cache, "set", side_effect=set_after_release), \
+                patch.object(single_flight.time, "sleep") as sleep:
+            single_flight.single_flight("call_langflow", "flow", FLIGHT_KEY, fn)
+
+        sleep.assert_called_once_with(single_flight.POLL_INTERVAL)
+        fn.assert_called_once()
+
+    def test_flight_key_is_per_user(self):
+        self.assertNotEqual(
+            single_flight.make_flight_key("flow", {"input_value": "CV"}, user="a@example.com"),
+            single_flight.make_flight_key("flow", {"input_value": "CV"}, user="b@example.com")
+        )
@@ -0,0 +1,25 @@
+import unittest
+
+from langflow_integration.langflow_integration.api.text_extraction import normalize_text
+
+
+class TestNormalizeText(unittest.TestCase):
+    def test_whitespace_and_blank_lines(self):
+        text = "  Ali   Hassan \t\n\n\n Senior   Developer  \r\n"
+
+        self.assertEqual(normalize_text(text), "Ali Hassan\nSenior Developer")
+
+    def test_control_and_zero_width_characters_are_removed(self):
+        text = "﻿Py​thon\x00 and\x07 SQL‏"
+
+        self.assertEqual(normalize_text(text), "Python and SQL")
+
+    def test_nfkc_folds_compatibility_forms(self):
+        # ligature "fi" وأرقام كاملة العرض وصيغة عرض عربية للام
+        self.assertEqual(normalize_text("ﬁnance ２０２４ ﻝ"), "finance 2024 ل")
+
+    def test_repeated_lines_are_kept_once(self):
+        text = "Page Header\nExperience\nPAGE   header\nEducation\nPage Header"
+
+        # ترويسة الصفحة تتكرر بحالة أحرف ومسافات مختلفة
+        self.assertEqual(normalize_text(text), "Page Header\nExperience\nEducation")
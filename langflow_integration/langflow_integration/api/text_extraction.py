@@ -0,0 +1,165 @@
+"""
+CV Text Extraction
+Optional local pre-extraction of PDF/DOCX/text attachments in a process pool, normalized and cached per file hash
+"""
+
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.etree import ElementTree
+
+import frappe
+from frappe.utils import cint
+
+DEFAULT_TEXT_TTL = 30 * 24 * 60 * 60
+DEFAULT_EXTRACT_TIMEOUT = 60
+MAX_POOL_WORKERS = 4
+
+# أقل من هذا يعني ملفاً ممسوحاً ضوئياً أو فارغاً: يُرسل الملف نفسه إلى Langflow
+MIN_TEXT_CHARS = 200
+
+TEXT_EXTENSIONS = {"txt", "md", "csv"}
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def is_pre_extract_enabled(pre_extract=None):
+    """
+    الاستخراج المحلي اختياري: المعامل pre_extract ثم langflow_cv_pre_extract
+    """
+    if pre_extract is not None and pre_extract != "":
+        return bool(cint(pre_extract))
+    return bool(cint(frappe.conf.get("langflow_cv_pre_extract")))
+
+
+def get_cv_text(file_path, content_hash):
+    """
+    نص السيرة الذاتية من الكاش (حسب بصمة المحتوى) أو باستخراجه في process pool
+
+    Returns:
+        str: النص الموحد، أو None إذا كان النوع غير مدعوم أو النص قصيراً جداً (يُرفع الملف بدلاً منه)
+    """
+    cache_key = f"langflow_cv_text::{content_hash}"
+    text = frappe.cache().get_value(cache_key)
+
+    if text is None:
+        text = _extract_in_pool(file_path) or ""
+        # النتيجة الفارغة تُحفظ أيضاً حتى لا يُعاد تحليل نفس الملف الممسوح ضوئياً
+        frappe.cache().set_value(cache_key, text, expires_in_sec=get_text_ttl())
+
+    return text if len(text) >= MIN_TEXT_CHARS else None
+
+
+def extract_text(file_path):
+    """
+    استخراج النص وتوحيده (تُنفذ داخل الـ process pool، بدون استخدام frappe)
+    """
+    extension = os.path.splitext(file_path)[1].lower().lstrip(".")
+
+    if extension == "pdf":
+        raw = _pdf_text(file_path)
+    elif extension == "docx":
+        raw = _docx_text(file_path)
+    elif extension in TEXT_EXTENSIONS:
+        with open(file_path, "rb") as f:
+            raw = f.read().decode("utf-8", errors="ignore")
+    else:
+        return None
+
+    return normalize_text(raw) if raw else None
+
+
+def normalize_text(text):
+    """
+    توحيد النص: NFKC، حذف رموز التحكم والمسافات الزائدة والأسطر الفارغة،
+    وحذف الأسطر المكررة (ترويسات وتذييلات الصفحات)
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\u200b-\u200f\ufeff]", "", text)
+
+    lines, seen = [], set()
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        key = line.casefold()
+        if not line or key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+
+    return "\n".join(lines)
+
+
+def get_text_ttl():
+    return cint(frappe.conf.get("langflow_cv_text_ttl")) or DEFAULT_TEXT_TTL
+
+
+def _extract_in_pool(file_path):
+    timeout = cint(frappe.conf.get("langflow_cv_extract_timeout")) or DEFAULT_EXTRACT_TIMEOUT
+
+    try:
+        return _get_pool().submit(extract_text, file_path).result(timeout=timeout)
+    except BrokenProcessPool:
+        _reset_pool()
+        frappe.logger().error(f"CV text extraction pool crashed on {file_path}")
+    except Exception as e:
+        frappe.logger().error(f"CV text extraction failed for {file_path}: {str(e)}")
+
+    return None
+
+
+def _get_pool():
+    """
+    Process pool مشترك داخل العملية (يُعاد بناؤه بعد fork للـ worker)
+
+    forkserver بدلاً من fork لأن العملية الأم فيها خيوط (requests، الجداول الخلفية).
+    """
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else None)
+            workers = cint(frappe.conf.get("langflow_cv_extract_workers")) or min(MAX_POOL_WORKERS, os.cpu_count() or 1)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _pdf_text(file_path):
+    # pypdf من متطلبات Frappe
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+def _docx_text(file_path):
+    # DOCX ملف zip: النص في word/document.xml، فقرة لكل <w:p>
+    with zipfile.ZipFile(file_path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+
+    paragraphs = []
+    for paragraph in root.iter(f"{WORD_NAMESPACE}p"):
+        paragraphs.append("".join(
+            (node.text or "") if node.tag == f"{WORD_NAMESPACE}t" else "\t"
+            for node in paragraph.iter()
+            if node.tag in (f"{WORD_NAMESPACE}t", f"{WORD_NAMESPACE}tab")
+        ))
+    return "\n".join(paragraphs)
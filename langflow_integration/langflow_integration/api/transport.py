@@ -0,0 +1,139 @@
+"""
+Langflow HTTP Transport
+Process-wide pooled keep-alive sessions shared by every Langflow call
+"""
+
+import os
+import threading
+
+import frappe
+import requests
+from frappe.utils import cint, flt
+from requests.adapters import HTTPAdapter
+
+DEFAULT_LANGFLOW_URL = "http://localhost:7860"
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 20
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+
+# أقصى عدد من الجلسات المحفوظة في العملية الواحدة (عدة مواقع على نفس الـ worker)
+MAX_CACHED_SESSIONS = 16
+
+_sessions = {}
+_sessions_pid = None
+_sessions_lock = threading.Lock()
+
+
+def get_langflow_url():
+    """
+    عنوان خادم Langflow من site_config.json
+    """
+    return (frappe.conf.get("langflow_url") or DEFAULT_LANGFLOW_URL).rstrip("/")
+
+
+def get_langflow_headers():
+    """
+    ترويسات المصادقة الخاصة بـ Langflow
+    """
+    headers = {}
+    langflow_api_key = frappe.conf.get("langflow_api_key")
+    if langflow_api_key:
+        headers["x-api-key"] = langflow_api_key
+    return headers
+
+
+def get_pool_settings():
+    """
+    إعدادات تجمع الاتصالات (قابلة للتعديل من site_config.json)
+    """
+    return {
+        "pool_connections": cint(frappe.conf.get("langflow_pool_connections")) or DEFAULT_POOL_CONNECTIONS,
+        "pool_maxsize": cint(frappe.conf.get("langflow_pool_maxsize")) or DEFAULT_POOL_MAXSIZE,
+    }
+
+
+def get_timeout(timeout=None):
+    """
+    مهلة منفصلة للاتصال والقراءة
+
+    Args:
+        timeout: مهلة القراءة بالثواني (اختياري، الافتراضي من الإعدادات)
+
+    Returns:
+        tuple: (connect_timeout, read_timeout)
+    """
+    connect_timeout = flt(frappe.conf.get("langflow_connect_timeout")) or DEFAULT_CONNECT_TIMEOUT
+    read_timeout = flt(timeout) or flt(frappe.conf.get("langflow_read_timeout")) or DEFAULT_READ_TIMEOUT
+    return (connect_timeout, read_timeout)
+
+
+def get_http_session(langflow_url=None):
+    """
+    جلسة HTTP مشتركة لكل عنوان Langflow داخل العملية
+
+    يعاد بناء الجلسة تلقائياً عند تغير إعدادات التجمع في site_config.json،
+    وبعد fork للـ worker حتى لا تتشارك العمليات نفس الـ sockets.
+    """
+    global _sessions_pid
+
+    langflow_url = langflow_url or get_langflow_url()
+    pool_settings = get_pool_settings()
+    fingerprint = tuple(sorted(pool_settings.items()))
+
+    with _sessions_lock:
+        # عملية جديدة بعد fork: الاتصالات المفتوحة ملك العملية الأم
+        if _sessions_pid != os.getpid():
+            _sessions.clear()
+            _sessions_pid = os.getpid()
+
+        cached = _sessions.get(langflow_url)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+
+        if cached:
+            _close_session(cached[1])
+        elif len(_sessions) >= MAX_CACHED_SESSIONS:
+            oldest_url = next(iter(_sessions))
+            _close_session(_sessions.pop(oldest_url)[1])
+
+        session = _build_session(**pool_settings)
+        _sessions[langflow_url] = (fingerprint, session)
+        return session
+
+
+def reset_http_sessions():
+    """
+    إغلاق جميع الجلسات المحفوظة (تُبنى من جديد عند أول طلب)
+    """
+    with _sessions_lock:
+        for _fingerprint, session in _sessions.values():
+            _close_session(session)
+        _sessions.clear()
+
+
+def _build_session(pool_connections, pool_maxsize):
+    session = requests.Session()
+
+    # لا نعيد المحاولة على مستوى urllib3، وعند امتلاء التجمع يُفتح اتصال مؤقت بدل الانتظار
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=0,
+        pool_block=False,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Connection": "keep-alive",
+    })
+    return session
+
+
+def _close_session(session):
+    try:
+        session.close()
+    except Exception:
+        pass
@@ -0,0 +1,217 @@
+"""
+Mock Langflow Server
+Standard-library stand-in for Langflow's /api/v1/run/{flow_id}, /api/v1/files/upload/{flow_id} and /health
+with configurable latency, errors and streaming
+
+Usage:
+    python -m langflow_integration.langflow_integration.benchmarks.mock_server --port 7861 --latency 0.2 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+RUN_PATH = re.compile(r"^/api/v1/run/(?P<flow_id>[^/]+)/?$")
+UPLOAD_PATH = re.compile(r"^/api/v1/files/upload/(?P<flow_id>[^/]+)/?$")
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+DEFAULT_OPTIONS = {
+    # زمن المعالجة بالثواني: latency ± jitter
+    "latency": 0.1,
+    "jitter": 0.0,
+    # نسبة الطلبات التي ترجع error_status
+    "error_rate": 0.0,
+    "error_status": 503,
+    # البث: عدد الأجزاء والمدة بين جزأين
+    "tokens": 20,
+    "token_delay": 0.01,
+    "response_text": "This is a mock Langflow response.",
+}
+
+
+class MockLangflowServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, options=None):
+        super().__init__(address, MockLangflowHandler)
+        self.options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {
+                "requests": 0,
+                "errors": 0,
+                "streamed": 0,
+                "inflight": 0,
+                "max_inflight": 0,
+                "busy_seconds": 0.0,
+            }
+
+    def track(self, delta, busy=0.0, error=False, streamed=False):
+        with self.lock:
+            stats = self.stats
+            stats["inflight"] += delta
+            stats["max_inflight"] = max(stats["max_inflight"], stats["inflight"])
+            if delta < 0:
+                stats["requests"] += 1
+                stats["busy_seconds"] += busy
+                stats["errors"] += int(error)
+                stats["streamed"] += int(streamed)
+
+
+class MockLangflowHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if urlparse(self.path).path.rstrip("/") == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        upload = UPLOAD_PATH.match(url.path)
+        if upload:
+            self._receive_upload(upload.group("flow_id"))
+            return
+
+        match = RUN_PATH.match(url.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        if not match:
+            self._send_json(404, {"detail": "Not Found"})
+            return
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(422, {"detail": "Invalid JSON body"})
+            return
+
+        options = self.server.options
+        stream = parse_qs(url.query).get("stream", ["false"])[0].lower() == "true"
+        started = time.monotonic()
+        error = random.random() < options["error_rate"]
+        self.server.track(1)
+
+        try:
+            time.sleep(max(options["latency"] + random.uniform(-options["jitter"], options["jitter"]), 0))
+
+            if error:
+                self._send_json(options["error_status"], {"detail": "Mock Langflow error"})
+            elif stream:
+                self._send_stream(match.group("flow_id"), payload)
+            else:
+                self._send_json(200, _run_response(match.group("flow_id"), payload, options["response_text"]))
+        finally:
+            self.server.track(-1, time.monotonic() - started, error, stream and not error)
+
+    def _receive_upload(self, flow_id):
+        # يُقرأ الملف على دفعات ويُهمل، المهم حجمه ومرجع يشبه ما يرجعه Langflow
+        remaining = int(self.headers.get("Content-Length") or 0)
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, UPLOAD_CHUNK_SIZE))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+        self._send_json(201, {"flowId": flow_id, "file_path": f"{flow_id}/{uuid.uuid4().hex}"})
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, flow_id, payload):
+        options = self.server.options
+        words = options["response_text"].split(" ")
+        size = -(-len(words) // max(options["tokens"], 1))
+        chunks = [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        for index, chunk in enumerate(chunks):
+            self._write_chunk({"event": "token", "data": {"chunk": chunk if index == len(chunks) - 1 else chunk + " "}})
+            time.sleep(options["token_delay"])
+
+        self._write_chunk({"event": "end", "data": {"result": _run_response(flow_id, payload, options["response_text"])}})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, event):
+        data = (json.dumps(event) + "\n\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def _run_response(flow_id, payload, text):
+    session_id = payload.get("session_id") or str(uuid.uuid4())
+    message = {"text": text, "sender": "Machine", "session_id": session_id}
+    return {
+        "session_id": session_id,
+        "outputs": [{
+            "inputs": {"input_value": payload.get("input_value")},
+            "outputs": [{
+                "results": {"message": message},
+                "messages": [{"message": text, "type": "text"}],
+                "component_display_name": "Chat Output",
+                "flow_id": flow_id,
+            }],
+        }],
+    }
+
+
+def start_mock_server(host="127.0.0.1", port=0, **options):
+    """
+    تشغيل الخادم في خيط خلفي (port=0 يختار منفذاً متاحاً)
+
+    Returns:
+        MockLangflowServer: الخادم (server.url للعنوان، server.stats للإحصائيات، server.shutdown() للإيقاف)
+    """
+    server = MockLangflowServer((host, port), options)
+    threading.Thread(target=server.serve_forever, name="mock-langflow", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Langflow server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7861)
+    for name, default in DEFAULT_OPTIONS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    args = vars(parser.parse_args())
+
+    server = MockLangflowServer((args.pop("host"), args.pop("port")), args)
+    print(f"Mock Langflow listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
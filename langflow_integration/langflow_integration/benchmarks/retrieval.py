@@ -0,0 +1,147 @@
+"""
+Retrieval Index Benchmarks
+Build time, memory footprint, query latency and incremental update cost of the BM25 index, on synthetic
+records (no site needed) or on a real DocType
+
+Usage:
+    python -m langflow_integration.langflow_integration.benchmarks.retrieval --records 100000 --queries 500
+    bench --site <site> execute langflow_integration.langflow_integration.benchmarks.retrieval.run_retrieval_benchmarks \
+        --kwargs '{"doctype": "Customer"}'
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from langflow_integration.langflow_integration.api.retrieval import BM25Index, tokenize
+from langflow_integration.langflow_integration.benchmarks.suite import _percentile
+
+DEFAULT_RECORDS = 100000
+DEFAULT_QUERIES = 500
+DEFAULT_UPDATES = 1000
+VOCABULARY_SIZE = 50000
+WORDS_PER_RECORD = 30
+
+
+def run_retrieval_benchmarks(records=None, queries=None, updates=None, doctype=None, k=5, seed=42, output=None):
+    """
+    قياس الفهرس وإرجاع النتائج بصيغة JSON
+
+    Args:
+        records: عدد السجلات الاصطناعية (يُتجاهل مع doctype)
+        queries: عدد الاستعلامات المقاسة
+        updates: عدد التحديثات التدريجية (add) المقاسة
+        doctype: بناء الفهرس من سجلات DocType حقيقي (يتطلب bench execute)
+        k: عدد النتائج لكل استعلام
+        seed: بذرة المولد العشوائي
+        output: مسار ملف لحفظ النتائج (اختياري)
+
+    Returns:
+        dict: زمن البناء، الذاكرة، زمن الاستعلام وزمن التحديث
+    """
+    rng = random.Random(seed)
+    queries = int(queries or DEFAULT_QUERIES)
+    updates = int(updates or DEFAULT_UPDATES)
+
+    if doctype:
+        documents = _doctype_documents(doctype)
+    else:
+        vocabulary = [f"term{i}" for i in range(VOCABULARY_SIZE)]
+        # توزيع Zipf تقريبي: قليل من الكلمات شائع جداً وأغلبها نادر
+        weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+        documents = [
+            (f"REC-{i:07d}", " ".join(rng.choices(vocabulary, weights, k=WORDS_PER_RECORD)))
+            for i in range(int(records or DEFAULT_RECORDS))
+        ]
+
+    index = BM25Index()
+    tracemalloc.start()
+    started = time.perf_counter()
+    index.build(documents)
+    build_seconds = time.perf_counter() - started
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # الاستعلامات من كلمات سجلات موجودة (2-4 كلمات)
+    samples = [tokenize(text) for _name, text in rng.sample(documents, min(queries, len(documents)))]
+    query_texts = [" ".join(rng.sample(tokens, min(len(tokens), rng.randint(2, 4)))) for tokens in samples if tokens]
+
+    latencies = []
+    for query in query_texts:
+        started = time.perf_counter()
+        index.search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    update_latencies = []
+    for _i in range(min(updates, len(documents))):
+        name, _text = rng.choice(documents)
+        _other, text = rng.choice(documents)
+        started = time.perf_counter()
+        index.add(name, text)
+        update_latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    index.merge()
+    merge_seconds = time.perf_counter() - started
+
+    latencies.sort()
+    update_latencies.sort()
+    report = {
+        "source": doctype or "synthetic",
+        "records": len(documents),
+        "vocabulary": len(index.vocab),
+        "postings": int(len(index.post_rows)),
+        "build_s": round(build_seconds, 3),
+        "build_peak_mb": round(peak / 1024 / 1024, 1),
+        "index_arrays_mb": round(index.memory_bytes() / 1024 / 1024, 1),
+        "query_ms": {
+            "count": len(latencies),
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": round(latencies[-1], 2) if latencies else 0,
+        },
+        "update_ms": {
+            "count": len(update_latencies),
+            "p50": _percentile(update_latencies, 0.50),
+            "p99": _percentile(update_latencies, 0.99),
+        },
+        "merge_s": round(merge_seconds, 3),
+    }
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+def _doctype_documents(doctype):
+    import frappe
+
+    from langflow_integration.langflow_integration.api.retrieval import _row_text, get_retrieval_fields
+
+    fields = get_retrieval_fields(doctype)
+    if not fields:
+        frappe.throw(f"Add {doctype} to langflow_retrieval_doctypes first")
+
+    rows = frappe.get_all(doctype, fields=["name", *fields], limit_page_length=0, order_by=None)
+    return [(row.name, _row_text(row, fields)) for row in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 retrieval index benchmark")
+    parser.add_argument("--records", type=int, default=DEFAULT_RECORDS)
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+    parser.add_argument("--updates", type=int, default=DEFAULT_UPDATES)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    print(json.dumps(run_retrieval_benchmarks(args.records, args.queries, args.updates, k=args.k, output=args.output), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Langflow Client Benchmarks
+Drives the Langflow-backed endpoints against the mock server at increasing concurrency and reports
+throughput, tail latency and worker utilization as JSON
+
+Usage:
+    bench --site <site> execute langflow_integration.langflow_integration.benchmarks.suite.run_benchmarks \
+        --kwargs '{"concurrency": [1, 4, 16], "requests": 200, "latency": 0.2, "output": "/tmp/langflow_bench.json"}'
+"""
+
+import asyncio
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import now_datetime
+
+from langflow_integration.langflow_integration.benchmarks.mock_server import DEFAULT_OPTIONS, start_mock_server
+
+BENCHMARK_FLOW_ID = "benchmark"
+DEFAULT_SCENARIOS = ("call_langflow", "call_langflow_async", "chat_with_langflow", "process_document_with_ai", "extract_cv_data")
+DEFAULT_CONCURRENCY = (1, 4, 8, 16)
+DEFAULT_REQUESTS = 100
+
+# إعدادات الموقع أثناء القياس: لا كاش للردود ولا دمج للطلبات المتطابقة حتى يصل كل طلب إلى الخادم
+BENCHMARK_CONF = {
+    "langflow_response_cache_flows": [],
+    "langflow_single_flight": 0,
+}
+
+
+def run_benchmarks(scenarios=None, concurrency=None, requests=None, output=None, conf=None,
+                   document=None, applicant=None, **mock_options):
+    """
+    تشغيل القياسات وإرجاع النتائج بصيغة JSON
+
+    Args:
+        scenarios: أسماء السيناريوهات (الافتراضي DEFAULT_SCENARIOS)
+        concurrency: مستويات التزامن (الافتراضي 1, 4, 8, 16)
+        requests: عدد الطلبات في كل مستوى
+        output: مسار ملف لحفظ النتائج (اختياري)
+        conf: إعدادات إضافية للموقع أثناء القياس، مثل langflow_max_inflight (اختياري)
+        document: [doctype, docname] لسيناريو process_document_with_ai (الافتراضي User/Administrator)
+        applicant: اسم Job Applicant لديه resume_attachment لسيناريو extract_cv_data (يُتخطى بدونه)
+        **mock_options: إعدادات الخادم الوهمي (latency, jitter, error_rate, error_status, tokens, token_delay)
+
+    Returns:
+        dict: النتائج لكل سيناريو ومستوى تزامن
+    """
+    scenarios = list(scenarios or DEFAULT_SCENARIOS)
+    levels = [int(c) for c in (concurrency or DEFAULT_CONCURRENCY)]
+    requests = int(requests or DEFAULT_REQUESTS)
+
+    server = start_mock_server(**{k: v for k, v in mock_options.items() if k in DEFAULT_OPTIONS})
+    overrides = {**BENCHMARK_CONF, **(conf or {}), "langflow_url": server.url}
+
+    report = {
+        "started": str(now_datetime()),
+        "site": frappe.local.site,
+        "mock": server.options,
+        "conf": overrides,
+        "requests_per_level": requests,
+        "results": [],
+    }
+
+    try:
+        for scenario in scenarios:
+            call = _build_scenario(scenario, document, applicant)
+
+            for level in levels:
+                if isinstance(call, str):
+                    report["results"].append({"scenario": scenario, "concurrency": level, "skipped": call})
+                    continue
+
+                server.reset_stats()
+                if scenario == "call_langflow_async":
+                    measured = _run_async_level(level, requests, overrides)
+                else:
+                    measured = _run_level(call, level, requests, overrides)
+
+                report["results"].append(_summarize(scenario, level, measured, server.stats))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+    return report
+
+
+def _build_scenario(scenario, document=None, applicant=None):
+    """
+    Returns:
+        callable: دالة تنفذ طلباً واحداً وترجع نتيجة الـ endpoint، أو نص سبب التخطي
+    """
+    from langflow_integration.langflow_integration.api import langflow_client
+
+    if scenario in ("call_langflow", "call_langflow_async"):
+        return lambda: langflow_client.call_langflow(BENCHMARK_FLOW_ID, "benchmark input")
+
+    if scenario == "chat_with_langflow":
+        return lambda: langflow_client.chat_with_langflow(
+            "benchmark question",
+            flow_id=BENCHMARK_FLOW_ID,
+            session_id=frappe.generate_hash(length=16)
+        )
+
+    if scenario == "process_document_with_ai":
+        doctype, docname = document or ("User", "Administrator")
+        return lambda: langflow_client.process_document_with_ai(
+            doctype, docname, "Summarize this document", flow_id=BENCHMARK_FLOW_ID, force_refresh=1
+        )
+
+    if scenario == "extract_cv_data":
+        if not applicant:
+            return "pass applicant=<Job Applicant with a resume_attachment> to run this scenario"
+        cv_file_url = frappe.db.get_value("Job Applicant", applicant, "resume_attachment")
+        if not cv_file_url:
+            return f"Job Applicant {applicant} has no resume_attachment"
+        return lambda: langflow_client.extract_cv_data(applicant, cv_file_url, flow_id=BENCHMARK_FLOW_ID, force_refresh=1)
+
+    return f"unknown scenario {scenario}"
+
+
+def _run_level(call, concurrency, requests, overrides):
+    """
+    تشغيل requests طلباً على concurrency خيطاً؛ كل خيط يفتح سياق Frappe مرة واحدة قبل بدء التوقيت
+    """
+    site, sites_path, user = frappe.local.site, frappe.local.sites_path, frappe.session.user
+    barrier = threading.Barrier(concurrency + 1)
+    lock = threading.Lock()
+    remaining = [requests]
+    latencies, failures, busy = [], [], []
+
+    def take():
+        with lock:
+            if remaining[0] <= 0:
+                return False
+            remaining[0] -= 1
+            return True
+
+    def worker():
+        frappe.init(site=site, sites_path=sites_path)
+        try:
+            frappe.connect()
+            frappe.set_user(user)
+            frappe.local.conf.update(overrides)
+            barrier.wait()
+
+            worker_busy = 0.0
+            while take():
+                started = time.monotonic()
+                try:
+                    ok = bool((call() or {}).get("success"))
+                except Exception:
+                    ok = False
+                elapsed = time.monotonic() - started
+                worker_busy += elapsed
+                with lock:
+                    latencies.append(elapsed * 1000)
+                    if not ok:
+                        failures.append(elapsed)
+            with lock:
+                busy.append(worker_busy)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception:
+            barrier.abort()
+            raise
+        finally:
+            frappe.destroy()
+
+    threads = [threading.Thread(target=worker, name=f"langflow-bench-{i}") for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+
+    barrier.wait()
+    started = time.monotonic()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "duration": time.monotonic() - started,
+        "latencies": latencies,
+        "failed": len(failures),
+        "busy": sum(busy),
+        "workers": concurrency,
+    }
+
+
+def _run_async_level(concurrency, requests, overrides):
+    """
+    نفس القياس عبر العميل غير المتزامن: خيط واحد و concurrency طلباً متزامناً
+    """
+    from langflow_integration.langflow_integration.api.async_client import acall_langflow, build_async_client
+
+    latencies, failures = [], []
+
+    async def run():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with build_async_client() as client:
+            async def one():
+                async with semaphore:
+                    started = time.monotonic()
+                    result = await acall_langflow(BENCHMARK_FLOW_ID, "benchmark input", client=client)
+                    latencies.append((time.monotonic() - started) * 1000)
+                    if not result.get("success"):
+                        failures.append(result)
+
+            await asyncio.gather(*(one() for _i in range(requests)))
+
+    with _conf_overrides(overrides):
+        started = time.monotonic()
+        asyncio.run(run())
+        duration = time.monotonic() - started
+
+    return {
+        "duration": duration,
+        "latencies": latencies,
+        "failed": len(failures),
+        # خيط واحد يخدم كل الطلبات
+        "busy": duration,
+        "workers": 1,
+    }
+
+
+@contextmanager
+def _conf_overrides(overrides):
+    previous = {key: frappe.local.conf.get(key) for key in overrides}
+    frappe.local.conf.update(overrides)
+    try:
+        yield
+    finally:
+        frappe.local.conf.update(previous)
+
+
+def _summarize(scenario, concurrency, measured, server_stats):
+    latencies = sorted(measured["latencies"])
+    count = len(latencies)
+    duration = measured["duration"] or 1e-9
+
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": count,
+        "succeeded": count - measured["failed"],
+        "failed": measured["failed"],
+        "error_rate": round(measured["failed"] / count, 4) if count else 0,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(count / duration, 2),
+        "latency_ms": {
+            "mean": round(sum(latencies) / count, 2) if count else 0,
+            "p50": _percentile(latencies, 0.50),
+            "p95": _percentile(latencies, 0.95),
+            "p99": _percentile(latencies, 0.99),
+            "max": round(latencies[-1], 2) if count else 0,
+        },
+        # نسبة وقت الـ workers المستغرق داخل الطلبات (الباقي انتظار أو تهيئة)
+        "worker_utilization": round(measured["busy"] / (measured["workers"] * duration), 4),
+        "server": {
+            "requests": server_stats["requests"],
+            "errors": server_stats["errors"],
+            "max_inflight": server_stats["max_inflight"],
+            "utilization": round(server_stats["busy_seconds"] / (concurrency * duration), 4),
+        },
+    }
+
+
+def _percentile(sorted_values, quantile):
+    if not sorted_values:
+        return 0
+    # nearest-rank
+    index = max(math.ceil(quantile * len(sorted_values)) - 1, 0)
+    return round(sorted_values[index], 2)
@@ -3,6 +3,7 @@ frappe.ui.form.on('Job Applicant', {
         if (!frm.is_new()) {
             add_ai_extract_button(frm);
         }
+        listen_for_cv_extraction(frm);
     },
     refresh: function(frm) {
         if (!frm.is_new()) {
@@ -22,6 +23,20 @@ function add_ai_extract_button(frm) {
     });
 }
 
+// الاستخراج التلقائي في الخلفية (langflow_cv_auto_extract): النتيجة محفوظة، والضغط على الزر يعرضها فوراً
+function listen_for_cv_extraction(frm) {
+    if (frm.langflow_cv_listener) return;
+    frm.langflow_cv_listener = true;
+
+    frappe.realtime.on('langflow_cv_extracted', function(data) {
+        if (!data || data.applicant !== frm.doc.name || data.file_url !== frm.doc.resume_attachment) return;
+        frappe.show_alert({
+            message: __('AI CV extraction is ready'),
+            indicator: 'green'
+        }, 5);
+    });
+}
+
 function extract_cv_with_ai(frm) {
     // التحقق من وجود CV مرفق
     if (!frm.doc.resume_attachment) {
@@ -42,36 +57,30 @@ function extract_cv_with_ai(frm) {
         indicator: 'blue'
     }, 3);
 
-    // استدعاء API المخصص لاستخراج CV
+    // استدعاء API المخصص لاستخراج CV في الخلفية
     // لا نحتاج لتمرير flow_id - سيتم الحصول عليه من site_config.json تلقائياً
     frappe.call({
         method: 'langflow_integration.langflow_integration.api.langflow_client.extract_cv_data',
         args: {
             applicant_name: frm.doc.name,
-            cv_file_url: file_url
+            cv_file_url: file_url,
+            run_async: 1
             // flow_id ليس مطلوباً - سيتم الحصول عليه من الإعدادات
         },
-        freeze: true,
-        freeze_message: __('AI is processing your CV...'),
         callback: function(r) {
             console.log('📥 Full Response:', r);
-            
-            if (r.message && r.message.success) {
-                console.log('✅ Success! Data:', r.message.data);
+
+            if (r.message && r.message.queued) {
+                // النموذج يبقى متاحاً أثناء المعالجة، والنتيجة تصل عبر realtime
                 frappe.show_alert({
-                    message: __('CV extracted successfully!'),
-                    indicator: 'green'
+                    message: __('AI is processing your CV in the background...'),
+                    indicator: 'blue'
                 }, 5);
-
-                show_cv_extraction_results(r.message.data, frm);
-            } else {
-                let error_msg = (r.message && r.message.error) ? r.message.error : __('Unknown error occurred');
-                console.error('❌ Extraction failed:', error_msg);
-                frappe.msgprint({
-                    title: __('Extraction Failed'),
-                    indicator: 'red',
-                    message: error_msg
+                wait_for_langflow_job(r.message.job_id, function(result) {
+                    handle_cv_extraction_result(result, frm);
                 });
+            } else {
+                handle_cv_extraction_result(r.message, frm);
             }
         },
         error: function(r) {
@@ -92,51 +101,33 @@ function extract_cv_with_ai(frm) {
     });
 }
 
-function show_cv_extraction_results(data, frm) {
-    console.log('🎨 Formatting results...', data);
-    
-    // استخراج النص من response
-    let extracted_text = '';
-    let extracted_data = null;
-    
-    try {
-        if (data.outputs && data.outputs[0]) {
-            let output = data.outputs[0];
-            if (output.outputs && output.outputs[0]) {
-                let result = output.outputs[0];
-                
-                // Try to get the message
-                if (result.results && result.results.message) {
-                    extracted_text = typeof result.results.message === 'string' 
-                        ? result.results.message 
-                        : result.results.message.text || JSON.stringify(result.results.message, null, 2);
-                } else if (result.message) {
-                    extracted_text = typeof result.message === 'string'
-                        ? result.message
-                        : result.message.text || JSON.stringify(result.message, null, 2);
-                } else if (result.results && result.results.text) {
-                    extracted_text = result.results.text;
-                } else if (result.text) {
-                    extracted_text = result.text;
-                }
-            }
-        }
-        
-        if (!extracted_text) {
-            extracted_text = JSON.stringify(data, null, 2);
-        }
-        
-        // Try to parse as JSON for structured display
-        try {
-            extracted_data = JSON.parse(extracted_text);
-        } catch (e) {
-            // Not JSON, that's fine
-        }
-        
-    } catch (e) {
-        console.error('Error parsing results:', e);
-        extracted_text = JSON.stringify(data, null, 2);
+function handle_cv_extraction_result(result, frm) {
+    if (result && result.success) {
+        console.log('✅ Success! Output:', result.output);
+        frappe.show_alert({
+            message: __('CV extracted successfully!'),
+            indicator: 'green'
+        }, 5);
+
+        show_cv_extraction_results(result.output, frm);
+    } else {
+        let error_msg = (result && result.error) ? result.error : __('Unknown error occurred');
+        console.error('❌ Extraction failed:', error_msg);
+        frappe.msgprint({
+            title: __('Extraction Failed'),
+            indicator: 'red',
+            message: error_msg
+        });
     }
+}
+
+function show_cv_extraction_results(output, frm) {
+    console.log('🎨 Formatting results...', output);
+    
+    // الخادم يستخرج النص والبيانات المنظمة من رد Langflow (output = {text, json})
+    output = output || {};
+    let extracted_text = output.text || '';
+    let extracted_data = output.json;
 
     // Format the content
     let formatted_content = '';
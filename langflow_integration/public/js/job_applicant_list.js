@@ -0,0 +1,88 @@
+frappe.listview_settings['Job Applicant'] = frappe.listview_settings['Job Applicant'] || {};
+
+(function(settings) {
+    const base_onload = settings.onload;
+
+    settings.onload = function(listview) {
+        if (base_onload) {
+            base_onload(listview);
+        }
+
+        listview.page.add_actions_menu_item(__('AI Extract CV'), function() {
+            let applicant_names = listview.get_checked_items(true);
+            if (!applicant_names.length) {
+                frappe.msgprint(__('Please select at least one applicant'));
+                return;
+            }
+            bulk_extract_cv_with_ai(applicant_names);
+        }, false);
+    };
+})(frappe.listview_settings['Job Applicant']);
+
+function bulk_extract_cv_with_ai(applicant_names) {
+    frappe.call({
+        method: 'langflow_integration.langflow_integration.api.bulk.bulk_extract_cv_data',
+        args: {
+            applicant_names: applicant_names
+        },
+        callback: function(r) {
+            if (!r.message || !r.message.success) {
+                frappe.msgprint({
+                    title: __('Extraction Failed'),
+                    indicator: 'red',
+                    message: (r.message && r.message.error) || __('Unknown error occurred')
+                });
+                return;
+            }
+
+            let title = __('AI Extract CV');
+            frappe.show_progress(title, 0, applicant_names.length, __('Queued...'));
+
+            wait_for_langflow_job(r.message.job_id, function(result) {
+                frappe.hide_progress();
+                show_bulk_cv_report(result);
+            }, function(progress) {
+                frappe.show_progress(
+                    title,
+                    progress.done,
+                    progress.total,
+                    __('{0} succeeded, {1} failed', [progress.succeeded, progress.failed])
+                );
+            });
+        }
+    });
+}
+
+function show_bulk_cv_report(result) {
+    if (!result || !result.report) {
+        frappe.msgprint({
+            title: __('Extraction Failed'),
+            indicator: 'red',
+            message: (result && result.error) || __('Unknown error occurred')
+        });
+        return;
+    }
+
+    let report = result.report;
+    let failures = report.results.filter(row => !row.success);
+    let rows = failures.map(row => `
+        <tr>
+            <td>${frappe.utils.escape_html(row.applicant)}</td>
+            <td>${frappe.utils.escape_html(row.error || '')}</td>
+        </tr>
+    `).join('');
+
+    frappe.msgprint({
+        title: __('AI CV Extraction Report'),
+        indicator: failures.length ? 'orange' : 'green',
+        message: `
+            <p>${frappe.utils.escape_html(result.message)} (${report.duration}s)</p>
+            ${failures.length ? `
+                <table class="table table-bordered table-sm">
+                    <thead><tr><th>${__('Applicant')}</th><th>${__('Error')}</th></tr></thead>
+                    <tbody>${rows}</tbody>
+                </table>
+            ` : ''}
+        `
+    });
+}
@@ -0,0 +1,473 @@
+/**
+ * Langflow Chat Widget
+ * Loaded on demand by langflow_global.js (first click on "AI Chat" or "Process with AI")
+ */
+
+// ============================================
+// CHAT WIDGET
+// ============================================
+
+function create_langflow_widget(context_data) {
+    $('#langflow-embedded-widget').remove();
+    
+    const doctype = context_data.doctype;
+    const docname = context_data.docname || null;
+    const is_list = context_data.is_list || false;
+    
+    let header_title = '🤖 AI Assistant';
+    let header_subtitle = is_list ? `${doctype} List` : `${doctype}: ${docname}`;
+    
+    let widget_html = `
+        <div id="langflow-embedded-widget" style="
+            position: fixed;
+            bottom: 20px;
+            right: 20px;
+            width: 400px;
+            height: 650px;
+            background: white;
+            border-radius: 16px;
+            box-shadow: 0 10px 40px rgba(0,0,0,0.2);
+            display: flex;
+            flex-direction: column;
+            z-index: 1050;
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+        ">
+            <div style="
+                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                color: white;
+                padding: 18px 20px;
+                border-radius: 16px 16px 0 0;
+                display: flex;
+                justify-content: space-between;
+                align-items: center;
+            ">
+                <div style="flex: 1; min-width: 0;">
+                    <div style="font-weight: 600; font-size: 17px; margin-bottom: 4px;">${header_title}</div>
+                    <div style="font-size: 12px; opacity: 0.9; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;" title="${header_subtitle}">${header_subtitle}</div>
+                </div>
+                <button id="langflow-new-chat" title="محادثة جديدة" style="
+                    background: rgba(255,255,255,0.2);
+                    border: none;
+                    color: white;
+                    width: 36px;
+                    height: 36px;
+                    border-radius: 50%;
+                    cursor: pointer;
+                    font-size: 18px;
+                    line-height: 1;
+                    flex-shrink: 0;
+                    margin-left: 12px;
+                ">↺</button>
+                <button id="langflow-close-widget" style="
+                    background: rgba(255,255,255,0.2);
+                    border: none;
+                    color: white;
+                    width: 36px;
+                    height: 36px;
+                    border-radius: 50%;
+                    cursor: pointer;
+                    font-size: 24px;
+                    line-height: 1;
+                    transition: all 0.2s;
+                    flex-shrink: 0;
+                    margin-left: 12px;
+                " onmouseover="this.style.background='rgba(255,255,255,0.3)'; this.style.transform='scale(1.1)'"
+                   onmouseout="this.style.background='rgba(255,255,255,0.2)'; this.style.transform='scale(1)'">×</button>
+            </div>
+            
+            <div id="langflow-widget-messages" style="
+                flex: 1;
+                overflow-y: auto;
+                padding: 20px;
+                background: #f8f9fa;
+            "></div>
+            
+            <div style="
+                padding: 16px;
+                border-top: 1px solid #e9ecef;
+                background: white;
+                border-radius: 0 0 16px 16px;
+            ">
+                <div style="display: flex; gap: 10px;">
+                    <input type="text" 
+                           id="langflow-widget-input" 
+                           class="form-control" 
+                           placeholder="اكتب رسالتك..."
+                           style="
+                               flex: 1;
+                               border: 1px solid #dee2e6;
+                               border-radius: 24px;
+                               padding: 12px 18px;
+                               font-size: 14px;
+                               transition: all 0.2s;
+                           " />
+                    <button id="langflow-widget-send" 
+                            class="btn btn-primary"
+                            style="
+                                border-radius: 24px;
+                                padding: 12px 24px;
+                                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                                border: none;
+                                font-weight: 600;
+                            ">إرسال</button>
+                </div>
+                <div style="margin-top: 10px; font-size: 11px; color: #6c757d; text-align: center;">
+                    ⚡ Powered by Langflow AI
+                </div>
+            </div>
+        </div>
+    `;
+    
+    $('body').append(widget_html);
+    
+    // الجلسة محفوظة على الخادم: تُستأنف بعد إعادة تحميل الصفحة بدلاً من البدء من جديد
+    // معرفها يولده الخادم ويصل في كل رد (null = الجلسة النشطة أو جلسة جديدة)
+    let session_id = null;
+
+    function set_session_id(value) {
+        session_id = value;
+    }
+    
+    $('#langflow-close-widget').on('click', function() {
+        $('#langflow-embedded-widget').fadeOut(300, function() {
+            $(this).remove();
+        });
+    });
+    
+    $('#langflow-widget-send').on('click', function() {
+        send_langflow_message(context_data, session_id, set_session_id);
+    });
+    
+    $('#langflow-widget-input').on('keypress', function(e) {
+        if (e.which === 13) {
+            send_langflow_message(context_data, session_id, set_session_id);
+        }
+    });
+    
+    $('#langflow-new-chat').on('click', function() {
+        frappe.call({
+            method: 'langflow_integration.langflow_integration.api.chat_sessions.end_chat_session',
+            args: { doctype: doctype, session_id: session_id },
+            callback: function() {
+                session_id = null;
+                $('#langflow-widget-messages').empty();
+                load_langflow_chat_history();
+            }
+        });
+    });
+
+    function append_welcome_message() {
+        let welcome_msg = is_list 
+            ? `مرحباً! 👋 أنا مساعد AI. يمكنني مساعدتك في الاستعلام عن بيانات ${doctype}. اسألني أي سؤال!`
+            : `مرحباً! 👋 أنا مساعد AI. يمكنني مساعدتك في تحليل وفهم بيانات ${doctype}: ${docname}. كيف يمكنني مساعدتك؟`;
+        append_langflow_message('ai', welcome_msg);
+    }
+
+    function load_langflow_chat_history() {
+        frappe.call({
+            method: 'langflow_integration.langflow_integration.api.chat_sessions.get_chat_history',
+            args: { doctype: doctype },
+            callback: function(r) {
+                let history = (r.message && r.message.success && r.message.history) || [];
+                session_id = (r.message && r.message.session_id) || null;
+                if (!history.length) {
+                    append_welcome_message();
+                    return;
+                }
+                history.forEach(function(entry) {
+                    append_langflow_message(entry.role, frappe.utils.escape_html(entry.text).replace(/\n/g, '<br>'));
+                });
+            },
+            error: function() {
+                session_id = null;
+                append_welcome_message();
+            }
+        });
+    }
+
+    load_langflow_chat_history();
+    
+    $('#langflow-embedded-widget').hide().fadeIn(400);
+}
+
+function send_langflow_message(context_data, session_id, on_session) {
+    let $input = $('#langflow-widget-input');
+    let message = $input.val().trim();
+    if (!message) return;
+    
+    append_langflow_message('user', message);
+    $input.val('');
+    append_langflow_message('ai', '<div class="typing-indicator"><span></span><span></span><span></span></div>');
+    
+    // let context_message = context_data.is_list
+    //     ? `DocType: ${context_data.doctype}\nContext: List View\nQuestion: ${message}\n\nأريد الاستعلام عن بيانات ${context_data.doctype} في وضع العرض القائمة.`
+    //     : `DocType: ${context_data.doctype}\nDocument Name: ${context_data.docname}\nQuestion: ${message}\n\nأريد الاستعلام عن المستند ${context_data.docname} من نوع ${context_data.doctype}.`;
+    let context_message = context_data.is_list
+        ? `Question: ${message}\n`
+        : `Question: ${message}\n`;
+    
+    // الرد يصل على دفعات عبر realtime أثناء التوليد، والرد الكامل يصل في callback
+    let stream_id = frappe.utils.get_random(16);
+    let streamed_text = '';
+    let $bubble = $('#langflow-widget-messages > div:last-child > div');
+
+    function on_stream(data) {
+        if (!data || data.stream_id !== stream_id || !data.chunk) return;
+        streamed_text += data.chunk;
+        $bubble.html(frappe.utils.escape_html(streamed_text).replace(/\n/g, '<br>'));
+        $('#langflow-widget-messages').scrollTop($('#langflow-widget-messages')[0].scrollHeight);
+    }
+    frappe.realtime.on('langflow_chat_stream', on_stream);
+
+    frappe.call({
+        method: 'langflow_integration.langflow_integration.api.langflow_client.stream_chat_with_langflow',
+        args: {
+            message: context_message,
+            session_id: session_id,
+            doctype: context_data.doctype,
+            stream_id: stream_id
+        },
+        callback: function(r) {
+            frappe.realtime.off('langflow_chat_stream', on_stream);
+            $bubble.parent().remove();
+            if (r.message && r.message.session_id && on_session) {
+                on_session(r.message.session_id);
+            }
+            if (r.message && r.message.success) {
+                append_langflow_message('ai', format_langflow_output(r.message.output));
+            } else {
+                let error_msg = r.message && r.message.error ? r.message.error : 'حدث خطأ غير معروف';
+                append_langflow_message('ai', `❌ عذراً، واجهت خطأ: ${error_msg}`);
+            }
+        },
+        error: function(r) {
+            frappe.realtime.off('langflow_chat_stream', on_stream);
+            $bubble.parent().remove();
+            append_langflow_message('ai', '❌ فشل الاتصال بخدمة AI.');
+        }
+    });
+}
+
+function append_langflow_message(type, message) {
+    let isUser = type === 'user';
+    let msg_html = `
+        <div style="display: flex; justify-content: ${isUser ? 'flex-end' : 'flex-start'}; margin-bottom: 16px;">
+            <div style="
+                background: ${isUser ? 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)' : '#fff'};
+                color: ${isUser ? '#fff' : '#333'};
+                padding: 14px 18px;
+                border-radius: ${isUser ? '20px 20px 4px 20px' : '20px 20px 20px 4px'};
+                max-width: 80%;
+                box-shadow: ${isUser ? 'none' : '0 2px 12px rgba(0,0,0,0.08)'};
+                word-wrap: break-word;
+                font-size: 14px;
+                line-height: 1.6;
+            ">${message}</div>
+        </div>
+    `;
+    $('#langflow-widget-messages').append(msg_html).scrollTop($('#langflow-widget-messages')[0].scrollHeight);
+}
+
+// الخادم يرسل الرد مختصراً: output = {text, json}
+function format_langflow_output(output) {
+    if (output && output.text) {
+        return frappe.utils.escape_html(output.text).replace(/\n/g, '<br>');
+    }
+    if (output && output.json) {
+        return `<pre>${frappe.utils.escape_html(JSON.stringify(output.json, null, 2))}</pre>`;
+    }
+    return 'تم استلام الرد ولكنه لا يحتوي على نص';
+}
+
+function wait_for_langflow_job(job_id, on_done, on_progress) {
+    let finished = false;
+    let poll_timer = null;
+
+    function finish(result) {
+        if (finished) return;
+        finished = true;
+        frappe.realtime.off('langflow_job_update', on_update);
+        clearInterval(poll_timer);
+        on_done(result);
+    }
+
+    function on_update(data) {
+        if (!data || data.job_id !== job_id) return;
+        if (data.status === 'finished') {
+            finish(data.result);
+        } else if (data.progress && on_progress) {
+            on_progress(data.progress);
+        }
+    }
+
+    // realtime هو المسار الأساسي، والاستعلام الدوري احتياط عند انقطاع socket.io
+    frappe.realtime.on('langflow_job_update', on_update);
+    poll_timer = setInterval(function() {
+        frappe.call({
+            method: 'langflow_integration.langflow_integration.api.jobs.get_langflow_job',
+            args: { job_id: job_id },
+            callback: function(r) {
+                if (!r.message) return;
+                if (!r.message.success) {
+                    finish(r.message);
+                } else if (r.message.status === 'finished') {
+                    finish(r.message.result);
+                } else if (r.message.progress && on_progress) {
+                    on_progress(r.message.progress);
+                }
+            }
+        });
+    }, 10000);
+}
+
+// ============================================
+// BULK AI PROCESSING (any list view)
+// ============================================
+
+const LANGFLOW_WRITABLE_FIELDTYPES = ['Small Text', 'Text', 'Long Text', 'Text Editor', 'Markdown Editor', 'Code'];
+
+function show_bulk_process_dialog(listview) {
+    let doctype = listview.doctype;
+    let names = listview.get_checked_items(true);
+    let target_options = [''].concat(
+        frappe.get_meta(doctype).fields
+            .filter(df => LANGFLOW_WRITABLE_FIELDTYPES.includes(df.fieldtype))
+            .map(df => df.fieldname)
+    );
+
+    let dialog = new frappe.ui.Dialog({
+        title: __('Process with AI'),
+        fields: [
+            {
+                fieldname: 'prompt',
+                fieldtype: 'Small Text',
+                label: __('Prompt'),
+                reqd: 1
+            },
+            {
+                fieldname: 'include_fields',
+                fieldtype: 'Data',
+                label: __('Fields'),
+                description: __('Comma separated, e.g. customer, grand_total, items.item_code. Leave empty to send all fields.')
+            },
+            {
+                fieldname: 'target_field',
+                fieldtype: 'Select',
+                label: __('Write Result To'),
+                options: target_options,
+                description: __('Leave empty to show the results in a report')
+            },
+            {
+                fieldname: 'docs_per_request',
+                fieldtype: 'Int',
+                label: __('Documents per Request'),
+                default: 1,
+                description: __('Only used when the flow is configured for batches')
+            }
+        ],
+        primary_action_label: names.length
+            ? __('Process {0} Selected', [names.length])
+            : __('Process All Matching Filters'),
+        primary_action: function(values) {
+            dialog.hide();
+            bulk_process_documents(listview, names, values);
+        }
+    });
+
+    dialog.show();
+}
+
+function bulk_process_documents(listview, names, values) {
+    let doctype = listview.doctype;
+
+    frappe.call({
+        method: 'langflow_integration.langflow_integration.api.bulk.bulk_process_documents',
+        args: {
+            doctype: doctype,
+            prompt: values.prompt,
+            names: names.length ? names : null,
+            filters: names.length ? null : listview.get_filters_for_args(),
+            include_fields: values.include_fields || null,
+            target_field: values.target_field || null,
+            docs_per_request: values.docs_per_request
+        },
+        callback: function(r) {
+            if (!r.message || !r.message.success) {
+                frappe.msgprint({
+                    title: __('AI Processing Failed'),
+                    indicator: 'red',
+                    message: (r.message && r.message.error) || __('Unknown error occurred')
+                });
+                return;
+            }
+
+            let title = __('Process with AI');
+            frappe.show_progress(title, 0, names.length || 1, __('Queued...'));
+            listview.page.set_indicator(__('AI: Queued'), 'blue');
+
+            wait_for_langflow_job(r.message.job_id, function(result) {
+                frappe.hide_progress();
+                listview.page.clear_indicator();
+                if (values.target_field) {
+                    listview.refresh();
+                }
+                show_bulk_process_report(result);
+            }, function(progress) {
+                frappe.show_progress(
+                    title,
+                    progress.done,
+                    progress.total,
+                    __('{0} succeeded, {1} failed', [progress.succeeded, progress.failed])
+                );
+                // يبقى التقدم ظاهراً في القائمة حتى بعد إغلاق نافذة التقدم
+                listview.page.set_indicator(
+                    __('AI: {0} / {1}', [progress.done, progress.total]),
+                    progress.failed ? 'orange' : 'blue'
+                );
+            });
+        }
+    });
+}
+
+function show_bulk_process_report(result) {
+    if (!result || !result.report) {
+        frappe.msgprint({
+            title: __('AI Processing Failed'),
+            indicator: 'red',
+            message: (result && result.error) || __('Unknown error occurred')
+        });
+        return;
+    }
+
+    let report = result.report;
+    let rows = report.results
+        .filter(row => !row.success || !report.target_field)
+        .map(row => `
+            <tr>
+                <td><a href="/app/${frappe.router.slug(report.doctype)}/${encodeURIComponent(row.name)}">${frappe.utils.escape_html(row.name)}</a></td>
+                <td>${row.success
+                    ? frappe.utils.escape_html(row.answer || '').replace(/\n/g, '<br>')
+                    : `<span class="text-danger">${frappe.utils.escape_html(row.error || '')}</span>`}</td>
+            </tr>
+        `).join('');
+
+    frappe.msgprint({
+        title: __('AI Processing Report'),
+        indicator: report.failed ? 'orange' : 'green',
+        wide: true,
+        message: `
+            <p>${frappe.utils.escape_html(result.message)} (${report.requests} ${__('requests')}, ${report.duration}s)</p>
+            ${rows ? `
+                <table class="table table-bordered table-sm">
+                    <thead><tr><th>${__('Document')}</th><th>${report.target_field ? __('Error') : __('Result')}</th></tr></thead>
+                    <tbody>${rows}</tbody>
+                </table>
+            ` : ''}
+        `
+    });
+}
+
+// يستبدل الدوال المؤقتة التي عرّفها langflow_global.js
+window.create_langflow_widget = create_langflow_widget;
+window.wait_for_langflow_job = wait_for_langflow_job;
+window.show_bulk_process_dialog = show_bulk_process_dialog;